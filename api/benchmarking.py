@@ -0,0 +1,46 @@
+# api/benchmarking.py
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks never touch the configured database: they run against a
+throwaway test database created from the same settings (SQLite locally,
+Postgres when DATABASE_URL points at one) and dropped afterwards.
+"""
+import math
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """Create a test database (and test environment) for the duration of the block"""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """Latency summary (milliseconds in, milliseconds out)"""
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples), 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
@@ -0,0 +1,104 @@
+# api/query_budgets.py
+"""
+Declared maximum ORM queries per endpoint, by URL name and HTTP method.
+
+Counts are for one request authenticated with a JWT, the way clients call
+the API, so they include loading request.user and its profile (one joined
+query, users/authentication.py), and the work a request defers to transaction.on_commit. List endpoints must stay
+within budget at any data size: the query budget tests (hospital/tests.py,
+users/tests.py) run each endpoint at two sizes and fail when the count
+exceeds the budget or grows with the data, i.e. an N+1 came back. benchmark_endpoints reports the budget next to its measurements.
+
+When a change legitimately needs more queries, raise the number here in
+the same commit so the increase gets reviewed.
+"""
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SAVEPOINT_RE = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+QUERY_BUDGETS = {
+    # hospital/urls.py
+    # The floor for the nested shape: the user, the appointments (patient and
+    # medical report joined), then one query per collection they carry:
+    # assignments, test requests, their lab results, vital requests, vitals
+    'appointment-list': {'GET': 7},
+    'appointment-create': {'POST': 11},
+    'appointment-detail': {'GET': 5},
+    'patients-list': {'GET': 2},
+    'testrequest-list': {'GET': 2},
+    'testrequest-create': {'POST': 5},
+    'vitalrequest-list': {'GET': 2},
+    'vitalrequest-create': {'POST': 5},
+    # Completing a request cascades into TestRequest/VitalRequest/Appointment saves
+    'vitals-create': {'POST': 8},
+    'labresult-create': {'POST': 11},
+    'medicalreport-create': {'POST': 5},
+    'staff-list': {'GET': 2},
+    'available-staff': {'GET': 2},
+    'appointment-assignments': {'GET': 2},
+    'assign-staff': {'POST': 12},
+    'assignment-list': {'GET': 2},
+    'assignment-detail': {'GET': 2},
+    # POST also adds the post to the full-text index and, after commit,
+    # rebuilds the latest feed of both audiences (one query each)
+    'blog-list-create': {'GET': 2, 'POST': 6},
+    # Full-text match, then the matched posts
+    'blog-search': {'GET': 2},
+    'blog-latest': {'GET': 2},
+    # Views summed per post over the daily counters
+    'blog-most-read': {'GET': 1},
+    # One streamed query; cached copies and 304s need none
+    'blog-sitemap': {'GET': 1},
+    'blog-rss': {'GET': 1},
+    'blog-atom': {'GET': 1},
+    'blog-by-author': {'GET': 1},
+    'blog-detail': {'GET': 2},
+    'blog-admin-all': {'GET': 2},
+    'blog-stats': {'GET': 2},
+    'api-root': {'GET': 1},
+    # users/urls.py
+    'login': {'POST': 10},
+    'register': {'POST': 11},
+    'logout': {'POST': 7},
+    'dashboard': {'GET': 2},
+    'update-profile': {'GET': 1, 'PUT': 5},
+    'token_refresh': {'POST': 11},
+    'token_verify': {'POST': 1},
+    'staff-import': {'POST': 8},
+    'social-auth-success': {'GET': 2},
+    'social-auth-error': {'GET': 0},
+}
+
+
+def budget_for(route, method):
+    """Declared budget for `route` and `method`, or None if there is none"""
+    return QUERY_BUDGETS.get(route, {}).get(method.upper())
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin: measure an endpoint at one data size, grow the data,
+    measure again, and assert both counts are equal and within budget.
+    """
+
+    def count_queries(self, send):
+        # TestCase never commits, so on_commit work (search indexing, cache
+        # stamps, outbox sends) would otherwise go unmeasured: run it here
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = send()
+            if response.streaming:
+                # Streamed bodies query as they are read
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{response.status_code}: {getattr(response, 'data', '')}")
+        # TestCase wraps each test in a transaction, turning atomic blocks into
+        # savepoints that production (autocommit) never sends
+        return sum(1 for query in queries if not SAVEPOINT_RE.match(query['sql']))
+
+    def assertQueryBudget(self, route, method, small, large):
+        budget = budget_for(route, method)
+        self.assertIsNotNone(budget, f"No query budget declared for {method} {route} in api/query_budgets.py")
+        self.assertLessEqual(small, budget, f"{method} {route}: {small} queries, budget is {budget}")
+        self.assertEqual(small, large, f"{method} {route}: queries grew with the data ({small} -> {large})")
@@ -3,6 +3,7 @@ from pathlib import Path
 from decouple import config, Csv
 from datetime import timedelta
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -30,11 +31,13 @@ INSTALLED_APPS = [
     # local apps
     'users.apps.UsersConfig',
     'hospital.apps.HospitalConfig',
+    'monitoring.apps.MonitoringConfig',
     'social_django',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'monitoring.middleware.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.gzip.GZipMiddleware',
@@ -43,6 +46,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitoring.profiling.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,18 +87,108 @@ CACHES = {
     }
 }
 
-# If Redis is not available, fallback to local memory cache
-if config('USE_REDIS', default=False, cast=bool):
+# If Redis is not available, fallback to local memory cache. LocMem is
+# per process: the version stamps that invalidate blog responses and user
+# payloads only reach the worker that bumped them, so anything running more
+# than one process (render.yaml) sets USE_REDIS
+USE_REDIS = config('USE_REDIS', default=False, cast=bool)
+# Cached user payloads carry the role that permissions are checked against:
+# refuse to start several workers that would each keep their own copy
+if not USE_REDIS and not DEBUG and config('WEB_CONCURRENCY', default=1, cast=int) > 1:
+    raise ImproperlyConfigured('WEB_CONCURRENCY > 1 needs a shared cache: set USE_REDIS and REDIS_URL')
+if USE_REDIS:
     CACHES['default'] = {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'BACKEND': 'monitoring.cache.InstrumentedRedisCache',
         'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
     }
 else:
     CACHES['default'] = {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'monitoring.cache.InstrumentedLocMemCache',
         'LOCATION': 'unique-snowflake',
     }
 
+# ==================== REQUEST INSTRUMENTATION ==================== #
+# Fraction of requests that get query/cache/storage counters, a
+# Server-Timing header and a JSON log line (monitoring/middleware.py)
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=1.0 if DEBUG else 0.05, cast=float)
+
+# Prometheus metrics at /metrics (monitoring/metrics.py). Every request is
+# counted when enabled; the sample rate above only governs headers/logs.
+# Under Gunicorn, gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR so the
+# workers' samples are aggregated.
+PROMETHEUS_METRICS_ENABLED = config('PROMETHEUS_METRICS_ENABLED', default=True, cast=bool)
+# Required for /metrics unless DEBUG is on
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+PROMETHEUS_MULTIPROC_DIR = config('PROMETHEUS_MULTIPROC_DIR', default='')
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', PROMETHEUS_MULTIPROC_DIR)
+
+# Slow-query log (monitoring/slow_queries.py): queries at or above the
+# threshold in a sampled request are stored with their EXPLAIN plan and
+# calling frames, browsable under admin > Monitoring > Slow queries
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=100, cast=float)
+SLOW_QUERY_SAMPLE_RATE = config('SLOW_QUERY_SAMPLE_RATE', default=1.0, cast=float)
+SLOW_QUERY_MAX_PER_REQUEST = config('SLOW_QUERY_MAX_PER_REQUEST', default=10, cast=int)
+SLOW_QUERY_EXPLAIN = config('SLOW_QUERY_EXPLAIN', default=True, cast=bool)
+SLOW_QUERY_STORE = config('SLOW_QUERY_STORE', default=True, cast=bool)
+# Raw parameter values (patient data, password hashes) instead of their types and lengths
+SLOW_QUERY_STORE_PARAMS = config('SLOW_QUERY_STORE_PARAMS', default=False, cast=bool)
+SLOW_QUERY_RETENTION_DAYS = config('SLOW_QUERY_RETENTION_DAYS', default=14, cast=int)
+
+# On-demand profiling (monitoring/profiling.py): an ADMIN sends
+# `X-Profile: cprofile|sample` (or ?_profile=) to get that one request's
+# profile back, or stores it with `X-Profile-Output: store`
+REQUEST_PROFILING_ENABLED = config('REQUEST_PROFILING_ENABLED', default=True, cast=bool)
+REQUEST_PROFILING_SAMPLE_INTERVAL_MS = config('REQUEST_PROFILING_SAMPLE_INTERVAL_MS', default=1, cast=float)
+
+# Fraction of requests whose peak Python allocation is measured with
+# tracemalloc and logged with the route (monitoring/memory.py); snapshots
+# and diffs are taken on demand under /api/monitoring/memory/
+REQUEST_MEMORY_SAMPLE_RATE = config('REQUEST_MEMORY_SAMPLE_RATE', default=0.0, cast=float)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message_only': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'monitoring_console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message_only',
+        },
+    },
+    'loggers': {
+        'monitoring': {
+            'handlers': ['monitoring_console'],
+            'level': config('MONITORING_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# ==================== BLOG SEARCH ==================== #
+# Text search configuration for the Postgres blog index (hospital/search.py);
+# SQLite's FTS5 table always uses the porter stemmer
+BLOG_SEARCH_CONFIG = config('BLOG_SEARCH_CONFIG', default='english')
+
+# Whole-response cache for anonymous blog reads (hospital/blog_cache.py).
+# Entries are invalidated by the blog version stamp, so the timeout only
+# bounds how long unused entries occupy the cache
+BLOG_RESPONSE_CACHE_ENABLED = config('BLOG_RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+BLOG_RESPONSE_CACHE_TIMEOUT = config('BLOG_RESPONSE_CACHE_TIMEOUT', default=60 * 60, cast=int)
+# Posts kept in the precomputed blog/latest/ feed (hospital/blog_feed.py); also the largest ?limit=
+BLOG_LATEST_FEED_SIZE = config('BLOG_LATEST_FEED_SIZE', default=24, cast=int)
+# Posts in the RSS/Atom feeds (hospital/blog_syndication.py); the sitemap lists them all
+BLOG_SYNDICATION_FEED_SIZE = config('BLOG_SYNDICATION_FEED_SIZE', default=50, cast=int)
+# Where the blog's pages live: the sitemap and feeds link there
+FRONTEND_URL = config('FRONTEND_URL', default='https://ettahospitalclone.vercel.app')
+# Blog page views are buffered per process and written every interval, or
+# sooner once this many posts are pending (hospital/blog_views.py)
+BLOG_VIEW_FLUSH_INTERVAL = config('BLOG_VIEW_FLUSH_INTERVAL', default=30, cast=int)
+BLOG_VIEW_FLUSH_MAX = config('BLOG_VIEW_FLUSH_MAX', default=1000, cast=int)
+
 # Default to SQLite for local development
 DATABASES = {
     'default': {
@@ -132,6 +226,13 @@ TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+# ==================== IMAGE VARIANTS ==================== #
+# Resized copies of blog images and profile pictures are made by a small
+# thread pool in each worker process (hospital/images.py); jobs beyond
+# the queue limit are skipped and left to `manage.py generate_image_variants`
+IMAGE_VARIANT_WORKERS = config('IMAGE_VARIANT_WORKERS', default=2, cast=int)
+IMAGE_VARIANT_MAX_PENDING = config('IMAGE_VARIANT_MAX_PENDING', default=32, cast=int)
+
 # ==================== CORS / CSRF - FIXED ==================== #
 CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default=DEBUG, cast=bool)
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:5173,http://localhost:3000', cast=Csv())
@@ -155,6 +256,9 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "x-profile",
+    "x-profile-output",
+    "if-none-match",
 ]
 
 CSRF_TRUSTED_ORIGINS = config('CSRF_TRUSTED_ORIGINS', default='http://localhost:5173,http://localhost:5174', cast=Csv())
@@ -201,10 +305,15 @@ EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 
+# ==================== STAFF IMPORT ==================== #
+# Rows the roster import endpoint accepts; every password is hashed in the
+# request (users/provisioning.py), so larger rosters go through the command
+STAFF_IMPORT_MAX_ROWS = config('STAFF_IMPORT_MAX_ROWS', default=25, cast=int)
+
 # ==================== DRF + JWT ==================== #
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ProfileJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -250,9 +359,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # ==================== SOCIAL AUTH FIXES - UPDATED ==================== #
 # Fix authentication backends - ORDER MATTERS!
+# Password logins resolve username OR email in one query and hash once, so
+# the local backend goes first; the social backend bails out immediately for
+# credential-based authenticate() calls. ModelBackend stays listed because
+# sessions (admin logins) created before the custom backend store its path
+# and are loaded through it; it never sees credentials, since the local
+# backend ends the chain on a failed password login.
 AUTHENTICATION_BACKENDS = (
-    'social_core.backends.google.GoogleOAuth2',
+    'users.backends.EmailOrUsernameModelBackend',
     'django.contrib.auth.backends.ModelBackend',
+    'social_core.backends.google.GoogleOAuth2',
 )
 
 # SOCIAL AUTH CONFIGURATION
@@ -271,6 +387,17 @@ SOCIAL_AUTH_GOOGLE_OAUTH2_SCOPE = [
     'openid'
 ]
 
+# Google endpoints used by the direct OAuth views (users/google.py). They are
+# configurable so local runs and tests can point at users/fake_google.py.
+GOOGLE_TOKEN_URL = config('GOOGLE_TOKEN_URL', default='https://oauth2.googleapis.com/token')
+GOOGLE_USERINFO_URL = config('GOOGLE_USERINFO_URL', default='https://www.googleapis.com/oauth2/v3/userinfo')
+GOOGLE_JWKS_URL = config('GOOGLE_JWKS_URL', default='https://www.googleapis.com/oauth2/v3/certs')
+GOOGLE_ID_TOKEN_ISSUERS = config('GOOGLE_ID_TOKEN_ISSUERS', default='accounts.google.com,https://accounts.google.com', cast=Csv())
+GOOGLE_HTTP_CONNECT_TIMEOUT = config('GOOGLE_HTTP_CONNECT_TIMEOUT', default=3.05, cast=float)
+GOOGLE_HTTP_READ_TIMEOUT = config('GOOGLE_HTTP_READ_TIMEOUT', default=10, cast=float)
+# Used when Google's JWKS response carries no Cache-Control max-age
+GOOGLE_JWKS_CACHE_SECONDS = config('GOOGLE_JWKS_CACHE_SECONDS', default=3600, cast=int)
+
 SOCIAL_AUTH_GOOGLE_OAUTH2_AUTH_EXTRA_ARGUMENTS = {
     'access_type': 'online',
     'prompt': 'select_account consent',
@@ -335,7 +462,11 @@ else:
     CSRF_COOKIE_SAMESITE = 'Lax'
 
 # CORS settings for social auth
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = [
+    'Content-Type', 'X-CSRFToken',
+    'Content-Disposition', 'X-Profile-Id', 'X-Profile-Status', 'X-Profile-Duration-Ms',
+    'ETag', 'X-Cache',
+]
 CORS_ALLOW_CREDENTIALS = True
 
 # ==================== LOGIN URLS ==================== #
@@ -3,15 +3,18 @@ from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView,TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
+from monitoring.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('social_django.urls', namespace='social')),
     path('api/hospital/',include('hospital.urls')),
     path('api/users/',include('users.urls')),
+    path('api/monitoring/', include('monitoring.urls')),
     # jwt
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 # In production, AWS S3 serves media files directly
 if settings.DEBUG:
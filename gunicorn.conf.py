@@ -0,0 +1,38 @@
+# gunicorn.conf.py
+"""
+Gunicorn picks this file up automatically from the working directory.
+
+Workers share Prometheus metrics through files in PROMETHEUS_MULTIPROC_DIR
+(see monitoring/metrics.py). The directory has to be set before any
+worker imports prometheus_client, emptied when the master starts so old
+samples don't leak into a new deploy, and told when a worker exits so its
+live gauges stop counting.
+
+Each worker also writes out the blog page views it has buffered
+(hospital/blog_views.py) before it exits.
+"""
+import os
+import shutil
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/dhospital-prometheus')
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    from hospital import blog_views
+
+    try:
+        blog_views.flush()
+    except Exception as e:
+        server.log.warning(f"Could not flush blog view counts: {e}")
@@ -0,0 +1,165 @@
+# hospital/blog_cache.py
+"""
+Whole-response cache for anonymous reads of the public blog endpoints.
+
+Entries are keyed by route and query string and hold the rendered JSON
+body, a gzipped copy and an ETag, tagged with the blog version stamp
+they were rendered under. The stamp is one cache key bumped after every
+committed BlogPost save/delete, and after saves of the ADMIN profiles
+whose names the posts show (hospital/signals.py); bulk writers call
+invalidate() themselves. Bumping makes every older entry stale at once,
+without finding or deleting them. The stamp only invalidates what shares
+the cache it lives in, so deployments with several worker processes use
+Redis (USE_REDIS, render.yaml); under per-process LocMem a bump reaches
+only the worker that made it.
+
+A lookup fetches the stamp and the entry with a single get_many, so an
+anonymous hit costs one cache round trip and no queries. Only requests
+without an Authorization header are cached: admins see drafts through
+the same URLs. Responses carry `Vary: Authorization, Accept-Encoding`
+for the same reason.
+"""
+import gzip
+import hashlib
+import re
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+VERSION_KEY = 'blog:version'
+# Bump when the entry layout changes
+ENTRY_VERSION = 1
+CACHEABLE_STATUSES = (200, 404)
+# Below this gzip costs more than it saves (GZipMiddleware's own threshold)
+MIN_GZIP_LENGTH = 200
+KEPT_HEADERS = ('Content-Type', 'Allow')
+
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_stats():
+    """Hit/miss counters for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['not_modified'] + stats['misses']
+    stats['hit_ratio'] = (stats['hits'] + stats['not_modified']) / lookups if lookups else 0.0
+    return stats
+
+
+def enabled():
+    return getattr(settings, 'BLOG_RESPONSE_CACHE_ENABLED', True)
+
+
+def cacheable(request):
+    return enabled() and request.method in ('GET', 'HEAD') and 'HTTP_AUTHORIZATION' not in request.META
+
+
+def _new_stamp():
+    # Milliseconds, so a stamp lost with the cache restarts above every number handed out before
+    return int(time.time() * 1000)
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_stamp(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        stamp = _new_stamp()
+        cache.set(VERSION_KEY, stamp, None)
+        return stamp
+
+
+def invalidate():
+    """Make every cached blog response stale once the current transaction commits"""
+    transaction.on_commit(bump_version)
+
+
+def response_key(route, request, kwargs):
+    params = sorted(request.GET.lists())
+    path = ':'.join(f"{name}={value}" for name, value in sorted(kwargs.items()))
+    digest = hashlib.sha1(f"{path}?{urlencode(params, doseq=True)}".encode()).hexdigest()
+    return f"blog:response:v{ENTRY_VERSION}:{route}:{digest}"
+
+
+def lookup(key):
+    """(entry or None, version stamp to store a fresh entry under)"""
+    found = cache.get_many([VERSION_KEY, key])
+    version = found.get(VERSION_KEY)
+    if version is None:
+        return None, current_version()
+    entry = found.get(key)
+    if entry is not None and entry['version'] == version:
+        return entry, version
+    return None, version
+
+
+def store(key, version, response):
+    """Cache a rendered response; returns the entry, or None if it isn't cacheable"""
+    if response.status_code not in CACHEABLE_STATUSES or response.streaming:
+        return None
+    body = response.content
+    entry = {
+        'version': version,
+        'status': response.status_code,
+        'headers': {name: response[name] for name in KEPT_HEADERS if response.has_header(name)},
+        'body': body,
+        'gzip': gzip.compress(body, compresslevel=6) if len(body) >= MIN_GZIP_LENGTH else None,
+        'etag': f'"{hashlib.sha1(body).hexdigest()}"',
+    }
+    cache.set(key, entry, getattr(settings, 'BLOG_RESPONSE_CACHE_TIMEOUT', 60 * 60))
+    return entry
+
+
+def _not_modified(request, entry):
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return '*' in etags or entry['etag'] in etags or f"W/{entry['etag']}" in etags
+
+
+def patch_headers(response, etag=None):
+    """Headers every response of a cached blog endpoint carries, cached or not"""
+    patch_vary_headers(response, ('Authorization', 'Accept-Encoding'))
+    if etag:
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+def respond(request, entry, outcome):
+    """HttpResponse for a cache entry: 304, gzipped body or plain body"""
+    if entry['status'] == 200 and _not_modified(request, entry):
+        _count('not_modified')
+        response = HttpResponseNotModified()
+    else:
+        _count(outcome)
+        compressed = entry['gzip'] is not None and ACCEPTS_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        response = HttpResponse(entry['gzip'] if compressed else entry['body'], status=entry['status'])
+        for name, value in entry['headers'].items():
+            response[name] = value
+        if compressed:
+            # GZipMiddleware leaves responses that already have a Content-Encoding alone
+            response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = str(len(response.content))
+    response['X-Cache'] = 'HIT' if outcome == 'hits' else 'MISS'
+    return patch_headers(response, etag=entry['etag'] if entry['status'] == 200 else None)
@@ -0,0 +1,89 @@
+# hospital/blog_feed.py
+"""
+Precomputed "latest posts" feed for the homepage (blog/latest/).
+
+The newest FEED_SIZE posts are kept in the cache as ready JSON, one
+rendered object per post, for two audiences: `public` (published posts)
+and `admin` (drafts too). A request for the newest N is a slice of that
+list joined into an array, so it runs no queries and no serializer.
+
+Feeds are rebuilt once a transaction that saved or deleted a post (or
+renamed an author) commits (hospital/signals.py). Each feed is tagged
+with the blog version stamp of hospital/blog_cache.py that it was built
+under, and is fetched together with the stamp; a feed built before the
+latest bump, lost from the cache, expired (BLOG_RESPONSE_CACHE_TIMEOUT)
+or never built is rebuilt on read. Like the stamp, feeds need a cache
+all workers share (see hospital/blog_cache.py).
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework.renderers import JSONRenderer
+
+from . import blog_cache
+from .models import BlogPost
+from .serializers import BlogPostFeedSerializer
+
+logger = logging.getLogger(__name__)
+
+AUDIENCES = ('public', 'admin')
+# Bump when the stored feed or the serialized post changes shape
+FEED_VERSION = 1
+
+
+def feed_size():
+    return getattr(settings, 'BLOG_LATEST_FEED_SIZE', 24)
+
+
+def feed_key(audience):
+    return f"blog:latest:v{FEED_VERSION}:{audience}"
+
+
+def feed_queryset(audience):
+    queryset = BlogPost.objects.all() if audience == 'admin' else BlogPost.objects.filter(published=True)
+    queryset = queryset.order_by(F('published_date').desc(nulls_last=True), '-created_at')
+    return BlogPostFeedSerializer.setup_projection(queryset)[:feed_size()]
+
+
+def build(audience, version):
+    """Render an audience's feed and store it under `version`; returns the rendered posts"""
+    renderer = JSONRenderer()
+    items = [renderer.render(item) for item in BlogPostFeedSerializer(feed_queryset(audience), many=True).data]
+    # Bounded like the response cache: a feed that missed a bump (a process not sharing the
+    # cache) goes stale for at most that long
+    cache.set(feed_key(audience), {'version': version, 'items': items},
+              getattr(settings, 'BLOG_RESPONSE_CACHE_TIMEOUT', 60 * 60))
+    return items
+
+
+def rebuild():
+    """Rebuild every audience's feed against the current version stamp"""
+    version = blog_cache.current_version()
+    for audience in AUDIENCES:
+        try:
+            build(audience, version)
+        except Exception as e:
+            # Runs after commit: a failure must not turn the saved post into an error response.
+            # The stale feed is rebuilt on its next read.
+            logger.error(f"Rebuilding the {audience} latest feed failed: {e}")
+
+
+def schedule_rebuild():
+    """Rebuild the feeds once the current transaction commits (after blog_cache.invalidate())"""
+    transaction.on_commit(rebuild)
+
+
+def latest(audience, limit):
+    """JSON array of the newest `limit` posts (at most feed_size()) for an audience, as bytes"""
+    key = feed_key(audience)
+    found = cache.get_many([blog_cache.VERSION_KEY, key])
+    version = found.get(blog_cache.VERSION_KEY)
+    feed = found.get(key)
+    if version is None or feed is None or feed['version'] != version:
+        items = build(audience, version if version is not None else blog_cache.current_version())
+    else:
+        items = feed['items']
+    return b'[' + b','.join(items[:max(limit, 0)]) + b']'
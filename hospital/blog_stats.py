@@ -0,0 +1,200 @@
+# hospital/blog_stats.py
+"""
+Blog statistics kept as running counters (BlogStatCounter) instead of
+counted on every request.
+
+Every post is counted in three rows: the blog total, its author and the
+month it was created, each with how many posts there are, how many are
+published and how many have a table of contents. A save moves the post
+from the row values of its old state (BlogPost.stat_state(), captured
+when it was loaded) to those of its new one with a single `UPDATE ...
+SET n = n + CASE ... END` over the affected rows, in the same
+transaction as the save, so the counters roll back with it; a delete
+only subtracts. Saves that don't change the state write nothing, and a
+save with update_fields only counts the fields it wrote.
+
+bulk_create bypasses the signals, so bulk writers call add_posts();
+`manage.py rebuild_blog_stats` recounts everything with one grouped
+conditional-aggregate query.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import BlogPost, BlogStatCounter
+
+COUNTS = ('total', 'published', 'with_toc')
+# Model fields behind each part of BlogPost.stat_state(), by name and attname
+STATE_FIELDS = ({'author', 'author_id'}, {'published'}, {'enable_toc'}, {'created_at'})
+
+
+def rows_for(state):
+    """The counter rows a post in `state` is counted in, with what it adds to each"""
+    author_id, published, with_toc, month = state
+    counts = (1, int(published), int(with_toc))
+    return {
+        ('total', ''): counts,
+        ('author', str(author_id)): counts,
+        ('month', month): counts,
+    }
+
+
+def _deltas(old_state=None, new_state=None):
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        for row, counts in rows_for(state).items():
+            for index, count in enumerate(counts):
+                deltas[row][index] += sign * count
+    return {row: delta for row, delta in deltas.items() if any(delta)}
+
+
+def apply(deltas, model=BlogStatCounter):
+    """Add {(scope, key): [total, published, with_toc]} to the counters, in one UPDATE when the rows exist"""
+    if not deltas:
+        return
+    matches = {row: Q(scope=row[0], key=row[1]) for row in deltas}
+    changes = {
+        name: F(name) + Case(
+            *[When(matches[row], then=Value(delta[index])) for row, delta in deltas.items()],
+            default=Value(0), output_field=IntegerField(),
+        )
+        for index, name in enumerate(COUNTS)
+    }
+    if model.objects.filter(reduce(or_, matches.values())).update(**changes) == len(deltas):
+        return
+
+    # A first post for an author or month: create the missing rows
+    existing = set(model.objects.filter(reduce(or_, matches.values())).values_list('scope', 'key'))
+    for (scope, key), delta in deltas.items():
+        if (scope, key) in existing or all(value <= 0 for value in delta):
+            # Nothing to take away from (the author may be being deleted with its row)
+            continue
+        with transaction.atomic():
+            counter, created = model.objects.get_or_create(
+                scope=scope, key=key, defaults={
+                    'author_id': int(key) if scope == 'author' else None,
+                    **dict(zip(COUNTS, delta)),
+                },
+            )
+        if not created:
+            # Created concurrently since the UPDATE above
+            model.objects.filter(pk=counter.pk).update(
+                **{name: F(name) + value for name, value in zip(COUNTS, delta)}
+            )
+
+
+def previous_state(post):
+    """The state the counters have `post` down as; None for a post not saved before"""
+    state = getattr(post, '_stat_state', None)
+    if state is not None or post._state.adding:
+        return state
+    row = BlogPost.objects.filter(pk=post.pk).values('author_id', 'published', 'enable_toc', 'created_at').first()
+    if row is None:
+        return None
+    return BlogPost(**row).stat_state()
+
+
+def saved_state(post, old_state, update_fields=None):
+    """The state a save left in the row: with update_fields, unwritten parts keep their old values"""
+    new_state = post.stat_state()
+    if update_fields is None or old_state is None:
+        return new_state
+    return tuple(
+        new if fields & set(update_fields) else old
+        for fields, old, new in zip(STATE_FIELDS, old_state, new_state)
+    )
+
+
+def post_saved(post, old_state, update_fields=None):
+    new_state = saved_state(post, old_state, update_fields)
+    if new_state != old_state:
+        apply(_deltas(old_state, new_state))
+    post._stat_state = new_state
+
+
+def post_deleted(post):
+    state = getattr(post, '_stat_state', None) or post.stat_state()
+    apply(_deltas(old_state=state))
+    post._stat_state = None
+
+
+def add_posts(posts):
+    """Count freshly bulk-created posts"""
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for post in posts:
+        for row, delta in _deltas(new_state=post.stat_state()).items():
+            for index, value in enumerate(delta):
+                deltas[row][index] += value
+        post._stat_state = post.stat_state()
+    apply(deltas)
+
+
+def rebuild(post_model=BlogPost, counter_model=BlogStatCounter):
+    """Recount every post from scratch; returns the number of posts"""
+    grouped = post_model.objects.order_by().values('author_id', month=TruncMonth('created_at')).annotate(
+        total=Count('id'),
+        published_count=Count('id', filter=Q(published=True)),
+        with_toc=Count('id', filter=Q(enable_toc=True)),
+    )
+    rows = defaultdict(lambda: [0, 0, 0])
+    for group in grouped:
+        month = timezone.localtime(group['month']).strftime('%Y-%m')
+        counts = (group['total'], group['published_count'], group['with_toc'])
+        for row in (('total', ''), ('author', str(group['author_id'])), ('month', month)):
+            for index, count in enumerate(counts):
+                rows[row][index] += count
+    rows.setdefault(('total', ''), [0, 0, 0])
+
+    with transaction.atomic():
+        counter_model.objects.all().delete()
+        counter_model.objects.bulk_create([
+            counter_model(
+                scope=scope, key=key, author_id=int(key) if scope == 'author' else None,
+                **dict(zip(COUNTS, counts)),
+            )
+            for (scope, key), counts in rows.items()
+        ])
+    return rows[('total', '')][0]
+
+
+def stats():
+    """Everything the blog stats endpoint shows, from the counters (one query)"""
+    totals = {name: 0 for name in COUNTS}
+    authors, months = [], []
+    counters = BlogStatCounter.objects.filter(total__gt=0).select_related('author')
+    for counter in counters:
+        counts = {name: getattr(counter, name) for name in COUNTS}
+        if counter.scope == 'total':
+            totals = counts
+        elif counter.scope == 'author':
+            authors.append({
+                'author_id': counter.author_id,
+                'author_name': counter.author.fullname if counter.author else None,
+                'total_posts': counts['total'],
+                'published_posts': counts['published'],
+                'draft_posts': counts['total'] - counts['published'],
+            })
+        else:
+            months.append({
+                'month': counter.key,
+                'total_posts': counts['total'],
+                'published_posts': counts['published'],
+            })
+
+    total, with_toc = totals['total'], totals['with_toc']
+    return {
+        'total_posts': total,
+        'published_posts': totals['published'],
+        'draft_posts': total - totals['published'],
+        'posts_with_toc': with_toc,
+        'toc_usage_rate': (with_toc / total * 100) if total > 0 else 0,
+        'posts_per_author': sorted(authors, key=lambda author: -author['total_posts']),
+        'posts_per_month': months,
+    }
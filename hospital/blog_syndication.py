@@ -0,0 +1,158 @@
+# hospital/blog_syndication.py
+"""
+sitemap.xml, RSS 2.0 and Atom documents of the published blog, for
+crawlers and feed readers that would otherwise page through the JSON
+list endpoints.
+
+Documents are written post by post from one `.values().iterator()`
+query and sent as a StreamingHttpResponse, so even the full sitemap
+never holds more than a chunk of rows. When a stream finishes, its body
+is cached under the blog version stamp (hospital/blog_cache.py); until
+the next committed post change, requests get that copy without queries.
+The ETag is made from the stamp, so `If-None-Match` is answered with a 304
+before anything is read or streamed.
+
+Links point at the frontend's post pages (FRONTEND_URL + POST_PATH).
+"""
+from itertools import chain
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.utils.http import parse_etags
+
+from . import blog_cache
+from .models import BlogPost
+
+# Bump when a document's layout changes
+ENTRY_VERSION = 1
+POST_PATH = '/blog/{slug}'
+# The sitemap protocol's limit per file
+SITEMAP_LIMIT = 50000
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'sitemap': 'application/xml; charset=utf-8',
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+}
+BLOG_TITLE = 'Hospital blog'
+BLOG_DESCRIPTION = 'Health advice and news from our doctors and staff'
+
+
+def frontend_url(path=''):
+    return f"{settings.FRONTEND_URL.rstrip('/')}{path}"
+
+
+def post_url(slug):
+    return frontend_url(POST_PATH.format(slug=slug))
+
+
+def published_posts(limit):
+    """Newest first, as dicts with only what the documents print"""
+    return BlogPost.objects.filter(published=True).annotate(
+        date=Coalesce('published_date', 'created_at'),
+    ).order_by('-date', '-id').values(
+        'slug', 'title', 'description', 'date', 'updated_at', 'author__fullname',
+    )[:limit].iterator(chunk_size=CHUNK_SIZE)
+
+
+def _with_first(posts):
+    """(first post or None, iterator over all of them): feed headers show the newest date"""
+    first = next(posts, None)
+    return first, chain([first], posts) if first is not None else iter(())
+
+
+def sitemap(self_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    yield f"<url><loc>{escape(frontend_url('/blog'))}</loc><changefreq>daily</changefreq></url>\n"
+    for post in published_posts(SITEMAP_LIMIT - 1):
+        yield (
+            f"<url><loc>{escape(post_url(post['slug']))}</loc>"
+            f"<lastmod>{post['updated_at'].isoformat(timespec='seconds')}</lastmod></url>\n"
+        )
+    yield '</urlset>\n'
+
+
+def rss(self_url):
+    first, posts = _with_first(published_posts(settings.BLOG_SYNDICATION_FEED_SIZE))
+    updated = first['date'] if first else timezone.now()
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+        f"<title>{escape(BLOG_TITLE)}</title><link>{escape(frontend_url('/blog'))}</link>"
+        f"<description>{escape(BLOG_DESCRIPTION)}</description><language>en</language>"
+        f"<lastBuildDate>{rfc2822_date(updated)}</lastBuildDate>"
+        f"<atom:link href={quoteattr(self_url)} rel=\"self\" type=\"application/rss+xml\"/>\n"
+    )
+    for post in posts:
+        url = escape(post_url(post['slug']))
+        yield (
+            f"<item><title>{escape(post['title'])}</title><link>{url}</link>"
+            f"<description>{escape(post['description'])}</description>"
+            f"<dc:creator>{escape(post['author__fullname'] or '')}</dc:creator>"
+            f"<pubDate>{rfc2822_date(post['date'])}</pubDate><guid isPermaLink=\"true\">{url}</guid></item>\n"
+        )
+    yield '</channel></rss>\n'
+
+
+def atom(self_url):
+    first, posts = _with_first(published_posts(settings.BLOG_SYNDICATION_FEED_SIZE))
+    updated = max(first['date'], first['updated_at']) if first else timezone.now()
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="en">'
+        f"<title>{escape(BLOG_TITLE)}</title><subtitle>{escape(BLOG_DESCRIPTION)}</subtitle>"
+        f"<link href={quoteattr(frontend_url('/blog'))} rel=\"alternate\"/>"
+        f"<link href={quoteattr(self_url)} rel=\"self\"/><id>{escape(frontend_url('/blog'))}</id>"
+        f"<updated>{rfc3339_date(updated)}</updated>\n"
+    )
+    for post in posts:
+        url = post_url(post['slug'])
+        yield (
+            f"<entry><title>{escape(post['title'])}</title><link href={quoteattr(url)} rel=\"alternate\"/>"
+            f"<id>{escape(url)}</id><published>{rfc3339_date(post['date'])}</published>"
+            f"<updated>{rfc3339_date(max(post['date'], post['updated_at']))}</updated>"
+            f"<author><name>{escape(post['author__fullname'] or '')}</name></author>"
+            f"<summary>{escape(post['description'])}</summary></entry>\n"
+        )
+    yield '</feed>\n'
+
+
+DOCUMENTS = {'sitemap': sitemap, 'rss': rss, 'atom': atom}
+
+
+def document_key(kind, request):
+    # The self links carry the host the document was requested on
+    return f"blog:syndication:v{ENTRY_VERSION}:{kind}:{request.get_host()}"
+
+
+def _cached_stream(chunks, key, version):
+    """Pass chunks through; once the last one is sent, cache the whole body under `version`"""
+    parts = []
+    for chunk in chunks:
+        data = chunk.encode()
+        parts.append(data)
+        yield data
+    if blog_cache.enabled():
+        cache.set(key, {'version': version, 'body': b''.join(parts)}, settings.BLOG_RESPONSE_CACHE_TIMEOUT)
+
+
+def respond(request, kind):
+    """304, the cached document, or the document streamed from the database"""
+    key = document_key(kind, request)
+    entry, version = blog_cache.lookup(key)
+    etag = f'"{kind}-{ENTRY_VERSION}-{version}"'
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in etags or etag in etags or f"W/{etag}" in etags:
+        response = HttpResponseNotModified()
+    elif entry is not None and blog_cache.enabled():
+        response = HttpResponse(entry['body'], content_type=CONTENT_TYPES[kind])
+    else:
+        chunks = DOCUMENTS[kind](request.build_absolute_uri(request.path))
+        response = StreamingHttpResponse(_cached_stream(chunks, key, version), content_type=CONTENT_TYPES[kind])
+    return blog_cache.patch_headers(response, etag=etag)
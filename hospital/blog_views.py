@@ -0,0 +1,129 @@
+# hospital/blog_views.py
+"""
+Per-post page view counts, without a write per page view.
+
+The detail endpoint calls record(slug) for every read, cached responses
+included; that only bumps an in-process counter keyed by (day, slug).
+Once BLOG_VIEW_FLUSH_INTERVAL seconds have passed since the last flush
+(or BLOG_VIEW_FLUSH_MAX posts are pending) the next view hands the
+buffer to a background thread, which adds it to the daily
+BlogPostViewCount rows: per day and batch of posts, an INSERT of
+zero-view rows that ignores conflicts (so concurrent processes can't
+collide on a post's first view of the day), then a single
+`UPDATE ... SET views = views + CASE post_id ... END`. Slugs become post
+ids at flush time, so counting a view costs no query.
+
+A flush that fails puts its counts back for the next one. Gunicorn
+workers flush on exit (gunicorn.conf.py); a process that dies loses at
+most the views since its last flush.
+
+most_read() ranks published posts by their views over the last days,
+from the daily rows.
+"""
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import BlogPost, BlogPostViewCount
+
+logger = logging.getLogger(__name__)
+
+# Posts per INSERT/UPDATE, well inside SQLite's bound-parameter limit
+BATCH_SIZE = 400
+
+_pending = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_flushing = False
+_pool = None
+
+
+def record(slug):
+    """Count one view of the post with `slug`, today"""
+    global _flushing, _pool
+    with _lock:
+        _pending[(timezone.localdate(), slug)] += 1
+        due = not _flushing and (
+            time.monotonic() - _last_flush >= getattr(settings, 'BLOG_VIEW_FLUSH_INTERVAL', 30)
+            or len(_pending) >= getattr(settings, 'BLOG_VIEW_FLUSH_MAX', 1000)
+        )
+        if due:
+            _flushing = True
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='blog-views')
+    if due:
+        _pool.submit(_flush_in_background)
+
+
+def _flush_in_background():
+    global _flushing
+    try:
+        close_old_connections()
+        flush()
+    except Exception as e:
+        logger.error(f"Flushing blog view counts failed: {e}")
+    finally:
+        with _lock:
+            _flushing = False
+        connection.close()
+
+
+def take():
+    """Empty the buffer, returning {(day, slug): views}"""
+    global _pending, _last_flush
+    with _lock:
+        counts, _pending = _pending, Counter()
+        _last_flush = time.monotonic()
+    return counts
+
+
+def flush():
+    """Write this process's buffered views; returns how many were written"""
+    counts = take()
+    if not counts:
+        return 0
+    try:
+        return write(counts)
+    except Exception:
+        with _lock:
+            _pending.update(counts)
+        raise
+
+
+def write(counts):
+    """Add {(day, slug): views} to the daily counters; views of unknown slugs are dropped"""
+    ids = dict(BlogPost.objects.filter(slug__in={slug for _, slug in counts}).values_list('slug', 'id'))
+    days = defaultdict(Counter)
+    for (day, slug), views in counts.items():
+        if slug in ids:
+            days[day][ids[slug]] += views
+
+    with transaction.atomic():
+        for day, views in days.items():
+            post_ids = list(views)
+            for start in range(0, len(post_ids), BATCH_SIZE):
+                batch = post_ids[start:start + BATCH_SIZE]
+                BlogPostViewCount.objects.bulk_create(
+                    [BlogPostViewCount(post_id=post_id, day=day) for post_id in batch], ignore_conflicts=True,
+                )
+                BlogPostViewCount.objects.filter(day=day, post_id__in=batch).update(views=F('views') + Case(
+                    *[When(post_id=post_id, then=Value(views[post_id])) for post_id in batch],
+                    default=Value(0), output_field=IntegerField(),
+                ))
+    return sum(sum(views.values()) for views in days.values())
+
+
+def most_read(days=7):
+    """Published posts viewed in the last `days` days (today included), most viewed first, as `recent_views`"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return BlogPost.objects.filter(published=True, view_counts__day__gte=since).annotate(
+        recent_views=Sum('view_counts__views'),
+    ).order_by('-recent_views', '-id')
@@ -0,0 +1,247 @@
+# hospital/images.py
+"""
+Responsive variants of uploaded images, made off the request path.
+
+Blog images (featured_image, image_1, image_2) get WebP and JPEG copies
+at each of BLOG_IMAGE_WIDTHS that is narrower than the original (the
+original width if it is narrower than all of them); profile pictures get
+square WebP/JPEG thumbnails at AVATAR_SIZES. Variants are written
+through the field's own storage (MediaStorage on S3) next to the
+original, under a `variants/` prefix, and recorded in a JSON field on
+the row:
+
+    {'featured_image': {'source': 'blog_images/a.png',
+                        'variants': [{'width': 320, 'format': 'webp', 'name': '...'}, ...]}}
+
+srcset() turns an entry into `url 320w, url 640w` strings per format;
+an entry whose `source` is not the field's current file is ignored, so a
+replaced image never shows the old one's variants.
+
+Work is scheduled from post_save (hospital/signals.py) once the
+transaction commits, and runs in a small per-process thread pool
+(IMAGE_VARIANT_WORKERS) with at most IMAGE_VARIANT_MAX_PENDING jobs
+queued; beyond that new jobs are dropped with a warning and
+`manage.py generate_image_variants` catches up. Deleting a row deletes
+its variants (post_delete, after the commit); the originals are left to
+whoever owns them.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+BLOG_IMAGE_WIDTHS = (320, 640, 1024, 1600)
+AVATAR_SIZES = (64, 128, 256)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# model label -> (variants JSON field, {image field: 'resize' | 'avatar'})
+TARGETS = {
+    'hospital.BlogPost': ('image_variants', {
+        'featured_image': 'resize', 'image_1': 'resize', 'image_2': 'resize',
+    }),
+    'users.Profile': ('profile_pix_variants', {'profile_pix': 'avatar'}),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = None
+
+
+def _executor():
+    global _pool, _pending
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2), thread_name_prefix='image-variants',
+            )
+            _pending = threading.BoundedSemaphore(getattr(settings, 'IMAGE_VARIANT_MAX_PENDING', 32))
+        return _pool, _pending
+
+
+def _label(instance):
+    return instance._meta.label
+
+
+def stale_fields(instance):
+    """Image fields of `instance` whose recorded variants aren't for the current file"""
+    variants_field, fields = TARGETS[_label(instance)]
+    recorded = getattr(instance, variants_field) or {}
+    stale = []
+    for name in fields:
+        current = getattr(instance, name).name or ''
+        if current != (recorded.get(name) or {}).get('source', ''):
+            stale.append(name)
+    return stale
+
+
+def schedule(instance):
+    """Queue variant generation for changed images once the current transaction commits"""
+    fields = stale_fields(instance)
+    if not fields:
+        return
+    label, pk = _label(instance), instance.pk
+    transaction.on_commit(lambda: submit(label, pk, fields))
+
+
+def submit(label, pk, fields):
+    pool, pending = _executor()
+    if not pending.acquire(blocking=False):
+        logger.warning(f"Image variant queue full; skipped {label} {pk} {fields} (run generate_image_variants)")
+        return None
+
+    def run():
+        try:
+            generate(label, pk, fields)
+        except Exception as e:
+            logger.error(f"Image variants for {label} {pk} failed: {e}")
+        finally:
+            pending.release()
+            connection.close()
+
+    return pool.submit(run)
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(image, kind):
+    """[(width, format, bytes), ...] for an opened original"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'P') else 'RGB')
+    if kind == 'avatar':
+        sizes = [size for size in AVATAR_SIZES if size <= min(image.size)] or [min(image.size)]
+        resized = {size: ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS) for size in sizes}
+    else:
+        widths = [width for width in BLOG_IMAGE_WIDTHS if width < image.width] or [image.width]
+        resized = {}
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized[width] = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+    return [(width, fmt, _encode(variant, fmt)) for width, variant in resized.items() for fmt in FORMATS]
+
+
+def variant_name(source, width, fmt):
+    directory, filename = os.path.split(source)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f"{stem}-{width}w.{'jpg' if fmt == 'jpeg' else fmt}")
+
+
+def generate(label, pk, fields, force=False):
+    """Make and record the variants of `fields` on one row; returns how many files were written"""
+    close_old_connections()
+    model = apps.get_model(label)
+    variants_field, kinds = TARGETS[label]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return 0
+
+    results, written = {}, 0
+    for name in (list(kinds) if force else fields):
+        file = getattr(instance, name)
+        if not file.name:
+            results[name] = None
+            continue
+        if not force and name not in stale_fields(instance):
+            continue
+        with file.storage.open(file.name, 'rb') as source, Image.open(source) as image:
+            rendered = render_variants(image, kinds[name])
+        variants = []
+        for width, fmt, data in rendered:
+            stored = file.storage.save(variant_name(file.name, width, fmt), ContentFile(data))
+            variants.append({'width': width, 'format': fmt, 'name': stored})
+            written += 1
+        results[name] = {'source': file.name, 'variants': variants}
+
+    if results:
+        _record(model, pk, variants_field, results)
+    return written
+
+
+def _record(model, pk, variants_field, results):
+    """Merge new entries into the row, dropping the files of entries they replace"""
+    replaced = []
+    with transaction.atomic():
+        row = model.objects.select_for_update().filter(pk=pk).first()
+        if row is None:
+            return
+        recorded = dict(getattr(row, variants_field) or {})
+        for name, entry in results.items():
+            if entry is not None and getattr(row, name).name != entry['source']:
+                # The image was replaced while this ran; its own job records the new one
+                replaced.append((getattr(row, name).storage, entry))
+                continue
+            old = recorded.pop(name, None)
+            if old:
+                replaced.append((getattr(row, name).storage, old))
+            if entry is not None:
+                recorded[name] = entry
+        # update() skips post_save, so recording variants never schedules more work
+        model.objects.filter(pk=pk).update(**{variants_field: recorded})
+        transaction.on_commit(lambda: variants_recorded(row))
+    _delete_files(replaced)
+
+
+def _delete_files(entries):
+    """Delete the variant files of [(storage, entry), ...]"""
+    for storage, entry in entries:
+        for variant in entry['variants']:
+            try:
+                storage.delete(variant['name'])
+            except Exception as e:
+                logger.warning(f"Could not delete old image variant {variant['name']}: {e}")
+
+
+def deleted(instance):
+    """Delete the variants of a deleted row once the deletion commits"""
+    variants_field, fields = TARGETS[_label(instance)]
+    if variants_field in instance.get_deferred_fields():
+        # Loading it now would query a row that is gone
+        logger.warning(f"Variants of deleted {_label(instance)} {instance.pk} not loaded; left in storage")
+        return
+    recorded = getattr(instance, variants_field) or {}
+    entries = [(getattr(instance, name).storage, entry) for name, entry in recorded.items() if name in fields and entry]
+    if entries:
+        transaction.on_commit(lambda: _delete_files(entries))
+
+
+def variants_recorded(instance):
+    """Responses that show the image URLs are cached; drop them"""
+    from . import blog_cache, blog_feed
+    from users import cache as user_cache
+
+    if _label(instance) == 'users.Profile':
+        user_cache.bump_version(instance.user_id)
+    else:
+        blog_cache.bump_version()
+        blog_feed.rebuild()
+
+
+def srcset(file, entry):
+    """{'webp': 'url 320w, url 640w', 'jpeg': '...'} for a field's variants entry, or None"""
+    if not file or not entry or entry.get('source') != file.name:
+        return None
+    sets = {}
+    for variant in entry['variants']:
+        sets.setdefault(variant['format'], []).append(f"{file.storage.url(variant['name'])} {variant['width']}w")
+    return {fmt: ', '.join(urls) for fmt, urls in sets.items()}
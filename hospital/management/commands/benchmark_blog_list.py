@@ -0,0 +1,100 @@
+# hospital/management/commands/benchmark_blog_list.py
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarking import benchmark_database, summarize
+from hospital.models import BlogPost
+from hospital.serializers import BlogPostCardSerializer, BlogPostListSerializer
+from hospital.seeding import HospitalGenerator
+
+
+def legacy_page():
+    """What the blog list endpoints did before cards: every column, TOC and subheadings for each post"""
+    posts = BlogPost.objects.filter(published=True)
+    return JSONRenderer().render(BlogPostListSerializer(posts, many=True).data)
+
+
+def card_page(include=()):
+    posts = BlogPostCardSerializer.setup_projection(BlogPost.objects.filter(published=True), include)
+    return JSONRenderer().render(BlogPostCardSerializer(posts, many=True, context={'include': include}).data)
+
+
+VARIANTS = {
+    'legacy': legacy_page,
+    'card': card_page,
+    'card+all': lambda: card_page(list(BlogPostCardSerializer.INCLUDES)),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed blog posts on a throwaway test database and compare the compact card list '
+        '(BlogPostCardSerializer) with the old full-row list: payload size and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000, help='Published posts on the page')
+        parser.add_argument('--sections', type=int, default=12, help='<h2> sections per post body')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed runs per variant')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        quiet = override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0, SLOW_QUERY_SAMPLE_RATE=0.0, DEBUG=True)
+        results = {}
+        with quiet, benchmark_database():
+            generator = HospitalGenerator(
+                staff=4, patients=0, blog_posts=0, seed=options['seed'], blog_sections=options['sections'],
+            )
+            generator.run()
+            # Roughly 80% of seeded posts are published; keep seeding until the page is full
+            while BlogPost.objects.filter(published=True).count() < options['posts']:
+                generator.add_blog_posts(max(options['posts'] - BlogPost.objects.filter(published=True).count(), 50))
+            published = BlogPost.objects.filter(published=True)
+            extra = published.order_by('pk').values_list('pk', flat=True)[options['posts']:]
+            BlogPost.objects.filter(pk__in=list(extra)).update(published=False)
+            self.stdout.write(f"Seeded {published.count()} published posts with {options['sections']} sections each")
+
+            for name, render in VARIANTS.items():
+                samples = []
+                for _ in range(options['iterations']):
+                    reset_queries()
+                    began = time.perf_counter()
+                    body = render()
+                    samples.append((time.perf_counter() - began) * 1000)
+                query = connection.queries[-1]['sql']
+                results[name] = {
+                    'payload_bytes': len(body),
+                    'gzip_bytes': len(gzip.compress(body)),
+                    'columns': query.split(' FROM ')[0].count(',') + 1,
+                    **summarize(samples),
+                }
+                self.print_variant(name, results[name])
+
+        legacy = results['legacy']
+        for name in ('card', 'card+all'):
+            self.stdout.write(
+                f"{name}: {legacy['payload_bytes'] / results[name]['payload_bytes']:.1f}x smaller, "
+                f"{legacy['p50_ms'] / results[name]['p50_ms']:.1f}x faster at p50 than legacy"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({
+                    'meta': {key: options[key] for key in ('posts', 'sections', 'iterations', 'seed')}
+                    | {'database': connection.vendor},
+                    'variants': results,
+                }, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def print_variant(self, name, stats):
+        self.stdout.write(
+            f"{name:<10} {stats['payload_bytes']:>10} bytes ({stats['gzip_bytes']:>8} gzipped, "
+            f"{stats['columns']:>2} columns)  p50 {stats['p50_ms']:>8.2f}ms  p95 {stats['p95_ms']:>8.2f}ms"
+        )
@@ -0,0 +1,117 @@
+# hospital/management/commands/benchmark_blog_outline.py
+import json
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.text import slugify
+
+from api.benchmarking import summarize
+from hospital.outline import content_fingerprint, extract_outline, section_html
+from hospital.seeding import BLOG_TERMS, BLOG_TOPICS
+
+
+def legacy_outline(content, description):
+    """The regex extraction BlogPost.save() ran before hospital/outline.py, kept for comparison"""
+    toc = []
+    for level, html_title in re.findall(r'<h([1-6])[^>]*>(.*?)</h\1>', content):
+        title = re.sub(r'<[^>]+>', '', html_title).strip()
+        toc.append({'id': len(toc) + 1, 'title': title, 'anchor': slugify(title), 'level': int(level)})
+
+    subheadings = []
+    matches = re.findall(r'<h([1-6])[^>]*>(.*?)</h\1>(.*?)(?=<h[1-6]|$)', content, re.DOTALL)
+    for level, html_title, section_body in matches:
+        title = re.sub(r'<[^>]+>', '', html_title).strip()
+        text = re.sub(r'<[^>]+>', '', section_body).strip()
+        subheadings.append({
+            'title': title, 'level': int(level),
+            'description': text[:200] + ('...' if len(text) > 200 else ''),
+            'full_content': section_body.strip(),
+        })
+    if not matches and description:
+        for i, line in enumerate(description.split('. ')[:2]):
+            subheadings.append({
+                'title': f"Section {i + 1}", 'level': 2,
+                'description': line[:200] + ('...' if len(line) > 200 else ''), 'full_content': line,
+            })
+    return toc, subheadings[:6]
+
+
+def long_post(rng, size, section_size, close_headings=True):
+    """About `size` characters of HTML, a heading every `section_size` characters"""
+    parts, length, number = [], 0, 0
+    while length < size:
+        number += 1
+        topic = rng.choice(BLOG_TOPICS)
+        heading = f"<h{rng.randint(2, 4)}>{topic} &amp; <em>part</em> {number}"
+        heading += f"</h{heading[2]}>" if close_headings else ''
+        parts.append(heading)
+        length += len(heading)
+        section = 0
+        while section < section_size:
+            paragraph = f"<p>{' '.join(rng.choices(BLOG_TERMS, k=12))} for {topic.lower()}.</p>\n"
+            parts.append(paragraph)
+            section += len(paragraph)
+        length += section
+    return ''.join(parts)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time TOC/subheading extraction (hospital/outline.py) against the old regexes on '
+        'multi-megabyte posts, and the content-hash check that lets unchanged saves skip it'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='0.1,1,4', help='Post sizes in MB, comma separated')
+        parser.add_argument('--section-kb', type=float, default=8, help='Text between headings')
+        parser.add_argument('--iterations', type=int, default=3)
+        parser.add_argument('--legacy-max-mb', type=float, default=4,
+                            help='Skip the old regexes above this size (they go quadratic on unclosed headings)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def with_content(self, outline, content, description):
+        """The offsets-based outline in the old shape, to compare with legacy_outline()"""
+        toc, subheadings = outline
+        return toc, [
+            {**{key: value for key, value in subheading.items() if key not in ('start', 'end', 'source')},
+             'full_content': section_html(subheading, content, description)}
+            for subheading in subheadings
+        ]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sizes = [float(size) for size in options['sizes'].split(',')]
+        for close_headings in (True, False):
+            label = 'well-formed' if close_headings else 'unclosed headings'
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for size in sizes:
+                content = long_post(rng, int(size * 1024 * 1024), int(options['section_kb'] * 1024), close_headings)
+                self.report(size, content, options)
+
+    def time(self, run, iterations):
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            result = run()
+            samples.append((time.perf_counter() - started) * 1000)
+        return summarize(samples), result
+
+    def report(self, size, content, options):
+        description = 'A long post. About many things.'
+        parsed, outline = self.time(lambda: extract_outline(content, description), options['iterations'])
+        hashed, _ = self.time(lambda: content_fingerprint(content, description, True), options['iterations'])
+        stored = len(json.dumps(outline[1]))
+        copied = len(json.dumps(self.with_content(outline, content, description)[1]))
+        line = (
+            f"  {size:>5.1f} MB  outline p50 {parsed['p50_ms']:>9.1f}ms  "
+            f"hash check p50 {hashed['p50_ms']:>7.2f}ms  ({len(outline[0])} headings)  "
+            f"subheadings JSON {stored / 1024:.1f} KB (with copies {copied / 1024:.1f} KB)"
+        )
+        if size <= options['legacy_max_mb']:
+            legacy, expected = self.time(lambda: legacy_outline(content, description), options['iterations'])
+            line += f"  regex p50 {legacy['p50_ms']:>10.1f}ms"
+            if expected != self.with_content(outline, content, description):
+                line += self.style.ERROR('  OUTPUT DIFFERS')
+        self.stdout.write(line)
@@ -0,0 +1,84 @@
+# hospital/management/commands/benchmark_blog_search.py
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import override_settings
+
+from api.benchmarking import benchmark_database, summarize
+from hospital.models import BlogPost
+from hospital.search import search_posts
+from hospital.seeding import HospitalGenerator
+
+# Whole words, multi-word queries and half-typed prefixes, as the search box sends them
+QUERIES = (
+    'sleep', 'insomnia', 'melatonin', 'blood pressure', 'heart health', 'vaccination booster',
+    'insu', 'circad', 'diabetes care insulin', 'mental health anxiety', 'hydration dehydration',
+    'nothingmatchesthis',
+)
+
+
+def icontains_search(query, limit):
+    """What BlogPostSearchView did before the full-text index"""
+    return list(
+        BlogPost.objects.filter(published=True).filter(
+            Q(title__icontains=query) | Q(description__icontains=query) | Q(content__icontains=query)
+        ).order_by('-created_at').values_list('id', flat=True)[:limit]
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed blog posts on a throwaway test database and compare full-text search '
+        '(hospital/search.py) with the old icontains scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--iterations', type=int, default=20, help='Timed runs per query and engine')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--skip-icontains', action='store_true', help='Only time the full-text engine')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        quiet = override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0, SLOW_QUERY_SAMPLE_RATE=0.0)
+        with quiet, benchmark_database():
+            started = time.perf_counter()
+            HospitalGenerator(staff=4, patients=0, blog_posts=options['posts'], seed=options['seed']).run(
+                progress=lambda label, done, total: self.stdout.write(f"  {label} {done}/{total}"),
+            )
+            self.stdout.write(f"Seeded and indexed {options['posts']} posts in {time.perf_counter() - started:.1f}s")
+
+            engines = {'fulltext': lambda query, limit: search_posts(query, limit=limit)}
+            if not options['skip_icontains']:
+                engines['icontains'] = icontains_search
+
+            results = {}
+            for query in QUERIES:
+                results[query] = {}
+                for engine, run in engines.items():
+                    samples = []
+                    for _ in range(options['iterations']):
+                        began = time.perf_counter()
+                        found = run(query, options['limit'])
+                        samples.append((time.perf_counter() - began) * 1000)
+                    results[query][engine] = {'results': len(found), **summarize(samples)}
+                self.print_query(query, results[query])
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({
+                    'meta': {key: options[key] for key in ('posts', 'iterations', 'limit', 'seed')}
+                    | {'database': connection.vendor},
+                    'queries': results,
+                }, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def print_query(self, query, engines):
+        line = f"{query!r:<28}"
+        for engine, stats in engines.items():
+            line += f"  {engine} p50 {stats['p50_ms']:>8.2f}ms p95 {stats['p95_ms']:>8.2f}ms ({stats['results']:>3} hits)"
+        self.stdout.write(line)
@@ -0,0 +1,321 @@
+# hospital/management/commands/benchmark_endpoints.py
+import contextlib
+import io
+import json
+import platform
+import random
+import time
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.benchmarking import benchmark_database, summarize
+from api.query_budgets import budget_for
+from hospital import blog_views
+from hospital.models import Assignment
+from hospital.seeding import BENCH_PASSWORD, seed_hospital
+from monitoring.instrumentation import QueryCounter, RequestMetrics
+
+# Routes that cannot be driven offline, with the reason reported alongside the results
+SKIPPED = {
+    'social:begin': 'redirects to the Google consent screen',
+    'social:complete': 'needs a Google authorization response',
+    'social:disconnect': 'needs a linked social account',
+    'social:disconnect_individual': 'needs a linked social account',
+}
+
+
+def url_names(urlconf, namespace=''):
+    """Every named route in `urlconf`, namespaced like reverse() expects"""
+    names = set()
+    patterns = urlconf.url_patterns if isinstance(urlconf, URLResolver) else get_resolver(urlconf).url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            inner = f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+            names |= url_names(pattern, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(namespace + pattern.name)
+    return names
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic hospital on a throwaway test database and measure every route in '
+        'hospital/urls.py and users/urls.py: latency percentiles, queries and allocations per request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=200)
+        parser.add_argument('--staff', type=int, default=40)
+        parser.add_argument('--appointments-per-patient', type=int, default=2)
+        parser.add_argument('--blog-posts', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per route')
+        parser.add_argument('--alloc-iterations', type=int, default=3, help='Extra requests per route traced with tracemalloc')
+        parser.add_argument('--route', action='append', default=[], help='Only run scenarios starting with this name (repeatable)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Earlier JSON results to diff against')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        quiet = override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0, SLOW_QUERY_SAMPLE_RATE=0.0)
+        with quiet, benchmark_database():
+            started = time.perf_counter()
+            ctx = seed_hospital(
+                patients=options['patients'], staff=options['staff'],
+                appointments_per_patient=options['appointments_per_patient'],
+                blog_posts=options['blog_posts'], seed=options['seed'],
+            )
+            self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+            self.ctx, self.users = ctx, {}
+            scenarios = self.build_scenarios(ctx)
+            covered = {scenario['route'] for scenario in scenarios}
+            if options['route']:
+                scenarios = [s for s in scenarios if s['name'].startswith(tuple(options['route']))]
+            routes = {}
+            for scenario in scenarios:
+                routes[scenario['name']] = self.measure(scenario, options['iterations'], options['alloc_iterations'])
+                self.print_route(scenario['name'], routes[scenario['name']], baseline)
+
+        all_routes = url_names('hospital.urls') | url_names('users.urls')
+        results = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                **{key: options[key] for key in (
+                    'patients', 'staff', 'appointments_per_patient', 'blog_posts', 'seed', 'iterations',
+                )},
+            },
+            'routes': routes,
+            'skipped': SKIPPED,
+            'not_covered': sorted(all_routes - covered - set(SKIPPED)),
+        }
+        if results['not_covered']:
+            self.stdout.write(self.style.WARNING(f"Routes without a scenario: {', '.join(results['not_covered'])}"))
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    # ------------------------------------------------------------------ #
+
+    def build_scenarios(self, ctx):
+        profiles = ctx['profiles']
+        admin_id, nurse_id, lab_id = profiles['ADMIN'][0], profiles['NURSE'][0], profiles['LAB'][0]
+        appointments, open_appointments = ctx['appointments'], ctx['open_appointments']
+        # Seeded appointments have at most one vital request, and assign-staff get_or_create()s it
+        # (a second one makes it answer 400): the request-creating scenarios write to the other half
+        assignable, requestable = appointments[::2], appointments[1::2] or appointments
+        assignment_id = Assignment.objects.values_list('id', flat=True).first()
+        self.seed_views(ctx['blog_slugs'])
+        pick = lambda items, i: items[i % len(items)]  # noqa: E731
+        refresh = lambda role: str(RefreshToken.for_user(self.user(role)))  # noqa: E731
+
+        def scenario(name, method, role=None, kwargs=None, data=None, query='', route=None, settings=None):
+            return {
+                'name': name, 'route': route or name.split('[')[0], 'method': method, 'role': role,
+                'kwargs': kwargs or (lambda i: {}), 'data': data, 'query': query, 'settings': settings or {},
+            }
+
+        return [
+            # hospital/urls.py
+            scenario('appointment-list[PATIENT]', 'get', 'PATIENT'),
+            scenario('appointment-list[DOCTOR]', 'get', 'DOCTOR'),
+            scenario('appointment-list[ADMIN]', 'get', 'ADMIN'),
+            scenario('appointment-create', 'post', 'PATIENT', data=lambda i: {
+                'name': f'Bench visit {i}', 'age': 30, 'sex': 'F', 'address': '1 Bench Street', 'message': 'Headache',
+            }),
+            scenario('appointment-detail', 'get', 'ADMIN', kwargs=lambda i: {'pk': pick(appointments, i)}),
+            scenario('patients-list', 'get', 'DOCTOR'),
+            scenario('testrequest-list[LAB]', 'get', 'LAB'),
+            scenario('testrequest-create', 'post', 'DOCTOR', data=lambda i: {
+                'appointment': pick(requestable, i), 'tests': 'glucose,platelets', 'assigned_to': lab_id,
+            }),
+            scenario('vitalrequest-list[NURSE]', 'get', 'NURSE'),
+            scenario('vitalrequest-create', 'post', 'DOCTOR', data=lambda i: {
+                'appointment': pick(requestable, i), 'assigned_to': nurse_id,
+            }),
+            scenario('vitals-create', 'post', 'NURSE', data=lambda i: {
+                'vital_request': pick(ctx['vital_requests'], i), 'blood_pressure': '120/80', 'pulse_rate': 72,
+            }),
+            scenario('labresult-create', 'post', 'LAB', data=lambda i: {
+                'test_request': pick(ctx['test_requests'], i), 'test_name': 'glucose', 'result': '5.2',
+            }),
+            scenario('medicalreport-create', 'post', 'DOCTOR', data=lambda i: {
+                'appointment': pick(open_appointments, i), 'medical_condition': 'Bench condition',
+            }),
+            scenario('staff-list', 'get', 'ADMIN'),
+            scenario('available-staff', 'get', 'ADMIN', query='role=NURSE'),
+            scenario('appointment-assignments', 'get', 'ADMIN', kwargs=lambda i: {'appointment_id': pick(appointments, i)}),
+            scenario('assign-staff', 'post', 'ADMIN', data=lambda i: {
+                'appointment_id': pick(assignable, i), 'staff_id': nurse_id, 'role': 'NURSE',
+            }),
+            scenario('blog-list-create[GET]', 'get'),
+            scenario('blog-list-create[POST]', 'post', 'ADMIN', data=lambda i: {
+                'title': f'Bench post {i} {time.monotonic_ns()}', 'description': 'Bench',
+                'content': '<h2>One</h2><p>First</p><h2>Two</h2><p>Second</p>',
+            }),
+            scenario('blog-search', 'get', query='q=health'),
+            scenario('blog-latest', 'get'),
+            # Cached copies after the warm-up; [stream] renders every request from the database
+            scenario('blog-sitemap', 'get'),
+            scenario('blog-sitemap[stream]', 'get', settings={'BLOG_RESPONSE_CACHE_ENABLED': False}),
+            scenario('blog-rss', 'get'),
+            scenario('blog-atom', 'get'),
+            scenario('blog-atom[stream]', 'get', settings={'BLOG_RESPONSE_CACHE_ENABLED': False}),
+            scenario('blog-most-read', 'get', query='days=30'),
+            # Neither the response cache nor the ranking's own (a zero timeout): every request ranks the counters
+            scenario('blog-most-read[uncached]', 'get', query='days=30', settings={
+                'BLOG_RESPONSE_CACHE_ENABLED': False, 'BLOG_VIEW_FLUSH_INTERVAL': 0,
+            }),
+            scenario('blog-by-author', 'get', kwargs=lambda i: {'author_id': admin_id}),
+            scenario('blog-detail', 'get', kwargs=lambda i: {'slug': pick(ctx['blog_slugs'], i)}),
+            scenario('blog-admin-all', 'get', 'ADMIN'),
+            scenario('blog-stats', 'get', 'ADMIN'),
+            scenario('api-root', 'get', 'ADMIN'),
+            scenario('assignment-list', 'get', 'ADMIN'),
+            scenario('assignment-detail', 'get', 'ADMIN', kwargs=lambda i: {'pk': assignment_id}),
+            # users/urls.py
+            scenario('token_refresh', 'post', data=lambda i: {'refresh': refresh('PATIENT')}),
+            scenario('token_verify', 'post', data=lambda i: {
+                'token': str(RefreshToken.for_user(self.user('PATIENT')).access_token),
+            }),
+            scenario('register', 'post', data=lambda i: {
+                'username': f'bench_new_{i}', 'email': f'bench_new_{i}@example.com', 'fullname': f'Bench New {i}',
+                'password1': BENCH_PASSWORD, 'password2': BENCH_PASSWORD,
+            }),
+            scenario('login', 'post', data=lambda i: {
+                'username': pick(ctx['usernames']['PATIENT'], i), 'password': BENCH_PASSWORD,
+            }),
+            scenario('logout', 'post', 'PATIENT', data=lambda i: {'refresh': refresh('PATIENT')}),
+            scenario('dashboard', 'get', 'PATIENT'),
+            scenario('update-profile[GET]', 'get', 'PATIENT'),
+            scenario('update-profile[PUT]', 'put', 'PATIENT', data=lambda i: {'phone': f'0803{i:07d}'}),
+            scenario('staff-import', 'post', 'ADMIN', data=lambda i: {'rows': [{
+                'username': f'bench_import_{i}', 'email': f'bench_import_{i}@example.com',
+                'password': BENCH_PASSWORD, 'fullname': f'Imported {i}', 'role': 'NURSE',
+            }]}),
+            scenario('social-auth-success', 'get'),
+            scenario('social-auth-error', 'get'),
+        ]
+
+    def seed_views(self, slugs, days=30):
+        """A month of daily view counts for the published posts, for the most-read ranking"""
+        rng = random.Random(days)
+        today = timezone.localdate()
+        blog_views.write({
+            (today - timedelta(days=day), slug): rng.randint(1, 500) for day in range(days) for slug in slugs
+        })
+
+    def user(self, role):
+        """First seeded account with `role`"""
+        if role not in self.users:
+            self.users[role] = User.objects.get(username=self.ctx['usernames'][role][0])
+        return self.users[role]
+
+    def client_for(self, role):
+        if role is None:
+            return Client()
+        token = RefreshToken.for_user(self.user(role)).access_token
+        return Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def measure(self, scenario, iterations, alloc_iterations):
+        client = self.client_for(scenario['role'])
+        timings, statuses = [], Counter()
+        metrics = RequestMetrics()
+
+        def request(i):
+            url = reverse(scenario['route'], kwargs=scenario['kwargs'](i))
+            if scenario['query']:
+                url = f"{url}?{scenario['query']}"
+            payload = scenario['data'](i) if scenario['data'] else None
+            call = getattr(client, scenario['method'])
+            kwargs = {'secure': True}
+            if payload is not None:
+                kwargs.update(data=json.dumps(payload), content_type='application/json')
+            return lambda: read(call(url, **kwargs))
+
+        def read(response):
+            if response.streaming:
+                # Streamed bodies query as they are read
+                b''.join(response.streaming_content)
+            return response
+
+        if scenario['settings']:
+            # Entries cached by other scenarios would answer under these settings too
+            cache.clear()
+        # Views print progress; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()), override_settings(**scenario['settings']):
+            request(0)()  # warm-up: URL resolution, serializer and template caches
+            for i in range(iterations):
+                send = request(i + 1)
+                with connection.execute_wrapper(QueryCounter(metrics)):
+                    started = time.perf_counter()
+                    response = send()
+                    timings.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] += 1
+
+            peaks = []
+            tracemalloc.start()
+            try:
+                for i in range(alloc_iterations):
+                    send = request(iterations + i + 1)
+                    tracemalloc.reset_peak()
+                    baseline, _ = tracemalloc.get_traced_memory()
+                    send()
+                    _, peak = tracemalloc.get_traced_memory()
+                    peaks.append(peak - baseline)
+            finally:
+                tracemalloc.stop()
+
+        result = summarize(timings)
+        result.update({
+            'method': scenario['method'].upper(),
+            'role': scenario['role'],
+            'queries_per_request': round(metrics.queries / iterations, 2) if iterations else 0.0,
+            'query_budget': budget_for(scenario['route'], scenario['method']),
+            'peak_alloc_kb': round(max(peaks) / 1024, 1) if peaks else None,
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        })
+        return result
+
+    def print_route(self, name, result, baseline):
+        line = (
+            f"{name:<30} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+            f"p99 {result['p99_ms']:>8.2f}ms  {result['queries_per_request']:>7.1f} q  "
+            f"{result['peak_alloc_kb'] or 0:>8.1f} KiB  {result['status_codes']}"
+        )
+        budget = result['query_budget']
+        if budget is not None and result['queries_per_request'] > budget:
+            line += self.style.ERROR(f"  OVER BUDGET ({budget})")
+        previous = (baseline or {}).get('routes', {}).get(name)
+        if previous:
+            line += (
+                f"  | p50 {self.delta(previous['p50_ms'], result['p50_ms'])}"
+                f" p95 {self.delta(previous['p95_ms'], result['p95_ms'])}"
+                f" queries {previous['queries_per_request']} -> {result['queries_per_request']}"
+            )
+        self.stdout.write(line)
+
+    def delta(self, before, after):
+        if not before:
+            return 'n/a'
+        return f"{(after - before) / before * 100:+.0f}%"
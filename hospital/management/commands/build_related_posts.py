@@ -0,0 +1,27 @@
+# hospital/management/commands/build_related_posts.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from hospital.related import MAX_FEATURES, RELATED_COUNT, build
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the related posts shown on blog detail pages (hospital/related.py); '
+        'only posts that may have changed are recomputed unless --full is given'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every ranking')
+        parser.add_argument('--k', type=int, default=RELATED_COUNT, help='Related posts kept per post')
+        parser.add_argument('--max-features', type=int, default=MAX_FEATURES, help='Vocabulary size')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = build(full=options['full'], k=options['k'], max_features=options['max_features'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Full' if result['full'] else 'Incremental'} build: {result['posts']} posts, "
+            f"{result['recomputed']} recomputed, {result.get('updated', 0)} updated, {result['terms']} terms "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
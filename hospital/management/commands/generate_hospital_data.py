@@ -0,0 +1,52 @@
+# hospital/management/commands/generate_hospital_data.py
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital.seeding import BENCH_PASSWORD, HospitalGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a synthetic hospital (staff, patients, appointments, requests, vitals, lab results, '
+        'reports, blog posts) into the configured database with chunked bulk_create - no model hooks or signals'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--staff', type=int, default=100, help='Doctors, nurses, lab scientists and admins')
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--appointments-per-patient', type=int, default=3)
+        parser.add_argument('--results-per-test', type=int, default=2, help='Tests per test request (1-6), one lab result each')
+        parser.add_argument('--blog-posts', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1, help='Same seed and knobs give the same data')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Patients per transaction')
+        parser.add_argument('--prefix', default='gen', help='Username/slug prefix, so several runs can coexist')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Users prefixed '{prefix}_' already exist; pass a different --prefix")
+
+        generator = HospitalGenerator(
+            staff=options['staff'], patients=options['patients'],
+            appointments_per_patient=options['appointments_per_patient'],
+            results_per_test=options['results_per_test'], blog_posts=options['blog_posts'],
+            seed=options['seed'], chunk_size=options['chunk_size'], prefix=prefix,
+        )
+        started = time.perf_counter()
+
+        def progress(label, done, total):
+            rows = sum(generator.counts.values())
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{label:<10} {done:>10}/{total:<10} {rows:>12} rows  {rows / elapsed:>9.0f} rows/s")
+
+        counts = generator.run(progress=progress)
+
+        elapsed = time.perf_counter() - started
+        for model, count in counts.items():
+            self.stdout.write(f"  {model:<14} {count:>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {sum(counts.values())} rows in {elapsed:.1f}s. "
+            f"Log in as {prefix}_admin_0 / {prefix}_doctor_0 / {prefix}_patient_0 with password {BENCH_PASSWORD}"
+        ))
@@ -0,0 +1,65 @@
+# hospital/management/commands/generate_image_variants.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from hospital.images import TARGETS, generate, stale_fields
+
+MODELS = {
+    'blog': 'hospital.BlogPost',
+    'profiles': 'users.Profile',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the responsive image variants (hospital/images.py) that are missing or out of date, '
+        'for blog images and profile pictures'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=[*MODELS, 'all'], default='all')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that are already current')
+        parser.add_argument('--workers', type=int, default=2, help='Rows processed concurrently')
+
+    def handle(self, *args, **options):
+        labels = list(MODELS.values()) if options['model'] == 'all' else [MODELS[options['model']]]
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            for label in labels:
+                started = time.perf_counter()
+                jobs = list(self.jobs(label, options['force']))
+                written = failed = 0
+                for pk, future in [(pk, pool.submit(self.run, label, pk, fields, options['force'])) for pk, fields in jobs]:
+                    try:
+                        written += future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"  {label} {pk}: {e}")
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label}: {len(jobs) - failed} rows, {written} variants written, {failed} failed "
+                    f"in {time.perf_counter() - started:.1f}s"
+                ))
+
+    def jobs(self, label, force):
+        """(pk, stale image fields) for rows with something to do"""
+        model = apps.get_model(label)
+        variants_field, kinds = TARGETS[label]
+        # Rows with an image, or with variants left over from one that was removed
+        has_image = Q()
+        for name in kinds:
+            has_image |= ~Q(**{name: ''}) & Q(**{f'{name}__isnull': False})
+        queryset = model.objects.filter(has_image | ~Q(**{variants_field: {}})).only('pk', variants_field, *kinds)
+        for instance in queryset.iterator(chunk_size=500):
+            fields = list(kinds) if force else stale_fields(instance)
+            if fields:
+                yield instance.pk, fields
+
+    def run(self, label, pk, fields, force):
+        try:
+            return generate(label, pk, fields, force=force)
+        finally:
+            connection.close()
@@ -0,0 +1,26 @@
+# hospital/management/commands/rebuild_blog_search.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from hospital.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the blog full-text index (hospital/search.py) from every BlogPost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(done):
+            self.stdout.write(f"  {done} posts indexed")
+
+        with transaction.atomic():
+            total = rebuild_index(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} posts for {connection.vendor} in {time.perf_counter() - started:.1f}s"
+        ))
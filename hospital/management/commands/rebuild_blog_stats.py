@@ -0,0 +1,15 @@
+# hospital/management/commands/rebuild_blog_stats.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from hospital.blog_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recount the blog stats counters (hospital/blog_stats.py) from every BlogPost'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Counted {total} posts in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,115 @@
+# Full-text index for blog posts (hospital/search.py): FTS5 on SQLite,
+# a weighted tsvector with a GIN index on Postgres. Other vendors get
+# nothing and search falls back to icontains.
+
+import html
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS hospital_blogpost_fts USING fts5(
+        title, description, body,
+        tokenize = 'porter unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+]
+SQLITE_DROP = ["DROP TABLE IF EXISTS hospital_blogpost_fts"]
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE IF NOT EXISTS hospital_blogpost_search (
+        post_id bigint PRIMARY KEY
+            REFERENCES hospital_blogpost (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        body text NOT NULL,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS hospital_blogpost_search_document_gin ON hospital_blogpost_search USING GIN (document)",
+]
+POSTGRES_DROP = ["DROP TABLE IF EXISTS hospital_blogpost_search"]
+
+# The index rows as hospital/search.py wrote them when this migration was
+# added, frozen here so later changes to that module can't alter it
+TAG_RE = re.compile(r'<[^>]+>')
+SPACE_RE = re.compile(r'\s+')
+BATCH_SIZE = 1000
+
+SQLITE_INSERT = "INSERT INTO hospital_blogpost_fts (rowid, title, description, body) VALUES (%s, %s, %s, %s)"
+POSTGRES_INSERT = """
+    INSERT INTO hospital_blogpost_search (post_id, body, document)
+    VALUES (%s, %s,
+        setweight(to_tsvector(%s::regconfig, %s), 'A') ||
+        setweight(to_tsvector(%s::regconfig, %s), 'B') ||
+        setweight(to_tsvector(%s::regconfig, %s), 'C'))
+"""
+
+
+def document_text(content):
+    text = html.unescape(TAG_RE.sub(' ', content or ''))
+    return SPACE_RE.sub(' ', text).strip()
+
+
+def sqlite_rows(batch):
+    return SQLITE_INSERT, [
+        (pk, title, description, document_text(content)) for pk, title, description, content in batch
+    ]
+
+
+def postgres_rows(batch):
+    config = getattr(settings, 'BLOG_SEARCH_CONFIG', 'english')
+    rows = []
+    for pk, title, description, content in batch:
+        body = document_text(content)
+        rows.append((pk, body, config, title, config, description, config, body))
+    return POSTGRES_INSERT, rows
+
+
+ROWS = {'sqlite': sqlite_rows, 'postgresql': postgres_rows}
+
+STATEMENTS = {
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+    'postgresql': (POSTGRES_CREATE, POSTGRES_DROP),
+}
+
+
+def create_index(apps, schema_editor):
+    create, _ = STATEMENTS.get(schema_editor.connection.vendor, ([], []))
+    if not create:
+        return
+    for statement in create:
+        schema_editor.execute(statement)
+
+    BlogPost = apps.get_model('hospital', 'BlogPost')
+    rows = BlogPost.objects.using(schema_editor.connection.alias).order_by('pk').values_list(
+        'pk', 'title', 'description', 'content',
+    )
+    batch = []
+    with schema_editor.connection.cursor() as cursor:
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(*ROWS[schema_editor.connection.vendor](batch))
+                batch = []
+        if batch:
+            cursor.executemany(*ROWS[schema_editor.connection.vendor](batch))
+
+
+def drop_index(apps, schema_editor):
+    _, drop = STATEMENTS.get(schema_editor.connection.vendor, ([], []))
+    for statement in drop:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0009_assignment'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,180 @@
+# Subheadings point into BlogPost.content by offsets instead of carrying a
+# copy of each section's HTML (hospital/outline.py).
+
+import re
+from html.parser import HTMLParser
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Subheading extraction as hospital/outline.py did it when this migration
+# was added, frozen here so later changes to that module can't alter it
+HEADING_TAG_RE = re.compile(r'<(/?)h([1-6])(?=[\s/>])[^>]*>', re.IGNORECASE)
+DESCRIPTION_LENGTH = 200
+MAX_SUBHEADINGS = 6
+FEED_CHUNK = 4096
+
+
+class TextParser(HTMLParser):
+    """Text of an HTML fragment, tags dropped and entities kept; `limit` caps it (see `truncated`)"""
+
+    def __init__(self, limit=None):
+        super().__init__(convert_charrefs=False)
+        self.limit = limit
+        self.parts = []
+        self.length = 0
+        self.truncated = False
+
+    def handle_data(self, data):
+        if self.truncated:
+            return
+        if not self.parts:
+            data = data.lstrip()
+            if not data:
+                return
+        if self.limit is not None:
+            room = self.limit - self.length
+            if room < len(data):
+                self.truncated = bool(data[max(room, 0):].strip())
+                data = data[:max(room, 0)]
+        if data:
+            self.parts.append(data)
+            self.length += len(data)
+
+    def handle_entityref(self, name):
+        self.handle_data(f'&{name};')
+
+    def handle_charref(self, name):
+        self.handle_data(f'&#{name};')
+
+    def read(self, content, start, end):
+        for position in range(start, end, FEED_CHUNK):
+            self.feed(content[position:min(position + FEED_CHUNK, end)])
+            if self.truncated:
+                break
+        self.close()
+        return self
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+
+def _trimmed(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _description(content, start, end):
+    parser = TextParser(limit=DESCRIPTION_LENGTH).read(content, start, end)
+    return parser.text + '...' if parser.truncated else parser.text.rstrip()
+
+
+def _headings(content):
+    found = []
+    open_level = open_end = None
+    for match in HEADING_TAG_RE.finditer(content):
+        closing, level = match.group(1), int(match.group(2))
+        if not closing:
+            if found and found[-1][4] is None:
+                found[-1][4] = match.start()
+            open_level, open_end = level, match.end()
+        elif level == open_level:
+            found.append([level, open_end, match.start(), match.end(), None])
+            open_level = None
+    if found and found[-1][4] is None:
+        found[-1][4] = len(content)
+    return found
+
+
+def extract_subheadings(content, description=''):
+    content = content or ''
+    found = _headings(content)
+    subheadings = []
+    for level, title_start, title_end, section_start, section_end in found[:MAX_SUBHEADINGS]:
+        start, end = _trimmed(content, section_start, section_end)
+        subheadings.append({
+            'title': TextParser().read(content, title_start, title_end).text.strip(),
+            'level': level,
+            'description': _description(content, section_start, section_end),
+            'start': start,
+            'end': end,
+        })
+    if not found and description:
+        # No headings: two pseudo-sections from the description
+        start = 0
+        for number, line in enumerate(description.split('. ')[:2], start=1):
+            subheadings.append({
+                'title': f"Section {number}",
+                'level': 2,
+                'description': line[:DESCRIPTION_LENGTH] + ('...' if len(line) > DESCRIPTION_LENGTH else ''),
+                'source': 'description',
+                'start': start,
+                'end': start + len(line),
+            })
+            start += len(line) + 2
+    return subheadings
+
+
+def section_html(subheading, content, description=''):
+    if 'full_content' in subheading:
+        return subheading['full_content']
+    source = description if subheading.get('source') == 'description' else content
+    return (source or '')[subheading['start']:subheading['end']]
+
+
+def _rewrite(apps, convert, fields):
+    BlogPost = apps.get_model('hospital', 'BlogPost')
+    batch = []
+    for post in BlogPost.objects.only('id', 'content', 'description', 'enable_toc', 'subheadings').iterator(
+        chunk_size=BATCH_SIZE,
+    ):
+        convert(post)
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            BlogPost.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        BlogPost.objects.bulk_update(batch, fields)
+
+
+def to_offsets(apps, schema_editor):
+    def convert(post):
+        # save() never extracted anything from posts without content
+        if post.content:
+            post.subheadings = extract_subheadings(post.content, post.description)
+
+    # content_hash stays empty, so the next save refreshes the TOC as well
+    _rewrite(apps, convert, ['subheadings'])
+
+
+def to_copies(apps, schema_editor):
+    def convert(post):
+        post.subheadings = [
+            {
+                'title': subheading['title'],
+                'level': subheading['level'],
+                'description': subheading['description'],
+                'full_content': section_html(subheading, post.content, post.description),
+            }
+            for subheading in post.subheadings
+        ]
+        # Re-extract on the next save
+        post.content_hash = ''
+
+    _rewrite(apps, convert, ['subheadings', 'content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0011_blogpost_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_offsets, to_copies),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:03
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def count_posts(apps, schema_editor):
+    # hospital.blog_stats.rebuild() as it was when this migration was added, frozen here
+    BlogPost = apps.get_model('hospital', 'BlogPost')
+    BlogStatCounter = apps.get_model('hospital', 'BlogStatCounter')
+    grouped = BlogPost.objects.order_by().values('author_id', month=TruncMonth('created_at')).annotate(
+        total=Count('id'),
+        published_count=Count('id', filter=Q(published=True)),
+        with_toc=Count('id', filter=Q(enable_toc=True)),
+    )
+    rows = defaultdict(lambda: [0, 0, 0])
+    for group in grouped:
+        month = timezone.localtime(group['month']).strftime('%Y-%m')
+        counts = (group['total'], group['published_count'], group['with_toc'])
+        for row in (('total', ''), ('author', str(group['author_id'])), ('month', month)):
+            for index, count in enumerate(counts):
+                rows[row][index] += count
+    rows.setdefault(('total', ''), [0, 0, 0])
+    BlogStatCounter.objects.bulk_create([
+        BlogStatCounter(
+            scope=scope, key=key, author_id=int(key) if scope == 'author' else None,
+            total=total, published=published, with_toc=with_toc,
+        )
+        for (scope, key), (total, published, with_toc) in rows.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0012_blogpost_subheading_offsets'),
+        ('users', '0004_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogStatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('total', 'All posts'), ('author', 'Author'), ('month', 'Month')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('published', models.IntegerField(default=0)),
+                ('with_toc', models.IntegerField(default=0)),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.profile')),
+            ],
+            options={
+                'ordering': ['scope', 'key'],
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+        migrations.RunPython(count_posts, migrations.RunPython.noop),
+    ]
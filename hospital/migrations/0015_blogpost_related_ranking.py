@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0014_blogpost_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='related_ranking',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='related_signature',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
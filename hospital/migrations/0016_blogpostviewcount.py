@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0015_blogpost_related_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogPostViewCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_counts', to='hospital.blogpost')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='hospital_bl_day_2487e4_idx')],
+                'unique_together': {('post', 'day')},
+            },
+        ),
+    ]
@@ -6,6 +6,8 @@ import random
 import json
 from django.utils.text import slugify
 
+from .outline import content_fingerprint, extract_outline, section_html
+
 SEX_CHOICES = (('M', 'Male'), ('F', 'Female'), ('O', 'Other'))
 
 APPOINTMENT_STATUS = (
@@ -203,6 +205,10 @@ class MedicalReport(models.Model):
 
 # ---------------- Blog Section ---------------- #
 # hospital/models.py - Update BlogPost model
+# Fields BlogPost.stat_state() reads
+STAT_FIELDS = frozenset({'author_id', 'published', 'enable_toc', 'created_at'})
+
+
 class BlogPost(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -212,6 +218,8 @@ class BlogPost(models.Model):
     featured_image = models.ImageField(upload_to='blog_images/', null=True, blank=True)
     image_1 = models.ImageField(upload_to='blog_images/', null=True, blank=True)
     image_2 = models.ImageField(upload_to='blog_images/', null=True, blank=True)
+    # Resized WebP/JPEG copies of the three images above (hospital/images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     published = models.BooleanField(default=False)
     published_date = models.DateTimeField(null=True, blank=True)
@@ -223,7 +231,15 @@ class BlogPost(models.Model):
     # Table of Contents + auto extracted subheadings
     table_of_contents = models.JSONField(default=list, blank=True)
     enable_toc = models.BooleanField(default=True)
+    # Offsets into content rather than copies of it (hospital/outline.py)
     subheadings = models.JSONField(default=list, blank=True)
+    # content_fingerprint() of the text the two fields above were extracted from
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    # Most similar published posts, best first: [{'id': ..., 'score': ...}] (hospital/related.py)
+    related_ranking = models.JSONField(default=list, blank=True, editable=False)
+    # document_signature() of the text and state the ranking was computed from
+    related_signature = models.CharField(max_length=40, blank=True, editable=False)
 
     class Meta:
         ordering = ['-published_date', '-created_at']
@@ -231,6 +247,20 @@ class BlogPost(models.Model):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the stats counters (hospital/blog_stats.py) have this post down as, so
+        # a save only counts the change; unknown when a counted field was deferred
+        if STAT_FIELDS.isdisjoint(instance.get_deferred_fields()):
+            instance._stat_state = instance.stat_state()
+        return instance
+
+    def stat_state(self):
+        """(author_id, published, enable_toc, creation month) as the stats counters see this post"""
+        created = self.created_at or timezone.now()
+        return (self.author_id, bool(self.published), bool(self.enable_toc), timezone.localtime(created).strftime('%Y-%m'))
+
     def save(self, *args, **kwargs):
 
         # Set published date
@@ -241,68 +271,87 @@ class BlogPost(models.Model):
         if not self.slug:
             self.slug = slugify(self.title)
 
-        # Generate TOC + subheadings
-        if self.content:
-            if self.enable_toc:
-                self.generate_table_of_contents()
-            self.extract_subheadings()
+        # Generate TOC + subheadings, unless the text they come from is unchanged
+        if self.content and self.refresh_outline():
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'table_of_contents', 'subheadings', 'content_hash'}
 
         super().save(*args, **kwargs)
 
     # ------------------------------
-    # TABLE OF CONTENTS GENERATOR
+    # TABLE OF CONTENTS + SUBHEADINGS (hospital/outline.py)
     # ------------------------------
+    def refresh_outline(self, force=False):
+        """Re-extract TOC and subheadings when content/description/enable_toc changed; True if it ran"""
+        fingerprint = content_fingerprint(self.content, self.description, self.enable_toc)
+        if not force and fingerprint == self.content_hash:
+            return False
+        toc, self.subheadings = extract_outline(self.content, self.description, with_toc=self.enable_toc)
+        if toc is not None:
+            self.table_of_contents = toc
+        self.content_hash = fingerprint
+        return True
+
+    def subheadings_with_content(self):
+        """Stored subheadings with each section's HTML sliced back in as `full_content`"""
+        return [
+            {
+                'title': subheading['title'],
+                'level': subheading['level'],
+                'description': subheading['description'],
+                'full_content': section_html(subheading, self.content, self.description),
+            }
+            for subheading in self.subheadings
+        ]
+
     def generate_table_of_contents(self):
-        import re
+        self.table_of_contents, _ = extract_outline(self.content, self.description)
+
+    def extract_subheadings(self):
+        _, self.subheadings = extract_outline(self.content, self.description, with_toc=False)
+
+
+class BlogStatCounter(models.Model):
+    """
+    Running post counts behind the blog stats endpoint, one row per scope
+    and key: the whole blog, an author or a creation month. Kept current
+    from BlogPost save/delete by hospital/blog_stats.py.
+    """
+    SCOPE_CHOICES = [
+        ('total', 'All posts'),
+        ('author', 'Author'),
+        ('month', 'Month'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    # '' for the total, the author id, or 'YYYY-MM'
+    key = models.CharField(max_length=20, blank=True)
+    author = models.ForeignKey(Profile, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    total = models.IntegerField(default=0)
+    published = models.IntegerField(default=0)
+    with_toc = models.IntegerField(default=0)
 
-        pattern = r'<h([1-6])[^>]*>(.*?)</h\1>'
-        headings = re.findall(pattern, self.content)
+    class Meta:
+        unique_together = ('scope', 'key')
+        ordering = ['scope', 'key']
 
-        toc_items = []
-        for level, html_title in headings:
-            clean_title = re.sub(r'<[^>]+>', '', html_title).strip()
-            anchor = slugify(clean_title)
-            toc_items.append({
-                "id": len(toc_items) + 1,
-                "title": clean_title,
-                "anchor": anchor,
-                "level": int(level)
-            })
+    def __str__(self):
+        return f"{self.scope} {self.key}: {self.total}"
 
-        self.table_of_contents = toc_items
 
-    # ------------------------------
-    # SUBHEADINGS EXTRACTOR
-    # ------------------------------
-    def extract_subheadings(self):
-        import re
-
-        pattern = r'<h([1-6])[^>]*>(.*?)</h\1>(.*?)(?=<h[1-6]|$)'
-        matches = re.findall(pattern, self.content or "", re.DOTALL)
-
-        structured = []
-
-        if matches:
-            for level, html_title, section_body in matches:
-                clean_title = re.sub(r'<[^>]+>', '', html_title).strip()
-                clean_desc = re.sub(r'<[^>]+>', '', section_body).strip()
-
-                structured.append({
-                    "title": clean_title,
-                    "level": int(level),
-                    "description": clean_desc[:200] + ("..." if len(clean_desc) > 200 else ""),
-                    "full_content": section_body.strip()
-                })
-        else:
-            # fallback using description
-            if self.description:
-                lines = self.description.split(". ")[:2]
-                for i, line in enumerate(lines):
-                    structured.append({
-                        "title": f"Section {i+1}",
-                        "level": 2,
-                        "description": line[:200] + ("..." if len(line) > 200 else ""),
-                        "full_content": line
-                    })
-
-        self.subheadings = structured[:6]
+class BlogPostViewCount(models.Model):
+    """
+    Page views of a post on one day. Views are buffered in each process
+    and added here in batches by hospital/blog_views.py.
+    """
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='view_counts')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'day')
+        indexes = [models.Index(fields=['day'])]
+
+    def __str__(self):
+        return f"{self.post_id} {self.day}: {self.views}"
@@ -0,0 +1,182 @@
+# hospital/outline.py
+"""
+Table of contents and subheadings of a blog post in one pass over its HTML.
+
+extract_outline() walks `content` once, front to back, stopping only at
+<h1>-<h6> tags; the section of a heading runs from its closing tag to the
+next heading or the end of the post. The text of each heading, and the
+first 200 characters of text in its section, come from html.parser fed
+just those bytes, a few KB at a time, and it stops as soon as it has
+enough, so however long a section is only its start is parsed. Entities
+are kept as written, matching what the stored titles always were. Every
+step moves forward, so the cost is linear in the size of the post; the
+regexes this replaced re-scanned the rest of the post from every
+unclosed heading.
+
+Subheadings don't copy their section's HTML: each stores `start`/`end`
+character offsets of the (whitespace-trimmed) section in `content`, or in
+`description` for the pseudo-sections of a post without headings
+(`source`: 'description'); section_html() slices it back out on demand.
+
+BlogPost.save() calls extract_outline() only when content_fingerprint()
+differs from the stored content_hash, so saves that don't touch the text
+(publishing, toggling images, ...) skip it entirely.
+"""
+import hashlib
+import re
+from html.parser import HTMLParser
+
+from django.utils.text import slugify
+
+HEADING_TAG_RE = re.compile(r'<(/?)h([1-6])(?=[\s/>])[^>]*>', re.IGNORECASE)
+DESCRIPTION_LENGTH = 200
+MAX_SUBHEADINGS = 6
+FEED_CHUNK = 4096
+# Bump when the outline format changes, so every post is re-extracted on its next save
+OUTLINE_VERSION = 2
+
+
+def content_fingerprint(content, description, enable_toc):
+    """Hash of everything the outline depends on"""
+    digest = hashlib.sha256(f"v{OUTLINE_VERSION}:{int(bool(enable_toc))}:".encode())
+    digest.update((description or '').encode())
+    digest.update(b'\0')
+    digest.update((content or '').encode())
+    return digest.hexdigest()
+
+
+class TextParser(HTMLParser):
+    """
+    Text of an HTML fragment with tags dropped and entities left as written.
+    With `limit`, keeps the first `limit` characters after leading
+    whitespace and notes whether any non-blank text follows (`truncated`).
+    """
+
+    def __init__(self, limit=None):
+        super().__init__(convert_charrefs=False)
+        self.limit = limit
+        self.parts = []
+        self.length = 0
+        self.truncated = False
+
+    def handle_data(self, data):
+        if self.truncated:
+            return
+        if not self.parts:
+            data = data.lstrip()
+            if not data:
+                return
+        if self.limit is not None:
+            room = self.limit - self.length
+            if room < len(data):
+                self.truncated = bool(data[max(room, 0):].strip())
+                data = data[:max(room, 0)]
+        if data:
+            self.parts.append(data)
+            self.length += len(data)
+
+    def handle_entityref(self, name):
+        self.handle_data(f'&{name};')
+
+    def handle_charref(self, name):
+        self.handle_data(f'&#{name};')
+
+    def read(self, content, start, end):
+        """Feed content[start:end] in chunks until done or, with a limit, truncated"""
+        for position in range(start, end, FEED_CHUNK):
+            self.feed(content[position:min(position + FEED_CHUNK, end)])
+            if self.truncated:
+                break
+        self.close()
+        return self
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+
+def _title(content, start, end):
+    return TextParser().read(content, start, end).text.strip()
+
+
+def _trimmed(text, start, end):
+    """(start, end) of text[start:end].strip() without copying the section"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def section_html(subheading, content, description=''):
+    """The HTML (or description text) a stored subheading points at"""
+    if 'full_content' in subheading:
+        # Stored before subheadings became offsets
+        return subheading['full_content']
+    source = description if subheading.get('source') == 'description' else content
+    return (source or '')[subheading['start']:subheading['end']]
+
+
+def _description(content, start, end):
+    parser = TextParser(limit=DESCRIPTION_LENGTH).read(content, start, end)
+    return parser.text + '...' if parser.truncated else parser.text.rstrip()
+
+
+def headings(content):
+    """[[level, title_start, title_end, section_start, section_end], ...] in document order"""
+    found = []
+    open_level = open_end = None
+    for match in HEADING_TAG_RE.finditer(content):
+        closing, level = match.group(1), int(match.group(2))
+        if not closing:
+            if found and found[-1][4] is None:
+                found[-1][4] = match.start()
+            open_level, open_end = level, match.end()
+        elif level == open_level:
+            found.append([level, open_end, match.start(), match.end(), None])
+            open_level = None
+    if found and found[-1][4] is None:
+        found[-1][4] = len(content)
+    return found
+
+
+def extract_outline(content, description='', with_toc=True):
+    """
+    (table_of_contents, subheadings) for a post, in the shapes BlogPost
+    stores; table_of_contents is None when with_toc is False.
+    """
+    content = content or ''
+    found = headings(content)
+    titles = [_title(content, start, end) for _, start, end, _, _ in found]
+
+    toc = None
+    if with_toc:
+        toc = [
+            {'id': number, 'title': title, 'anchor': slugify(title), 'level': level}
+            for number, (title, (level, *_)) in enumerate(zip(titles, found), start=1)
+        ]
+
+    subheadings = []
+    for title, (level, _, _, section_start, section_end) in zip(titles, found[:MAX_SUBHEADINGS]):
+        start, end = _trimmed(content, section_start, section_end)
+        subheadings.append({
+            'title': title,
+            'level': level,
+            'description': _description(content, section_start, section_end),
+            'start': start,
+            'end': end,
+        })
+    if not found and description:
+        # No headings: two pseudo-sections from the description
+        start = 0
+        for number, line in enumerate(description.split('. ')[:2], start=1):
+            subheadings.append({
+                'title': f"Section {number}",
+                'level': 2,
+                'description': line[:DESCRIPTION_LENGTH] + ('...' if len(line) > DESCRIPTION_LENGTH else ''),
+                'source': 'description',
+                'start': start,
+                'end': start + len(line),
+            })
+            start += len(line) + 2
+    return toc, subheadings
@@ -0,0 +1,200 @@
+# hospital/related.py
+"""
+"Related posts" for blog detail pages, precomputed with TF-IDF.
+
+Each post becomes a document of its title (counted twice), description
+and headings (table_of_contents, or its extracted subheadings when the
+TOC is off). Terms are weighted with sublinear tf (1 + log tf) times
+smoothed idf, log((1 + n) / (1 + df)) + 1, keeping the MAX_FEATURES
+terms found in most posts; rows are L2-normalised, so the cosine
+similarity of every pair is one matrix product. Products are taken a
+block of rows at a time (BLOCK_SIZE x published posts) and the top k of
+each row picked with argpartition, so memory stays at one block of
+scores plus the dense float32 term matrix (posts x MAX_FEATURES x 4
+bytes: 16 MB per 1,000 posts).
+
+Every post gets a ranking (drafts too, for admins previewing them), but
+only published posts are ranked. The ranking is stored on the post with
+its scores, next to a signature of everything it was computed from.
+build() recomputes only what can have changed since the last run,
+unless asked for a full rebuild or more than FULL_REBUILD_RATIO of the
+posts changed:
+
+- posts whose signature changed (edited, published or unpublished, new);
+- posts whose ranking lists a changed, deleted or unpublished post;
+- posts for which a changed post now scores above their k-th neighbour.
+
+Term weights are recomputed from every post each run, so an incremental
+run does not reproduce a full one: the rankings it recomputes match a
+full rebuild's, but those it leaves alone keep scores (and, near ties,
+an order) from older weights. The incremental job runs every few
+minutes and a nightly `build_related_posts --full` resets the drift
+(render.yaml).
+
+The detail endpoint turns a ranking into posts with one primary-key
+lookup. Detail responses are cached (hospital/blog_cache.py), so a build
+that changes rankings bumps the blog version stamp; that reaches the web
+workers only through the cache they share, which is why the cron jobs in
+render.yaml get the same Redis settings as the web service.
+"""
+import hashlib
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+
+from . import blog_cache
+from .models import BlogPost
+
+TERM_RE = re.compile(r'[^\W\d_]{2,}', re.UNICODE)
+STOP_WORDS = frozenset("""
+    a about above after again against all also am an and any are as at be because been before being below
+    between both but by can could did do does doing down during each few for from further had has have
+    having he her here hers herself him himself his how i if in into is it its itself just me more most my
+    myself no nor not now of off on once only or other our ours ourselves out over own same she should so
+    some such than that the their theirs them themselves then there these they this those through to too
+    under until up very was we were what when where which while who whom why will with you your yours
+    yourself yourselves
+""".split())
+
+RELATED_COUNT = 4
+MIN_SCORE = 0.05
+MAX_FEATURES = 4096
+BLOCK_SIZE = 512
+FULL_REBUILD_RATIO = 0.2
+FIELDS = ('id', 'title', 'description', 'table_of_contents', 'subheadings', 'published',
+          'related_signature', 'related_ranking')
+
+
+def terms(text):
+    return [term for term in TERM_RE.findall((text or '').lower()) if term not in STOP_WORDS]
+
+
+def headings(table_of_contents, subheadings):
+    entries = table_of_contents or [s for s in subheadings or [] if s.get('source') != 'description']
+    return ' '.join(entry.get('title', '') for entry in entries)
+
+
+def document_terms(title, description, table_of_contents, subheadings):
+    title_terms = terms(title)
+    return title_terms + title_terms + terms(description) + terms(headings(table_of_contents, subheadings))
+
+
+def document_signature(title, description, table_of_contents, subheadings, published):
+    text = '\0'.join([title or '', description or '', headings(table_of_contents, subheadings), str(bool(published))])
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def tfidf_matrix(documents, max_features=MAX_FEATURES):
+    """(n x terms float32 matrix with L2-normalised rows, vocabulary) for lists of terms"""
+    counts = [Counter(document) for document in documents]
+    df = Counter(term for document in counts for term in document)
+    vocabulary = [term for term, _ in sorted(df.items(), key=lambda item: (-item[1], item[0]))[:max_features]]
+    column = {term: index for index, term in enumerate(vocabulary)}
+    n = len(documents)
+    idf = np.array([math.log((1 + n) / (1 + df[term])) + 1 for term in vocabulary], dtype=np.float32)
+
+    matrix = np.zeros((n, len(vocabulary)), dtype=np.float32)
+    for row, document in enumerate(counts):
+        for term, count in document.items():
+            index = column.get(term)
+            if index is not None:
+                matrix[row, index] = 1 + math.log(count)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix, vocabulary
+
+
+def top_neighbours(matrix, rows, candidates, ids, k=RELATED_COUNT, min_score=MIN_SCORE, block_size=BLOCK_SIZE):
+    """{row: [{'id', 'score'}, ...]} for each of `rows`, ranked among the `candidates` rows (in id order)"""
+    candidate_matrix = matrix[candidates].T
+    candidate_ids = ids[candidates]
+    rankings = {}
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        # Rounded as stored, so equal scores tie exactly whichever block computed them
+        scores = np.round(matrix[block] @ candidate_matrix, 4)
+        # A post is not related to itself
+        scores[candidate_ids[None, :] == ids[block][:, None]] = -1.0
+        keep = min(k, scores.shape[1])
+        if keep == 0:
+            rankings.update({row: [] for row in block})
+            continue
+        kth = -np.partition(-scores, keep - 1, axis=1)[:, keep - 1]
+        for row, values, floor in zip(block, scores, kth):
+            # Everything tied with the k-th, in id order, then a stable sort: ties go to the older post
+            columns = np.flatnonzero(values >= max(floor, min_score))
+            columns = columns[np.argsort(-values[columns], kind='stable')[:keep]]
+            rankings[row] = [
+                {'id': int(candidate_ids[column]), 'score': round(float(values[column]), 4)} for column in columns
+            ]
+    return rankings
+
+
+def _affected_rows(matrix, posts, ids, candidates, changed, k):
+    """Rows whose ranking may differ now that `changed` rows did (see module docstring)"""
+    affected = set(changed)
+    changed_ids = {int(ids[row]) for row in changed}
+    candidate_ids = {int(ids[row]) for row in candidates}
+    for row, post in enumerate(posts):
+        if any(entry['id'] in changed_ids or entry['id'] not in candidate_ids for entry in post['related_ranking']):
+            affected.add(row)
+
+    candidate_rows = set(candidates.tolist())
+    changed_candidates = np.array([row for row in changed if row in candidate_rows], dtype=np.int64)
+    if len(changed_candidates):
+        # For every post: the best score any changed post now reaches, against its current k-th
+        best = np.full(len(posts), -1.0, dtype=np.float32)
+        for start in range(0, len(changed_candidates), BLOCK_SIZE):
+            block = changed_candidates[start:start + BLOCK_SIZE]
+            scores = matrix[block] @ matrix.T
+            scores[ids[block][:, None] == ids[None, :]] = -1.0
+            best = np.maximum(best, scores.max(axis=0))
+        for row, post in enumerate(posts):
+            ranking = post['related_ranking']
+            threshold = ranking[-1]['score'] if len(ranking) >= k else MIN_SCORE
+            if best[row] >= threshold:
+                affected.add(row)
+    return sorted(affected)
+
+
+def build(full=False, k=RELATED_COUNT, max_features=MAX_FEATURES):
+    """Bring every post's related ranking up to date; returns counts of what was done"""
+    posts = list(BlogPost.objects.order_by('pk').values(*FIELDS))
+    if not posts:
+        return {'posts': 0, 'recomputed': 0, 'full': full, 'terms': 0}
+
+    signatures = [
+        document_signature(post['title'], post['description'], post['table_of_contents'], post['subheadings'],
+                           post['published'])
+        for post in posts
+    ]
+    matrix, vocabulary = tfidf_matrix(
+        [document_terms(post['title'], post['description'], post['table_of_contents'], post['subheadings'])
+         for post in posts],
+        max_features=max_features,
+    )
+    ids = np.array([post['id'] for post in posts], dtype=np.int64)
+    candidates = np.array([row for row, post in enumerate(posts) if post['published']], dtype=np.int64)
+    changed = [row for row, post in enumerate(posts) if post['related_signature'] != signatures[row]]
+
+    full = full or len(changed) > FULL_REBUILD_RATIO * len(posts)
+    rows = list(range(len(posts))) if full else _affected_rows(matrix, posts, ids, candidates, changed, k)
+    rankings = top_neighbours(matrix, rows, candidates, ids, k=k)
+
+    updates = []
+    for row in rows:
+        post = posts[row]
+        if rankings[row] != post['related_ranking'] or signatures[row] != post['related_signature']:
+            updates.append(BlogPost(pk=post['id'], related_ranking=rankings[row], related_signature=signatures[row]))
+    with transaction.atomic():
+        # bulk_update skips post_save: rankings don't touch the search index, stats or images
+        BlogPost.objects.bulk_update(updates, ['related_ranking', 'related_signature'], batch_size=500)
+        if updates:
+            # Detail responses embed the related posts
+            blog_cache.invalidate()
+    return {'posts': len(posts), 'recomputed': len(rows), 'updated': len(updates), 'full': full,
+            'terms': len(vocabulary)}
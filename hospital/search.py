@@ -0,0 +1,262 @@
+# hospital/search.py
+"""
+Full-text search over blog posts.
+
+One interface, two engines picked by database vendor:
+
+- SQLite: an FTS5 table (hospital_blogpost_fts) keyed by post id, ranked
+  with bm25 and highlighted with snippet().
+- Postgres: hospital_blogpost_search, a weighted tsvector per post with a
+  GIN index, ranked with ts_rank_cd and highlighted with ts_headline.
+
+Both tables are created by migration 0010 and hold title, description
+and the text of `content` (HTML stripped), weighted in that order. Rows
+are maintained from BlogPost post_save/post_delete (hospital/signals.py),
+inside the same transaction as the post itself; bulk_create bypasses the
+signals, so bulk writers call index_posts() themselves and
+`manage.py rebuild_blog_search` rebuilds everything.
+
+User input is reduced to word tokens, all required; the last one also
+matches as a prefix so results follow the user as they type. Snippets
+mark hits with <mark>…</mark> around otherwise HTML-escaped text. Other
+database vendors fall back to icontains without ranking.
+"""
+import html
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.models import Q
+from django.utils.html import escape
+
+from .models import BlogPost
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TAG_RE = re.compile(r'<[^>]+>')
+SPACE_RE = re.compile(r'\s+')
+MAX_TOKENS = 8
+# Private-use characters survive escaping, then become <mark> tags
+HIT_START, HIT_END = '\ue000', '\ue001'
+INDEX_BATCH_SIZE = 1000
+
+
+def document_text(content):
+    """Plain text of a post's HTML content; tags become spaces so '</h2><p>' doesn't join words"""
+    text = html.unescape(TAG_RE.sub(' ', content or ''))
+    return SPACE_RE.sub(' ', text).strip()
+
+
+def query_tokens(query):
+    return TOKEN_RE.findall((query or '').lower())[:MAX_TOKENS]
+
+
+def highlight(snippet):
+    return escape(snippet or '').replace(HIT_START, '<mark>').replace(HIT_END, '</mark>')
+
+
+class SearchHit:
+    __slots__ = ('post_id', 'rank', 'snippet')
+
+    def __init__(self, post_id, rank, snippet):
+        self.post_id = post_id
+        self.rank = rank
+        self.snippet = snippet
+
+
+class SQLiteSearchBackend:
+    table = 'hospital_blogpost_fts'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def match_expression(self, tokens):
+        terms = [f'"{token}"' for token in tokens[:-1]]
+        last = tokens[-1]
+        terms.append(f'("{last}" OR "{last}"*)')
+        return ' AND '.join(terms)
+
+    def search(self, query, limit, published_only=True):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        published = 'AND p.published' if published_only else ''
+        sql = f"""
+            SELECT f.rowid, bm25({self.table}, 10.0, 4.0, 1.0) AS rank,
+                   snippet({self.table}, -1, %s, %s, '…', 24)
+            FROM {self.table} f JOIN hospital_blogpost p ON p.id = f.rowid
+            WHERE {self.table} MATCH %s {published}
+            ORDER BY rank
+            LIMIT %s
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [HIT_START, HIT_END, self.match_expression(tokens), limit])
+            # bm25 is lower-is-better; flip it so every backend ranks higher-is-better
+            return [SearchHit(row[0], -row[1], highlight(row[2])) for row in cursor.fetchall()]
+
+    def index(self, rows, replace=True):
+        """rows: (id, title, description, content); replace=False when none of them is indexed yet"""
+        rows = [(pk, title, description, document_text(content)) for pk, title, description, content in rows]
+        with self.connection.cursor() as cursor:
+            if replace:
+                cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, title, description, body) VALUES (%s, %s, %s, %s)", rows,
+            )
+
+    def remove(self, post_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in post_ids])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def optimize(self):
+        """Merge the FTS5 b-tree segments after a bulk load"""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+
+class PostgresSearchBackend:
+    table = 'hospital_blogpost_search'
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.config = getattr(settings, 'BLOG_SEARCH_CONFIG', 'english')
+
+    def tsquery(self, tokens):
+        terms = list(tokens[:-1])
+        last = tokens[-1]
+        terms.append(f'({last} | {last}:*)')
+        return ' & '.join(terms)
+
+    def search(self, query, limit, published_only=True):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        published = 'AND p.published' if published_only else ''
+        # ts_headline re-parses the body, so only the top `limit` rows get one
+        sql = f"""
+            SELECT top.post_id, top.rank, ts_headline(%s::regconfig, top.body, top.query, %s)
+            FROM (
+                SELECT s.post_id, s.body, q.query, ts_rank_cd(s.document, q.query) AS rank
+                FROM {self.table} s
+                JOIN hospital_blogpost p ON p.id = s.post_id,
+                     to_tsquery(%s::regconfig, %s) AS q(query)
+                WHERE s.document @@ q.query {published}
+                ORDER BY rank DESC
+                LIMIT %s
+            ) top
+            ORDER BY top.rank DESC
+        """
+        options = f'StartSel={HIT_START}, StopSel={HIT_END}, MinWords=12, MaxWords=30, MaxFragments=1'
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [self.config, options, self.config, self.tsquery(tokens), limit])
+            return [SearchHit(row[0], row[1], highlight(row[2])) for row in cursor.fetchall()]
+
+    def index(self, rows, replace=True):
+        config = self.config
+        params = []
+        for pk, title, description, content in rows:
+            body = document_text(content)
+            # The body is bound twice: as the stored text (for ts_headline) and for its tsvector
+            params.append((pk, body, config, title, config, description, config, body))
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"""
+                INSERT INTO {self.table} (post_id, body, document)
+                VALUES (%s, %s,
+                    setweight(to_tsvector(%s::regconfig, %s), 'A') ||
+                    setweight(to_tsvector(%s::regconfig, %s), 'B') ||
+                    setweight(to_tsvector(%s::regconfig, %s), 'C'))
+                ON CONFLICT (post_id) DO UPDATE SET body = EXCLUDED.body, document = EXCLUDED.document
+            """, params)
+
+    def remove(self, post_ids):
+        # ON DELETE CASCADE covers deleted posts; this is for explicit removal
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE post_id = ANY(%s)", [list(post_ids)])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+
+    def optimize(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {self.table}")
+
+
+class FallbackSearchBackend:
+    """Unindexed icontains search for databases without a full-text engine here"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def search(self, query, limit, published_only=True):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        queryset = BlogPost.objects.filter(published=True) if published_only else BlogPost.objects.all()
+        for token in tokens:
+            queryset = queryset.filter(
+                Q(title__icontains=token) | Q(description__icontains=token) | Q(content__icontains=token)
+            )
+        rows = queryset.order_by('-created_at').values_list('id', 'description')[:limit]
+        return [SearchHit(pk, 0.0, escape(description[:200])) for pk, description in rows]
+
+    def index(self, rows, replace=True):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def optimize(self):
+        pass
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)(connection)
+
+
+def search_posts(query, limit=20, published_only=True):
+    """Best matches for `query`, most relevant first: [SearchHit, ...]"""
+    return get_backend().search(query, limit, published_only=published_only)
+
+
+def index_posts(posts, created=False):
+    """(Re)index saved BlogPost instances; created=True skips clearing old rows for brand new posts"""
+    get_backend().index([(post.pk, post.title, post.description, post.content) for post in posts], replace=not created)
+
+
+def remove_posts(post_ids):
+    get_backend().remove(post_ids)
+
+
+def rebuild_index(model=BlogPost, connection=None, batch_size=INDEX_BATCH_SIZE, progress=None):
+    """Reindex every post in batches; returns how many were indexed"""
+    backend = get_backend(connection)
+    backend.clear()
+    rows = model.objects.order_by('pk').values_list('pk', 'title', 'description', 'content')
+    batch, total = [], 0
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            backend.index(batch, replace=False)
+            total += len(batch)
+            batch = []
+            if progress:
+                progress(total)
+    if batch:
+        backend.index(batch, replace=False)
+        total += len(batch)
+    backend.optimize()
+    return total
@@ -0,0 +1,296 @@
+# hospital/seeding.py
+"""
+Synthetic hospital data for benchmarks and production-scale local runs.
+
+Everything is written with bulk_create, so the auto-assign and status
+cascade hooks on Appointment/TestRequest/VitalRequest/MedicalReport.save()
+and the post_save profile signals never run: each object graph is built
+consistently in memory instead. Patients are generated in chunks, each
+chunk written in its own transaction and then dropped, so memory stays
+flat however many rows are produced.
+
+The same seed and knobs (including chunk_size) always produce the same
+data. All accounts share BENCH_PASSWORD (hashed once).
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from users.models import Profile
+
+from . import blog_cache, blog_stats, search
+from .models import (
+    Appointment, Assignment, BlogPost, LabResult, MedicalReport, TestRequest, VitalRequest, Vitals,
+)
+
+BENCH_PASSWORD = 'Bench-Password-123'
+BATCH_SIZE = 500
+
+# Share of the staff headcount per role; ADMIN gets the remainder (at least one)
+STAFF_MIX = (('DOCTOR', 0.4), ('NURSE', 0.3), ('LAB', 0.25))
+
+APPOINTMENT_STATUSES = ('PENDING', 'IN_REVIEW', 'AWAITING_RESULTS', 'COMPLETED', 'CANCELLED')
+LAB_TESTS = (
+    ('glucose', 'mmol/L', '3.9-5.6'),
+    ('haemoglobin', 'g/dL', '12-16'),
+    ('white blood cells', '10^9/L', '4-11'),
+    ('platelets', '10^9/L', '150-400'),
+    ('creatinine', 'umol/L', '60-110'),
+    ('cholesterol', 'mmol/L', '<5.2'),
+)
+CONDITIONS = ('Hypertension', 'Malaria', 'Type 2 diabetes', 'Upper respiratory infection', 'Anaemia', 'Migraine')
+BLOG_TOPICS = ('Sleep', 'Nutrition', 'Heart health', 'Vaccination', 'Diabetes care', 'Mental health', 'Hydration')
+# Sprinkled through generated posts so search has selective terms, not just the topic words
+BLOG_TERMS = (
+    'insomnia', 'melatonin', 'circadian', 'fibre', 'protein', 'vitamin', 'electrolytes', 'cholesterol',
+    'arrhythmia', 'blood pressure', 'cardio', 'immunisation', 'booster', 'measles', 'tetanus', 'insulin',
+    'glucose', 'carbohydrates', 'anxiety', 'depression', 'mindfulness', 'counselling', 'dehydration',
+    'kidneys', 'headache', 'fatigue', 'exercise', 'screening', 'antibodies', 'nutrition label',
+    'stroke', 'heatwave', 'breakfast', 'walking', 'stress', 'caffeine', 'hypertension', 'malaria',
+)
+FIRST_NAMES = ('Ada', 'Chinedu', 'Ngozi', 'Tunde', 'Amaka', 'Emeka', 'Zainab', 'Ibrahim', 'Funke', 'Kelechi')
+LAST_NAMES = ('Okafor', 'Adeyemi', 'Bello', 'Eze', 'Okonkwo', 'Balogun', 'Nwosu', 'Abubakar', 'Ogunleye', 'Obi')
+
+
+def staff_counts(total):
+    """Headcount per role for `total` staff"""
+    counts = {role: max(1, int(total * share)) for role, share in STAFF_MIX}
+    counts['ADMIN'] = max(1, total - sum(counts.values()))
+    return counts
+
+
+def blog_content(rng, topic, sections=4):
+    parts = [f"<p>{topic} matters more than most people think.</p>"]
+    for number in range(1, sections + 1):
+        parts.append(f"<h2>{topic} tip {number}</h2>")
+        parts.append(''.join(
+            f"<p>Paragraph {p} about {topic.lower()} with practical advice for patients on "
+            f"{' and '.join(rng.sample(BLOG_TERMS, 2))}.</p>"
+            for p in range(rng.randint(2, 5))
+        ))
+    return ''.join(parts)
+
+
+class HospitalGenerator:
+    """
+    Streams a synthetic hospital into the database.
+
+        HospitalGenerator(patients=1_000_000, staff=500, seed=7).run(progress=print)
+
+    `results_per_test` is how many tests each TestRequest lists, and so how
+    many LabResult rows a finished request gets. With `collect=True` the
+    ids benchmarks need are gathered and returned (fine for thousands of
+    rows, wasteful for millions); otherwise only row counts are returned.
+    """
+
+    def __init__(self, staff=40, patients=200, appointments_per_patient=2, results_per_test=2,
+                 blog_posts=50, seed=1, chunk_size=1000, prefix='bench', collect=False, blog_sections=4):
+        self.staff = staff
+        self.patients = patients
+        self.appointments_per_patient = appointments_per_patient
+        self.results_per_test = max(1, min(results_per_test, len(LAB_TESTS)))
+        self.blog_posts = blog_posts
+        self.blog_sections = blog_sections
+        self.seed = seed
+        self.chunk_size = max(1, chunk_size)
+        self.prefix = prefix
+        self.collect = collect
+        self.counts = {}
+        self.handles = {
+            'profiles': {}, 'usernames': {}, 'appointments': [], 'open_appointments': [],
+            'vital_requests': [], 'test_requests': [], 'blog_slugs': [],
+        }
+        self.password_hash = None
+        self.staff_by_role = {}
+        self.next_number = {}  # per role, so usernames stay unique as the data grows
+        self.posts_created = 0
+
+    def run(self, progress=None):
+        """Write everything; `progress(label, done, total)` is called after each chunk"""
+        self.add_staff(self.staff, progress=progress)
+        self.add_patients(self.patients, progress=progress)
+        self.add_blog_posts(self.blog_posts, progress=progress)
+        return self.handles if self.collect else self.counts
+
+    # The add_* methods can also be called after run() to grow an existing dataset
+
+    def add_staff(self, count, progress=None):
+        """Add `count` staff, split across roles by STAFF_MIX"""
+        start = sum(len(profiles) for profiles in self.staff_by_role.values())
+        with transaction.atomic():
+            created = self._create_accounts(staff_counts(count), random.Random(f"{self.seed}:staff:{start}"))
+        for role, profiles in created.items():
+            self.staff_by_role.setdefault(role, []).extend(profiles)
+        if progress:
+            progress('staff', count, count)
+
+    def add_patients(self, count, progress=None):
+        """Add `count` patients, with their appointments etc., treated by the existing staff"""
+        first = self.next_number.get('PATIENT', 0)
+        for start in range(first, first + count, self.chunk_size):
+            size = min(self.chunk_size, first + count - start)
+            with transaction.atomic():
+                self._create_patient_chunk(random.Random(f"{self.seed}:patients:{start}"), size)
+            if progress:
+                progress('patients', start + size - first, count)
+
+    def add_blog_posts(self, count, progress=None):
+        """Add `count` blog posts written by the admins"""
+        first = self.posts_created
+        for start in range(first, first + count, self.chunk_size):
+            size = min(self.chunk_size, first + count - start)
+            with transaction.atomic():
+                self._create_blog_chunk(random.Random(f"{self.seed}:blog:{start}"), start, size)
+            self.posts_created = start + size
+            if progress:
+                progress('blog posts', start + size - first, count)
+
+    def _write(self, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(created)
+        return created
+
+    def _create_accounts(self, role_counts, rng):
+        """Users plus profiles; returns {role: [Profile, ...]}"""
+        if self.password_hash is None:
+            self.password_hash = make_password(BENCH_PASSWORD)
+        users, roles = [], []
+        for role, count in role_counts.items():
+            first = self.next_number.get(role, 0)
+            self.next_number[role] = first + count
+            for number in range(first, first + count):
+                username = f"{self.prefix}_{role.lower()}_{number}"
+                users.append(User(
+                    username=username, email=f"{username}@example.com", password=self.password_hash,
+                    first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                ))
+                roles.append(role)
+        users = self._write(User, users)
+
+        profiles = self._write(Profile, [
+            Profile(
+                user=user, fullname=f"{user.first_name} {user.last_name}", role=role,
+                gender=rng.choice('MF'), phone=f"080{user.id:08d}",
+            )
+            for user, role in zip(users, roles)
+        ])
+        by_role = {role: [] for role in role_counts}
+        for profile in profiles:
+            by_role[profile.role].append(profile)
+            if self.collect:
+                self.handles['profiles'].setdefault(profile.role, []).append(profile.id)
+                self.handles['usernames'].setdefault(profile.role, []).append(profile.user.username)
+        return by_role
+
+    def _create_patient_chunk(self, rng, size):
+        doctors, nurses, labs = (self.staff_by_role[role] for role in ('DOCTOR', 'NURSE', 'LAB'))
+        patients = self._create_accounts({'PATIENT': size}, rng)['PATIENT']
+
+        appointments = self._write(Appointment, [
+            Appointment(
+                patient=patient, doctor=rng.choice(doctors), name=patient.fullname,
+                age=rng.randint(1, 95), sex=patient.gender, address=f"{rng.randint(1, 300)} Hospital Road",
+                message='Routine check', status=rng.choice(APPOINTMENT_STATUSES),
+            )
+            for patient in patients
+            for _ in range(self.appointments_per_patient)
+        ])
+
+        assignments, vital_requests, test_requests, reports = [], [], [], []
+        for appointment in appointments:
+            nurse, lab = rng.choice(nurses), rng.choice(labs)
+            assignments += [
+                Assignment(appointment=appointment, staff=appointment.doctor, role='DOCTOR'),
+                Assignment(appointment=appointment, staff=nurse, role='NURSE', assigned_by=appointment.doctor),
+                Assignment(appointment=appointment, staff=lab, role='LAB', assigned_by=appointment.doctor),
+            ]
+            if appointment.status == 'PENDING':
+                continue
+            # Mirror the status cascade: reviewed/completed visits have finished requests
+            request_status = 'DONE' if appointment.status in ('IN_REVIEW', 'COMPLETED') else 'PENDING'
+            tests = rng.sample(LAB_TESTS, self.results_per_test)
+            vital_requests.append(VitalRequest(
+                appointment=appointment, requested_by=appointment.doctor, assigned_to=nurse, status=request_status,
+            ))
+            test_requests.append(TestRequest(
+                appointment=appointment, requested_by=appointment.doctor, assigned_to=lab, status=request_status,
+                tests=','.join(name for name, _, _ in tests),
+            ))
+            if appointment.status == 'COMPLETED':
+                reports.append(MedicalReport(
+                    appointment=appointment, doctor=appointment.doctor, medical_condition=rng.choice(CONDITIONS),
+                    drug_prescription='Paracetamol 500mg', advice='Rest and hydrate',
+                ))
+
+        self._write(Assignment, assignments)
+        vital_requests = self._write(VitalRequest, vital_requests)
+        test_requests = self._write(TestRequest, test_requests)
+        self._write(MedicalReport, reports)
+
+        self._write(Vitals, [
+            Vitals(
+                vital_request=request, nurse=request.assigned_to,
+                blood_pressure=f"{rng.randint(100, 160)}/{rng.randint(60, 100)}",
+                respiration_rate=rng.randint(12, 20), pulse_rate=rng.randint(55, 110),
+                body_temperature=round(rng.uniform(36.0, 39.5), 1),
+                height_cm=rng.randint(140, 200), weight_kg=rng.randint(45, 120),
+            )
+            for request in vital_requests if request.status == 'DONE'
+        ])
+        tests_by_name = {name: (units, reference) for name, units, reference in LAB_TESTS}
+        self._write(LabResult, [
+            LabResult(
+                test_request=request, lab_scientist=request.assigned_to, test_name=name,
+                result=f"{rng.uniform(1, 20):.1f}", units=tests_by_name[name][0],
+                reference_range=tests_by_name[name][1],
+            )
+            for request in test_requests if request.status == 'DONE'
+            for name in request.tests.split(',')
+        ])
+
+        if self.collect:
+            self.handles['appointments'] += [appointment.id for appointment in appointments]
+            # No MedicalReport yet, so a report can still be filed against these
+            self.handles['open_appointments'] += [a.id for a in appointments if a.status != 'COMPLETED']
+            self.handles['vital_requests'] += [request.id for request in vital_requests]
+            self.handles['test_requests'] += [request.id for request in test_requests]
+
+    def _create_blog_chunk(self, rng, offset, size):
+        now = timezone.now()
+        posts = []
+        for number in range(offset, offset + size):
+            topic = rng.choice(BLOG_TOPICS)
+            post = BlogPost(
+                title=f"{topic} guide {number}", description=f"Everything about {topic.lower()}.",
+                content=blog_content(rng, topic, self.blog_sections), author=rng.choice(self.staff_by_role['ADMIN']),
+                published=rng.random() < 0.8, enable_toc=rng.random() < 0.7,
+            )
+            # What BlogPost.save() would have filled in
+            post.slug = slugify(f"{post.title} {self.prefix}")
+            if post.published:
+                post.published_date = now - timedelta(hours=number)
+            post.refresh_outline()
+            posts.append(post)
+        posts = self._write(BlogPost, posts)
+        # bulk_create skips the post_save signals that keep the search index, stats and response cache current
+        search.index_posts(posts, created=True)
+        blog_stats.add_posts(posts)
+        blog_cache.invalidate()
+        if self.collect:
+            self.handles['blog_slugs'] += [post.slug for post in posts if post.published]
+
+
+def seed_hospital(patients=200, staff=40, appointments_per_patient=2, blog_posts=50, seed=1):
+    """
+    Small hospital for the benchmarks. Returns the handles they need:
+    {'profiles': {role: [ids]}, 'usernames': {role: [...]}, 'appointments': [ids], ...}
+    """
+    return HospitalGenerator(
+        staff=staff, patients=patients, appointments_per_patient=appointments_per_patient,
+        blog_posts=blog_posts, seed=seed, collect=True,
+    ).run()
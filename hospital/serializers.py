@@ -1,4 +1,5 @@
 # hospital/serializers.py
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import (
     Appointment, Vitals, LabResult, MedicalReport, BlogPost,
@@ -6,6 +7,7 @@ from .models import (
 )
 from users.models import Profile
 from users.serializers import ProfileSerializer
+from . import images
 
 class TestRequestSerializer(serializers.ModelSerializer):
     assigned_to = serializers.PrimaryKeyRelatedField(
@@ -83,53 +85,65 @@ class AppointmentSerializer(serializers.ModelSerializer):
                  'assigned_nurse', 'assigned_lab']
         read_only_fields = ['booked_at', 'status', 'doctor']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load everything to_representation touches in a fixed number of queries"""
+        return queryset.select_related(
+            'patient__user', 'medical_report__doctor__user',
+        ).prefetch_related(
+            Prefetch('assignments', queryset=Assignment.objects.select_related(
+                'staff__user', 'assigned_by__user').order_by('id')),
+            Prefetch('test_requests', queryset=TestRequest.objects.order_by('id')),
+            Prefetch('test_requests__lab_results', queryset=LabResult.objects.select_related(
+                'lab_scientist__user').order_by('id')),
+            Prefetch('vital_requests', queryset=VitalRequest.objects.select_related(
+                'requested_by__user').order_by('id')),
+            Prefetch('vital_requests__vitals_entries', queryset=Vitals.objects.select_related(
+                'nurse__user').order_by('id')),
+        )
+
+    def _assignment_for(self, obj, role):
+        # Filter the (prefetched) assignments in Python instead of a query per role
+        for assignment in obj.assignments.all():
+            if assignment.role == role:
+                return AssignmentSerializer(assignment).data
+        return None
+
     def get_assigned_doctor(self, obj):
-        assignment = obj.assignments.filter(role='DOCTOR').first()
-        return AssignmentSerializer(assignment).data if assignment else None
+        return self._assignment_for(obj, 'DOCTOR')
     
     def get_assigned_nurse(self, obj):
-        assignment = obj.assignments.filter(role='NURSE').first()
-        return AssignmentSerializer(assignment).data if assignment else None
+        return self._assignment_for(obj, 'NURSE')
     
     def get_assigned_lab(self, obj):
-        assignment = obj.assignments.filter(role='LAB').first()
-        return AssignmentSerializer(assignment).data if assignment else None
+        return self._assignment_for(obj, 'LAB')
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         
         # Always include basic related data for better UX
         # Include test requests
-        if instance.test_requests.exists():
-            rep['test_requests'] = TestRequestSerializer(
-                instance.test_requests.all(), 
-                many=True
-            ).data
+        test_requests = list(instance.test_requests.all())
+        if test_requests:
+            rep['test_requests'] = TestRequestSerializer(test_requests, many=True).data
         
         # Include vital requests
-        if instance.vital_requests.exists():
-            rep['vital_requests'] = VitalRequestSerializer(
-                instance.vital_requests.all(), 
-                many=True
-            ).data
+        vital_requests = list(instance.vital_requests.all())
+        if vital_requests:
+            rep['vital_requests'] = VitalRequestSerializer(vital_requests, many=True).data
         
-        # Include vitals if available
-        vital_request = instance.vital_requests.last()
-        if vital_request and vital_request.vitals_entries.exists():
-            rep['vitals'] = VitalsSerializer(
-                vital_request.vitals_entries.last()
-            ).data
+        # Include vitals of the latest vital request if available
+        if vital_requests:
+            vitals = list(max(vital_requests, key=lambda r: r.pk).vitals_entries.all())
+            if vitals:
+                rep['vitals'] = VitalsSerializer(max(vitals, key=lambda v: v.pk)).data
         
         # Include lab results if available
         lab_results_data = []
-        for test_request in instance.test_requests.all():
-            if test_request.lab_results.exists():
-                lab_results_data.extend(
-                    LabResultSerializer(
-                        test_request.lab_results.all(), 
-                        many=True
-                    ).data
-                )
+        for test_request in test_requests:
+            lab_results = list(test_request.lab_results.all())
+            if lab_results:
+                lab_results_data.extend(LabResultSerializer(lab_results, many=True).data)
         if lab_results_data:
             rep['lab_results'] = lab_results_data
         
@@ -153,8 +167,21 @@ class AppointmentDetailSerializer(serializers.ModelSerializer):
         model = Appointment
         fields = '__all__'
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('patient__user', 'doctor__user').prefetch_related(
+            Prefetch('assignments', queryset=Assignment.objects.select_related('staff__user', 'assigned_by__user')),
+            'test_requests',
+            Prefetch('vital_requests', queryset=VitalRequest.objects.select_related('requested_by__user')),
+        )
+
 # ---------------- Enhanced Blog Serializers ---------------- #
 
+def image_srcset(obj, field):
+    """srcset strings per format for one of a post's images (hospital/images.py), or None"""
+    return images.srcset(getattr(obj, field), (obj.image_variants or {}).get(field))
+
+
 class BlogPostListSerializer(serializers.ModelSerializer):
     subheadings = serializers.SerializerMethodField()
     featured_image = serializers.SerializerMethodField()
@@ -178,11 +205,136 @@ class BlogPostListSerializer(serializers.ModelSerializer):
     def get_image_2(self, obj):
         return obj.image_2.url if obj.image_2 else None
     
+    def get_subheadings(self, obj):
+        # Section HTML stays out of list payloads; the detail endpoint has it
+        return [
+            {"title": s["title"], "level": s["level"], "description": s["description"], "id": idx + 1}
+            for idx, s in enumerate(obj.subheadings)
+        ]
+
+
+class BlogPostCardSerializer(serializers.ModelSerializer):
+    """
+    Compact blog post for list pages: what a card shows, nothing more.
+    Heavier fields are opt-in with ?include= (comma separated, see INCLUDES),
+    read from the serializer context; setup_projection() loads only the
+    columns the chosen fields need, so `content` never leaves the database.
+    """
+    featured_image = serializers.SerializerMethodField()
+    featured_image_srcset = serializers.SerializerMethodField()
+    image_1 = serializers.SerializerMethodField()
+    image_1_srcset = serializers.SerializerMethodField()
+    image_2 = serializers.SerializerMethodField()
+    image_2_srcset = serializers.SerializerMethodField()
+    subheadings = serializers.SerializerMethodField()
+
+    CARD_FIELDS = [
+        "title", "slug", "description", "featured_image", "featured_image_srcset",
+        "published", "published_date", "created_at",
+    ]
+    # ?include= name -> the fields it adds
+    INCLUDES = {
+        "images": ["image_1", "image_1_srcset", "image_2", "image_2_srcset"],
+        "table_of_contents": ["table_of_contents"],
+        "subheadings": ["subheadings"],
+    }
+    # Fields that aren't a column of their own -> the columns they read
+    COLUMNS = {
+        "featured_image_srcset": ["featured_image", "image_variants"],
+        "image_1_srcset": ["image_1", "image_variants"],
+        "image_2_srcset": ["image_2", "image_variants"],
+    }
+
+    class Meta:
+        model = BlogPost
+        fields = [
+            "title", "slug", "description", "featured_image", "featured_image_srcset",
+            "published", "published_date", "created_at",
+            "image_1", "image_1_srcset", "image_2", "image_2_srcset", "table_of_contents", "subheadings",
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = self.field_names(self.context.get('include', ()))
+        for name in list(self.fields):
+            if name not in wanted:
+                self.fields.pop(name)
+
+    @classmethod
+    def parse_include(cls, value):
+        """?include= value -> the known include names in it"""
+        return [name for name in dict.fromkeys(part.strip() for part in (value or '').split(',')) if name in cls.INCLUDES]
+
+    @classmethod
+    def field_names(cls, include=()):
+        names = list(cls.CARD_FIELDS)
+        for name in include:
+            names += cls.INCLUDES.get(name, [])
+        return names
+
+    @classmethod
+    def columns(cls, include=()):
+        names = []
+        for name in cls.field_names(include):
+            names += cls.COLUMNS.get(name, [name])
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def setup_projection(cls, queryset, include=()):
+        # Ordering needs published_date/created_at, both already in the card
+        return queryset.only('id', *cls.columns(include))
+
+    def get_featured_image(self, obj):
+        return obj.featured_image.url if obj.featured_image else None
+
+    def get_featured_image_srcset(self, obj):
+        return image_srcset(obj, 'featured_image')
+
+    def get_image_1(self, obj):
+        return obj.image_1.url if obj.image_1 else None
+
+    def get_image_1_srcset(self, obj):
+        return image_srcset(obj, 'image_1')
+
+    def get_image_2(self, obj):
+        return obj.image_2.url if obj.image_2 else None
+
+    def get_image_2_srcset(self, obj):
+        return image_srcset(obj, 'image_2')
+
     def get_subheadings(self, obj):
         return [
-            {**s, "id": idx + 1} for idx, s in enumerate(obj.subheadings)
+            {"title": s["title"], "level": s["level"], "description": s["description"], "id": idx + 1}
+            for idx, s in enumerate(obj.subheadings)
         ]
 
+
+class BlogPostFeedSerializer(BlogPostCardSerializer):
+    """A card plus its author and images, for the precomputed latest feed (hospital/blog_feed.py)"""
+    author_name = serializers.CharField(source='author.fullname', read_only=True)
+
+    CARD_FIELDS = ["id", "author_name"] + BlogPostCardSerializer.CARD_FIELDS + BlogPostCardSerializer.INCLUDES["images"]
+    INCLUDES = {}
+    COLUMNS = {**BlogPostCardSerializer.COLUMNS, "author_name": ["author__fullname"]}
+
+    class Meta(BlogPostCardSerializer.Meta):
+        fields = ["id", "author_name"] + BlogPostCardSerializer.Meta.fields
+
+    @classmethod
+    def setup_projection(cls, queryset, include=()):
+        return super().setup_projection(queryset.select_related('author'), include)
+
+class BlogPostMostReadSerializer(BlogPostCardSerializer):
+    """A card plus its views over the requested period (hospital/blog_views.py)"""
+    views = serializers.IntegerField(source='recent_views', read_only=True)
+
+    CARD_FIELDS = BlogPostCardSerializer.CARD_FIELDS + ["views"]
+    # An annotation, not a column
+    COLUMNS = {**BlogPostCardSerializer.COLUMNS, "views": []}
+
+    class Meta(BlogPostCardSerializer.Meta):
+        fields = BlogPostCardSerializer.Meta.fields + ["views"]
+
 # ---------------- Blog Supporting Serializers ---------------- #
 
 class SubheadingSerializer(serializers.Serializer):
@@ -202,50 +354,82 @@ class TOCSerializer(serializers.Serializer):
 
 class BlogPostSerializer(serializers.ModelSerializer):
     table_of_contents = TOCSerializer(many=True, read_only=True)
-    subheadings = SubheadingSerializer(many=True, read_only=True)
+    subheadings = SubheadingSerializer(source='subheadings_with_content', many=True, read_only=True)
 
     featured_image = serializers.SerializerMethodField()
+    featured_image_srcset = serializers.SerializerMethodField()
     image_1 = serializers.SerializerMethodField()
+    image_1_srcset = serializers.SerializerMethodField()
     image_2 = serializers.SerializerMethodField()
+    image_2_srcset = serializers.SerializerMethodField()
 
     author_name = serializers.SerializerMethodField()
+    related_posts = serializers.SerializerMethodField()
 
     class Meta:
         model = BlogPost
-        fields = "__all__"
+        # Storage names; the *_srcset fields carry their URLs. related_posts
+        # replaces the raw ranking (hospital/related.py). content_hash is
+        # BlogPost.save()'s own bookkeeping (hospital/outline.py)
+        exclude = ["image_variants", "related_ranking", "related_signature", "content_hash"]
 
     def get_author_name(self, obj):
         return obj.author.fullname
 
+    def get_related_posts(self, obj):
+        """Cards of the precomputed related posts that are still published, best first"""
+        ids = [entry['id'] for entry in obj.related_ranking or []]
+        if not ids:
+            return []
+        posts = BlogPostCardSerializer.setup_projection(BlogPost.objects.filter(pk__in=ids, published=True))
+        by_id = {post.pk: post for post in posts}
+        ranked = [by_id[pk] for pk in ids if pk in by_id]
+        return BlogPostCardSerializer(ranked, many=True, context=self.context).data
+
     def get_featured_image(self, obj):
         return obj.featured_image.url if obj.featured_image else None
 
+    def get_featured_image_srcset(self, obj):
+        return image_srcset(obj, 'featured_image')
+
     def get_image_1(self, obj):
         return obj.image_1.url if obj.image_1 else None
 
+    def get_image_1_srcset(self, obj):
+        return image_srcset(obj, 'image_1')
+
     def get_image_2(self, obj):
         return obj.image_2.url if obj.image_2 else None
 
+    def get_image_2_srcset(self, obj):
+        return image_srcset(obj, 'image_2')
+
 class BlogPostCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = BlogPost
-        fields = "__all__"
+        # Internal bookkeeping, as in BlogPostSerializer
+        exclude = ["image_variants", "related_ranking", "related_signature", "content_hash"]
         read_only_fields = ['author']
 
 # Profile Serializer for staff listings
 class StaffProfileSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     profile_pix = serializers.SerializerMethodField()
+    profile_pix_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Profile
-        fields = ['id', 'user', 'fullname', 'phone', 'gender', 'profile_pix', 'role']
+        fields = ['id', 'user', 'fullname', 'phone', 'gender', 'profile_pix', 'profile_pix_srcset', 'role']
     
     def get_profile_pix(self, obj):
         if obj.profile_pix:
             return obj.profile_pix.url
         return None
 
+    def get_profile_pix_srcset(self, obj):
+        # Square thumbnails (hospital/images.py), for avatars in staff lists
+        return images.srcset(obj.profile_pix, (obj.profile_pix_variants or {}).get('profile_pix'))
+
 # Appointment assignment serializer
 class AppointmentAssignmentSerializer(serializers.Serializer):
     appointment_id = serializers.IntegerField(required=True)
@@ -0,0 +1,89 @@
+# hospital/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from users.models import Profile
+
+from . import blog_cache, blog_feed, blog_stats, images, search
+from .models import BlogPost
+
+# ---- Blog full-text index (see hospital/search.py) ----
+
+SEARCHED_FIELDS = {'title', 'description', 'content'}
+
+
+@receiver(post_save, sender=BlogPost)
+def index_blog_post(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHED_FIELDS & set(update_fields):
+        return
+    search.index_posts([instance], created=created)
+
+
+@receiver(post_delete, sender=BlogPost)
+def remove_blog_post_from_index(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+# ---- Blog response cache and latest feed (see hospital/blog_cache.py, hospital/blog_feed.py) ----
+
+def _blog_changed():
+    # Bump first: the feeds are rebuilt against the new stamp
+    blog_cache.invalidate()
+    blog_feed.schedule_rebuild()
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def invalidate_blog_responses(sender, instance, **kwargs):
+    _blog_changed()
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_blog_responses_for_author(sender, instance, **kwargs):
+    # Posts show their author's name; only admins write posts
+    if instance.role == 'ADMIN':
+        _blog_changed()
+
+
+# ---- Blog stats counters (see hospital/blog_stats.py) ----
+
+@receiver(pre_save, sender=BlogPost)
+def remember_blog_stat_state(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._stat_previous = blog_stats.previous_state(instance)
+
+
+@receiver(post_save, sender=BlogPost)
+def count_saved_blog_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    blog_stats.post_saved(instance, getattr(instance, '_stat_previous', None), update_fields)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_deleted_blog_stat_state(sender, instance, **kwargs):
+    # Read while the row exists, in case the counted fields were deferred
+    instance._stat_state = blog_stats.previous_state(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def uncount_deleted_blog_post(sender, instance, **kwargs):
+    blog_stats.post_deleted(instance)
+
+
+# ---- Responsive image variants (see hospital/images.py) ----
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=Profile)
+def schedule_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    images.schedule(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_delete, sender=Profile)
+def delete_image_variants(sender, instance, **kwargs):
+    images.deleted(instance)
@@ -1,7 +1,8 @@
 # hospital/storage_backends.py - SIMPLEST WORKING VERSION
 from storages.backends.s3boto3 import S3Boto3Storage
+from monitoring.storage import InstrumentedStorageMixin
 
-class MediaStorage(S3Boto3Storage):
+class MediaStorage(InstrumentedStorageMixin, S3Boto3Storage):
     location = 'media'
     file_overwrite = False
     default_acl = 'public-read'
@@ -1,3 +1,651 @@
-from django.test import TestCase
+import contextlib
+import io
+import json
+import random
+import re
+import shutil
+import tempfile
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.base import ContentFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.text import slugify
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.query_budgets import QueryBudgetTestMixin
+from users.models import Profile
+
+from . import blog_cache, blog_feed, blog_stats, blog_views, images, outline, related, search
+from .models import (
+    Appointment, Assignment, BlogPost, BlogPostViewCount, BlogStatCounter, TestRequest, VitalRequest,
+)
+from .outline import extract_outline, section_html
+from .seeding import BLOG_TOPICS, HospitalGenerator, blog_content
+
+
+# Budgets are for the work behind a response, not the blog response cache in front of it
+# (nor a background flush of the view counts it records)
+@override_settings(BLOG_RESPONSE_CACHE_ENABLED=False, BLOG_VIEW_FLUSH_INTERVAL=3600)
+class HospitalQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Every hospital endpoint stays within its budget in api/query_budgets.py, at two data sizes"""
+
+    SMALL = {'staff': 8, 'patients': 3, 'blog_posts': 3}
+    GROWTH = {'staff': 8, 'patients': 12, 'blog_posts': 12}
+
+    def setUp(self):
+        self.generator = HospitalGenerator(
+            staff=self.SMALL['staff'], patients=self.SMALL['patients'], blog_posts=self.SMALL['blog_posts'],
+            appointments_per_patient=3, prefix='budget', collect=True,
+        )
+        self.generator.run()
+        self.clients = {}
+
+    def grow(self):
+        self.generator.add_staff(self.GROWTH['staff'])
+        self.generator.add_patients(self.GROWTH['patients'])
+        self.generator.add_blog_posts(self.GROWTH['blog_posts'])
+
+    def client_for(self, role):
+        if role is None:
+            return Client()
+        if role not in self.clients:
+            profile = self.generator.staff_by_role[role][0] if role != 'PATIENT' else (
+                Profile.objects.filter(role='PATIENT').select_related('user').first()
+            )
+            token = RefreshToken.for_user(profile.user).access_token
+            self.clients[role] = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.clients[role]
+
+    def scenarios(self):
+        """(route, method, role, url kwargs, payload or GET query) against the current data"""
+        staff = self.generator.staff_by_role
+        appointment = Appointment.objects.latest('id')
+        # One vital request (not `appointment`, which gains another below), so assign-staff takes the same path
+        assigned = Appointment.objects.filter(vital_requests__isnull=False).exclude(pk=appointment.pk).latest('id')
+        # Pending requests never complete here, so no status cascade varies the count
+        vital_request = VitalRequest.objects.filter(status='PENDING').latest('id')
+        test_request = TestRequest.objects.filter(status='PENDING').latest('id')
+        open_appointment = Appointment.objects.filter(medical_report__isnull=True).latest('id')
+        post = BlogPost.objects.filter(published=True).latest('id')
+        return [
+            ('appointment-list', 'GET', 'PATIENT', {}, None),
+            ('appointment-list', 'GET', 'DOCTOR', {}, None),
+            ('appointment-list', 'GET', 'ADMIN', {}, None),
+            ('appointment-detail', 'GET', 'ADMIN', {'pk': appointment.pk}, None),
+            ('patients-list', 'GET', 'DOCTOR', {}, None),
+            ('testrequest-list', 'GET', 'LAB', {}, None),
+            ('testrequest-list', 'GET', 'ADMIN', {}, None),
+            ('vitalrequest-list', 'GET', 'NURSE', {}, None),
+            ('vitalrequest-list', 'GET', 'ADMIN', {}, None),
+            ('staff-list', 'GET', 'ADMIN', {}, None),
+            ('available-staff', 'GET', 'ADMIN', {}, None),
+            ('appointment-assignments', 'GET', 'ADMIN', {'appointment_id': appointment.pk}, None),
+            ('assignment-list', 'GET', 'ADMIN', {}, None),
+            ('assignment-list', 'GET', 'DOCTOR', {}, None),
+            ('assignment-detail', 'GET', 'ADMIN', {'pk': Assignment.objects.latest('id').pk}, None),
+            ('blog-list-create', 'GET', None, {}, None),
+            ('blog-list-create', 'GET', 'ADMIN', {}, None),
+            ('blog-list-create', 'GET', None, {}, {'include': 'images,table_of_contents,subheadings'}),
+            ('blog-search', 'GET', None, {}, None),
+            ('blog-search', 'GET', None, {}, {'q': 'practical advi'}),
+            ('blog-latest', 'GET', None, {}, None),
+            ('blog-latest', 'GET', 'ADMIN', {}, None),
+            ('blog-most-read', 'GET', None, {}, None),
+            ('blog-by-author', 'GET', None, {'author_id': post.author_id}, None),
+            ('blog-detail', 'GET', None, {'slug': post.slug}, None),
+            ('blog-sitemap', 'GET', None, {}, None),
+            ('blog-rss', 'GET', None, {}, None),
+            ('blog-atom', 'GET', None, {}, None),
+            ('blog-admin-all', 'GET', 'ADMIN', {}, None),
+            ('blog-stats', 'GET', 'ADMIN', {}, None),
+            ('appointment-create', 'POST', 'PATIENT', {}, {
+                'name': 'Budget visit', 'age': 40, 'sex': 'M', 'address': '1 Budget Road',
+            }),
+            ('testrequest-create', 'POST', 'DOCTOR', {}, {
+                'appointment': appointment.pk, 'tests': 'glucose', 'assigned_to': staff['LAB'][0].pk,
+            }),
+            ('vitalrequest-create', 'POST', 'DOCTOR', {}, {
+                'appointment': appointment.pk, 'assigned_to': staff['NURSE'][0].pk,
+            }),
+            ('vitals-create', 'POST', 'NURSE', {}, {'vital_request': vital_request.pk, 'pulse_rate': 70}),
+            ('labresult-create', 'POST', 'LAB', {}, {
+                'test_request': test_request.pk, 'test_name': 'budget-extra', 'result': '1.0',
+            }),
+            ('medicalreport-create', 'POST', 'DOCTOR', {}, {
+                'appointment': open_appointment.pk, 'medical_condition': 'Budget',
+            }),
+            ('assign-staff', 'POST', 'ADMIN', {}, {
+                'appointment_id': assigned.pk, 'staff_id': staff['NURSE'][-1].pk, 'role': 'NURSE',
+            }),
+            ('blog-list-create', 'POST', 'ADMIN', {}, {
+                'title': f'Budget post {BlogPost.objects.count()}', 'description': 'Budget',
+                'content': '<h2>One</h2><p>First</p>',
+            }),
+        ]
+
+    def measure_all(self):
+        counts = {}
+        for route, method, role, kwargs, payload in self.scenarios():
+            client = self.client_for(role)
+            url = reverse(route, kwargs=kwargs)
+            query = ''
+            if method == 'GET' and payload:
+                query = urlencode(payload)
+                url = f"{url}?{query}"
+                payload = None
+            if payload is None:
+                send = lambda: client.generic(method, url, secure=True)  # noqa: E731
+            else:
+                send = lambda: client.generic(  # noqa: E731
+                    method, url, data=json.dumps(payload), content_type='application/json', secure=True,
+                )
+            # Budgets are for a cold cache (the blog feed is rebuilt on read)
+            cache.clear()
+            # Some views print progress
+            with contextlib.redirect_stdout(io.StringIO()):
+                counts[(route, method, role, query)] = self.count_queries(send)
+        return counts
+
+    def test_endpoints_within_budget_at_two_sizes(self):
+        small = self.measure_all()
+        self.grow()
+        large = self.measure_all()
+        for key in small:
+            route, method, role, query = key
+            with self.subTest(route=route, method=method, role=role, query=query):
+                self.assertQueryBudget(route, method, small[key], large[key])
+
+
+class BlogResponseCacheTests(TestCase):
+    """Anonymous blog reads come from hospital/blog_cache.py until a post changes"""
+
+    def setUp(self):
+        cache.clear()
+        HospitalGenerator(staff=4, patients=0, blog_posts=3, prefix='cache').run()
+        self.url = reverse('blog-list-create')
+
+    def test_hit_revalidate_and_invalidate(self):
+        client = Client()
+        with self.assertNumQueries(1):
+            first = client.get(self.url, secure=True, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+
+        with self.assertNumQueries(0):
+            hit = client.get(self.url, secure=True)
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit['ETag'], first['ETag'])
+        self.assertEqual(len(hit.json()), BlogPost.objects.filter(published=True).count())
+
+        with self.assertNumQueries(0):
+            unchanged = client.get(self.url, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+
+        post = BlogPost.objects.filter(published=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.title = 'Retitled for the cache test'
+            post.save()
+        changed = client.get(self.url, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed['X-Cache'], 'MISS')
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn('Retitled for the cache test', changed.content.decode())
+
+    def test_invalidation_reaches_other_processes(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        # Another worker: its own cache client on the same store, as with Redis in production
+        other_worker = FileBasedCache(location, {})
+        client = Client()
+        with override_settings(CACHES=shared):
+            self.assertEqual(client.get(self.url, secure=True)['X-Cache'], 'MISS')
+            with mock.patch.object(blog_cache, 'cache', other_worker):
+                self.assertEqual(client.get(self.url, secure=True)['X-Cache'], 'HIT')
+
+            post = BlogPost.objects.filter(published=True).first()
+            with self.captureOnCommitCallbacks(execute=True):
+                post.title = 'Edited in the first worker'
+                post.save()
+            with mock.patch.object(blog_cache, 'cache', other_worker):
+                response = client.get(self.url, secure=True)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('Edited in the first worker', response.content.decode())
+
+    @override_settings(BLOG_RESPONSE_CACHE_ENABLED=False)
+    def test_latest_feed_is_rebuilt_on_commit(self):
+        post = BlogPost.objects.filter(published=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.title = 'Freshly edited'
+            post.save()
+        with self.assertNumQueries(0):
+            response = Client().get(reverse('blog-latest'), {'limit': 2}, secure=True)
+        self.assertLessEqual(len(response.json()), 2)
+        self.assertIn('Freshly edited', [item['title'] for item in response.json()])
+
+    @override_settings(BLOG_RESPONSE_CACHE_TIMEOUT=120)
+    def test_latest_feed_expires(self):
+        with mock.patch.object(blog_feed.cache, 'set', wraps=blog_feed.cache.set) as cache_set:
+            blog_feed.rebuild()
+        self.assertEqual([call.args[2] for call in cache_set.call_args_list], [120] * len(blog_feed.AUDIENCES))
+
+    def test_authenticated_reads_bypass_the_cache(self):
+        admin = Profile.objects.filter(role='ADMIN').select_related('user').first()
+        token = RefreshToken.for_user(admin.user).access_token
+        before = blog_cache.cache_stats()
+        response = Client(HTTP_AUTHORIZATION=f'Bearer {token}').get(self.url, secure=True)
+        self.assertFalse(response.has_header('X-Cache'))
+        self.assertIn('Authorization', response['Vary'])
+        self.assertEqual(blog_cache.cache_stats()['misses'], before['misses'])
+
+    def test_sitemap_streams_then_serves_cached_copy(self):
+        client = Client()
+        url = reverse('blog-sitemap')
+        with self.assertNumQueries(1):
+            first = client.get(url, secure=True)
+            body = b''.join(first.streaming_content)
+        for post in BlogPost.objects.filter(published=True):
+            self.assertIn(f"/blog/{post.slug}</loc>".encode(), body)
+
+        with self.assertNumQueries(0):
+            cached = client.get(url, secure=True)
+            unchanged = client.get(url, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.content, body)
+        self.assertEqual(unchanged.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlogPost.objects.filter(published=True).first().delete()
+        changed = client.get(url, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+
+@override_settings(BLOG_VIEW_FLUSH_INTERVAL=3600)
+class BlogViewCountTests(TestCase):
+    """Detail reads are counted in memory and written to the daily counters in batches"""
+
+    def setUp(self):
+        cache.clear()
+        HospitalGenerator(staff=4, patients=0, blog_posts=4, prefix='views').run()
+        blog_views.take()
+
+    def test_views_are_buffered_then_ranked(self):
+        client = Client()
+        first, second = BlogPost.objects.filter(published=True)[:2]
+        for post, reads in ((first, 3), (second, 1)):
+            for _ in range(reads):
+                client.get(reverse('blog-detail', kwargs={'slug': post.slug}), secure=True)
+        client.get(reverse('blog-detail', kwargs={'slug': 'no-such-post'}), secure=True)
+        self.assertFalse(BlogPostViewCount.objects.exists())
+
+        self.assertEqual(blog_views.flush(), 4)
+        # A second flush adds to the same rows
+        client.get(reverse('blog-detail', kwargs={'slug': second.slug}), secure=True)
+        self.assertEqual(blog_views.flush(), 1)
+        self.assertEqual(
+            dict(BlogPostViewCount.objects.values_list('post_id', 'views')), {first.pk: 3, second.pk: 2},
+        )
+
+        ranked = Client().get(reverse('blog-most-read'), {'days': 7}, secure=True).json()
+        self.assertEqual([(item['slug'], item['views']) for item in ranked], [(first.slug, 3), (second.slug, 2)])
+
+
+class RelatedPostsBuildTests(TestCase):
+    """Incremental related-post builds recompute what an edit affects, exactly as a full build would"""
+
+    def setUp(self):
+        HospitalGenerator(staff=4, patients=0, blog_posts=60, prefix='related').run()
+        self.assertTrue(related.build(full=True)['full'])
+
+    def rankings(self):
+        return dict(BlogPost.objects.values_list('pk', 'related_ranking'))
+
+    def test_nothing_changed_nothing_recomputed(self):
+        result = related.build()
+        self.assertFalse(result['full'])
+        self.assertEqual((result['recomputed'], result['updated']), (0, 0))
+
+    def test_incremental_then_full(self):
+        post = BlogPost.objects.filter(published=True).order_by('pk')[5]
+        post.title = 'Diabetes and heart health guide'
+        post.save()
+        before = self.rankings()
+        result = related.build()
+        self.assertFalse(result['full'])
+        self.assertLess(result['recomputed'], 60)
+        incremental = self.rankings()
+        self.assertNotEqual(incremental[post.pk], before[post.pk])
+
+        related.build(full=True)
+        full = self.rankings()
+        # Every ranking the incremental run rewrote is what a full run computes; only rankings it
+        # left alone can still differ, their scores weighted by the idf of before the edit
+        for pk, ranking in incremental.items():
+            if ranking != full[pk]:
+                self.assertEqual(ranking, before[pk], pk)
+        self.assertEqual(incremental[post.pk], full[post.pk])
+        self.assertEqual(related.build(full=True)['updated'], 0)
+
+    def test_unpublished_post_leaves_every_ranking(self):
+        ranked = {entry['id'] for ranking in self.rankings().values() for entry in ranking}
+        post = BlogPost.objects.get(pk=min(ranked))
+        post.published = False
+        post.save()
+        related.build()
+        self.assertFalse(any(entry['id'] == post.pk for ranking in self.rankings().values() for entry in ranking))
+
+
+def image_bytes(size, mode='RGB', color='navy', fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class ImageVariantTests(TestCase):
+    """Responsive variants (hospital/images.py): sizes, formats, and their files' lifetime"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        media_root = override_settings(MEDIA_ROOT=media)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        HospitalGenerator(staff=4, patients=0, blog_posts=1, prefix='images').run()
+        self.post = BlogPost.objects.get()
+        self.storage = self.post.featured_image.storage
+
+    def decoded(self, variants):
+        return [(width, fmt, Image.open(io.BytesIO(data))) for width, fmt, data in variants]
+
+    def test_blog_widths_are_narrower_than_the_original(self):
+        with Image.open(io.BytesIO(image_bytes((1200, 600)))) as original:
+            variants = self.decoded(images.render_variants(original, 'resize'))
+        self.assertEqual([(width, fmt) for width, fmt, _ in variants], [
+            (320, 'webp'), (320, 'jpeg'), (640, 'webp'), (640, 'jpeg'), (1024, 'webp'), (1024, 'jpeg'),
+        ])
+        for width, fmt, image in variants:
+            self.assertEqual(image.size, (width, width // 2))
+            self.assertEqual(image.format, images.FORMATS[fmt][0])
+
+        with Image.open(io.BytesIO(image_bytes((200, 100)))) as small:
+            self.assertEqual({width for width, _, _ in images.render_variants(small, 'resize')}, {200})
+
+    def test_jpeg_variants_flatten_transparency_onto_white(self):
+        with Image.open(io.BytesIO(image_bytes((400, 200), 'RGBA', (255, 0, 0, 0)))) as original:
+            variants = self.decoded(images.render_variants(original, 'resize'))
+        jpeg = next(image for _, fmt, image in variants if fmt == 'jpeg')
+        self.assertEqual(jpeg.mode, 'RGB')
+        self.assertTrue(all(channel > 245 for channel in jpeg.getpixel((10, 10))))
+        webp = next(image for _, fmt, image in variants if fmt == 'webp')
+        self.assertEqual(webp.getpixel((10, 10))[3], 0)
+
+    def test_avatars_are_square_crops_no_larger_than_the_original(self):
+        with Image.open(io.BytesIO(image_bytes((300, 150)))) as original:
+            variants = self.decoded(images.render_variants(original, 'avatar'))
+        self.assertEqual(sorted({width for width, _, _ in variants}), [64, 128])
+        for width, _, image in variants:
+            self.assertEqual(image.size, (width, width))
+
+    def generate(self):
+        images.generate('hospital.BlogPost', self.post.pk, ['featured_image'])
+        self.post.refresh_from_db()
+        return [variant['name'] for variant in self.post.image_variants['featured_image']['variants']]
+
+    def test_replacing_an_image_drops_the_old_variants(self):
+        self.post.featured_image.save('first.png', ContentFile(image_bytes((700, 350))))
+        first = self.generate()
+        self.assertEqual(len(first), 4)
+        self.assertTrue(all(self.storage.exists(name) for name in first))
+
+        self.post.featured_image.save('second.png', ContentFile(image_bytes((500, 250))))
+        # Until the new variants are recorded, the old entry is stale and ignored
+        self.assertIsNone(images.srcset(self.post.featured_image, self.post.image_variants['featured_image']))
+
+        second = self.generate()
+        self.assertFalse(any(self.storage.exists(name) for name in first))
+        self.assertTrue(all(self.storage.exists(name) for name in second))
+        sets = images.srcset(self.post.featured_image, self.post.image_variants['featured_image'])
+        self.assertEqual(set(sets), {'webp', 'jpeg'})
+        self.assertIn('-320w.webp 320w', sets['webp'])
+
+    def test_deleting_a_post_deletes_its_variants(self):
+        self.post.featured_image.save('gone.png', ContentFile(image_bytes((700, 350))))
+        names = self.generate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        self.assertFalse(any(self.storage.exists(name) for name in names))
+
+
+class BlogStatCounterTests(TestCase):
+    """The counters blog saves and deletes keep up (hospital/blog_stats.py) agree with a full recount"""
+
+    def setUp(self):
+        HospitalGenerator(staff=40, patients=0, blog_posts=6, prefix='stats').run()
+
+    def counters(self):
+        return sorted(
+            BlogStatCounter.objects.filter(total__gt=0).values_list('scope', 'key', 'total', 'published', 'with_toc')
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.counters()
+        blog_stats.rebuild()
+        self.assertEqual(incremental, self.counters())
+
+    def test_counters_follow_saves_and_deletes(self):
+        posts = list(BlogPost.objects.order_by('pk'))
+        admins = list(Profile.objects.filter(role='ADMIN').order_by('pk'))
+        self.assertGreater(len(admins), 1)
+
+        # Publish toggles, both ways
+        for post in posts[:2]:
+            post.published = not post.published
+            post.save()
+        self.assertMatchesRebuild()
+
+        # Counted fields deferred: the previous state is read back before the save
+        post = BlogPost.objects.only('id', 'title').get(pk=posts[2].pk)
+        post.published = not posts[2].published
+        post.enable_toc = not posts[2].enable_toc
+        post.save()
+        self.assertMatchesRebuild()
+
+        # Only some fields written
+        post = BlogPost.objects.get(pk=posts[3].pk)
+        post.published = not post.published
+        post.enable_toc = not post.enable_toc
+        post.save(update_fields=['published'])
+        self.assertMatchesRebuild()
+
+        # Moved to another author, who may have no posts yet
+        post = BlogPost.objects.get(pk=posts[4].pk)
+        post.author = next(admin for admin in admins if admin.pk != post.author_id)
+        post.save()
+        self.assertMatchesRebuild()
+
+        # Deleted, loaded fully and with the counted fields deferred
+        BlogPost.objects.get(pk=posts[5].pk).delete()
+        BlogPost.objects.only('id').get(pk=posts[0].pk).delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(blog_stats.stats()['total_posts'], len(posts) - 2)
+
+
+class BlogPostOutlineTests(TestCase):
+    """TOC and subheadings (hospital/outline.py) as extracted, stored and served"""
+
+    def setUp(self):
+        HospitalGenerator(staff=4, patients=0, blog_posts=1, prefix='outline').run()
+        self.admin = Profile.objects.filter(role='ADMIN').select_related('user').first()
+
+    def admin_client(self):
+        return Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin.user).access_token}')
+
+    def test_internal_fields_are_not_served(self):
+        post = BlogPost.objects.get()
+        url = reverse('blog-detail', kwargs={'slug': post.slug})
+        detail = Client().get(url, secure=True).json()
+        updated = self.admin_client().patch(
+            url, json.dumps({'title': 'Renamed', 'content_hash': 'forged'}), content_type='application/json',
+            secure=True,
+        )
+        self.assertEqual(updated.status_code, 200)
+        for payload in (detail, updated.json()):
+            for field in ('content_hash', 'image_variants', 'related_ranking', 'related_signature'):
+                self.assertNotIn(field, payload)
+        self.assertNotEqual(BlogPost.objects.get().content_hash, 'forged')
+
+    # The regex extraction extract_outline() replaced, for parity on well-formed posts
+    @staticmethod
+    def regex_outline(content, description):
+        strip = lambda html: re.sub(r'<[^>]+>', '', html).strip()  # noqa: E731
+        toc = [
+            {'id': number, 'title': strip(title), 'anchor': slugify(strip(title)), 'level': int(level)}
+            for number, (level, title) in enumerate(re.findall(r'<h([1-6])[^>]*>(.*?)</h\1>', content), start=1)
+        ]
+        subheadings = []
+        for level, title, body in re.findall(r'<h([1-6])[^>]*>(.*?)</h\1>(.*?)(?=<h[1-6]|$)', content, re.DOTALL):
+            text = strip(body)
+            subheadings.append({
+                'title': strip(title), 'level': int(level),
+                'description': text[:200] + ('...' if len(text) > 200 else ''), 'full_content': body.strip(),
+            })
+        return toc, subheadings[:6]
+
+    def test_matches_the_regex_extraction_on_well_formed_posts(self):
+        rng = random.Random(4)
+        samples = [blog_content(rng, topic, sections) for topic in BLOG_TOPICS[:3] for sections in (1, 4, 8)]
+        samples.append(
+            '<p>Intro</p>\n<h1 class="lead">Top <em>level</em></h1>\n<p>Body\nover lines</p>'
+            '<h3 id="x">Deeper</h3><ul><li>One</li></ul>  <h2>Last</h2>' + '<p>' + 'word ' * 80 + '</p>'
+        )
+        for content in samples:
+            toc, subheadings = extract_outline(content, 'Description. Second part')
+            expected_toc, expected_subheadings = self.regex_outline(content, 'Description. Second part')
+            self.assertEqual(toc, expected_toc)
+            self.assertEqual([
+                {**{key: s[key] for key in ('title', 'level', 'description')},
+                 'full_content': section_html(s, content)}
+                for s in subheadings
+            ], expected_subheadings)
+
+    def test_unclosed_and_mismatched_headings(self):
+        content = '<h2>One</h2><p>first</p><h3>Never closed<p>lost</p><h2>Two</h2><p>second</p><h4>Bad</h5><p>x</p>'
+        toc, subheadings = extract_outline(content)
+        self.assertEqual([entry['title'] for entry in toc], ['One', 'Two'])
+        # A section ends at the next opening heading tag, closed or not
+        self.assertEqual([section_html(s, content) for s in subheadings], ['<p>first</p>', '<p>second</p>'])
+        # Nothing but an unclosed heading: no outline, and no pseudo-sections either
+        self.assertEqual(extract_outline('<h2>Open <p>text</p>', ''), ([], []))
+
+    def test_entities_are_kept_as_written(self):
+        toc, subheadings = extract_outline('<h2>Salt &amp; pepper &#8212; why</h2><p>Less &lt;5g&gt; a day</p>')
+        self.assertEqual(toc[0]['title'], 'Salt &amp; pepper &#8212; why')
+        self.assertEqual(subheadings[0]['description'], 'Less &lt;5g&gt; a day')
+
+    def test_descriptions_are_cut_at_200_characters(self):
+        exact = '<h2>A</h2><p>' + 'x' * 200 + '</p>  \n'
+        longer = '<h2>A</h2><p>' + 'x' * 199 + '</p><p>yz</p>'
+        self.assertEqual(extract_outline(exact)[1][0]['description'], 'x' * 200)
+        self.assertEqual(extract_outline(longer)[1][0]['description'], 'x' * 199 + 'y...')
+
+    def test_unchanged_text_is_not_extracted_again(self):
+        post = BlogPost.objects.get()
+        with mock.patch('hospital.models.extract_outline', wraps=extract_outline) as extract:
+            post.published = not post.published
+            post.save()
+            self.assertEqual(extract.call_count, 0)
+            post.content += '<h2>Added</h2><p>More</p>'
+            post.save()
+            self.assertEqual(extract.call_count, 1)
+            self.assertEqual(post.table_of_contents[-1]['title'], 'Added')
+            # A new outline format re-extracts every post on its next save
+            with mock.patch.object(outline, 'OUTLINE_VERSION', outline.OUTLINE_VERSION + 1):
+                post.save()
+            self.assertEqual(extract.call_count, 2)
+
+    def served_sections(self, post):
+        response = Client().get(reverse('blog-detail', kwargs={'slug': post.slug}), secure=True)
+        return [subheading['full_content'] for subheading in response.json()['subheadings']]
+
+    @override_settings(BLOG_RESPONSE_CACHE_ENABLED=False)
+    def test_detail_sections_are_the_stored_slices(self):
+        content = '<p>Intro</p>\n<h2>A</h2>\n  <p>First &amp; one</p>\n<h3 id="b">B</h3><p>Second</p>  \n'
+        post = BlogPost.objects.create(
+            title='Sliced', description='Unused', content=content, author=self.admin, published=True,
+        )
+        self.assertEqual(
+            [content[s['start']:s['end']] for s in post.subheadings], ['<p>First &amp; one</p>', '<p>Second</p>'],
+        )
+        self.assertEqual(self.served_sections(post), ['<p>First &amp; one</p>', '<p>Second</p>'])
+
+    @override_settings(BLOG_RESPONSE_CACHE_ENABLED=False)
+    def test_posts_without_headings_get_sections_of_the_description(self):
+        post = BlogPost.objects.create(
+            title='Flat', description='First sentence. Second sentence. Third', content='<p>No headings</p>',
+            author=self.admin, published=True,
+        )
+        self.assertEqual({s['source'] for s in post.subheadings}, {'description'})
+        self.assertEqual(self.served_sections(post), ['First sentence', 'Second sentence'])
+
+    @override_settings(BLOG_RESPONSE_CACHE_ENABLED=False)
+    def test_rows_stored_before_offsets_serve_their_copies(self):
+        post = BlogPost.objects.get()
+        legacy = [{'title': 'Old', 'level': 2, 'description': 'Old', 'full_content': '<p>Stored copy</p>'}]
+        BlogPost.objects.filter(pk=post.pk).update(subheadings=legacy)
+        self.assertEqual(self.served_sections(post), ['<p>Stored copy</p>'])
+
+
+class BlogSearchTests(TestCase):
+    """Full-text search over blog posts (hospital/search.py), on the engine of the test database"""
+
+    def setUp(self):
+        HospitalGenerator(staff=4, patients=0, blog_posts=0, prefix='search').run()
+        author = Profile.objects.filter(role='ADMIN').first()
+        self.titled = BlogPost.objects.create(
+            title='Malaria prevention', description='Keeping mosquitoes away', content='<p>Nets work well.</p>',
+            author=author, published=True,
+        )
+        self.mentioned = BlogPost.objects.create(
+            title='Travel tips', description='Before you fly',
+            content='<p>Pack light. Fish &amp; chips &lt;b&gt; abroad, and malaria tablets.</p>',
+            author=author, published=True,
+        )
+        self.draft = BlogPost.objects.create(
+            title='Malaria draft', description='Unfinished', content='<p>Notes</p>', author=author,
+        )
+
+    def ids(self, query, **kwargs):
+        return [hit.post_id for hit in search.search_posts(query, **kwargs)]
+
+    def test_title_outranks_body_and_drafts_are_excluded(self):
+        self.assertEqual(self.ids('malaria'), [self.titled.pk, self.mentioned.pk])
+        self.assertIn(self.draft.pk, self.ids('malaria', published_only=False))
+
+    def test_last_token_matches_as_a_prefix(self):
+        self.assertEqual(self.ids('mala'), [self.titled.pk, self.mentioned.pk])
+        self.assertEqual(self.ids('malaria preven'), [self.titled.pk])
+        # Only the last token is a prefix
+        self.assertEqual(self.ids('mala prevention'), [])
+
+    def test_snippets_mark_hits_and_escape_the_rest(self):
+        hit = search.search_posts('tablets')[0]
+        self.assertEqual(hit.post_id, self.mentioned.pk)
+        self.assertIn('<mark>tablets</mark>', hit.snippet)
+        self.assertIn('Fish &amp; chips &lt;b&gt;', hit.snippet)
+        self.assertNotIn('<b>', hit.snippet)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.titled.title = 'Dengue prevention'
+        self.titled.save()
+        self.assertEqual(self.ids('dengue'), [self.titled.pk])
+        self.assertEqual(self.ids('malaria'), [self.mentioned.pk])
+        self.mentioned.delete()
+        self.assertEqual(self.ids('malaria'), [])
+
+    def test_queries_without_words_find_nothing(self):
+        for query in ('', '"', '""', '*', '"*" ()', '-- ; \''):
+            self.assertEqual(search.search_posts(query), [], query)
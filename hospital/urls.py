@@ -46,6 +46,10 @@ urlpatterns = [
     path('blog/', views.BlogPostListCreateView.as_view(), name='blog-list-create'),
     path('blog/search/', views.BlogPostSearchView.as_view(), name='blog-search'),
     path('blog/latest/', views.BlogPostLatestView.as_view(), name='blog-latest'),
+    path('blog/most-read/', views.BlogPostMostReadView.as_view(), name='blog-most-read'),
+    path('blog/sitemap.xml', views.BlogSyndicationView.as_view(kind='sitemap'), name='blog-sitemap'),
+    path('blog/feed.rss', views.BlogSyndicationView.as_view(kind='rss'), name='blog-rss'),
+    path('blog/feed.atom', views.BlogSyndicationView.as_view(kind='atom'), name='blog-atom'),
     path('blog/author/<int:author_id>/', views.BlogPostByAuthorView.as_view(), name='blog-by-author'),
     path('blog/<slug:slug>/', views.BlogPostDetailView.as_view(), name='blog-detail'),
     
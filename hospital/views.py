@@ -13,10 +13,15 @@ from .serializers import (
     AppointmentSerializer, TestRequestSerializer, VitalRequestSerializer,
     VitalsSerializer, LabResultSerializer, MedicalReportSerializer, AssignmentSerializer, AppointmentAssignmentSerializer,
     StaffProfileSerializer, AppointmentDetailSerializer, 
-    BlogPostSerializer, BlogPostCreateSerializer, BlogPostListSerializer
+    BlogPostSerializer, BlogPostCreateSerializer, BlogPostListSerializer, BlogPostCardSerializer,
+    BlogPostMostReadSerializer,
 )
 from rest_framework.exceptions import PermissionDenied
 from .permissions import IsRole
+from . import blog_cache, blog_feed, blog_stats, blog_syndication, blog_views, search
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from users.serializers import ProfileSerializer
@@ -53,13 +58,14 @@ class AppointmentListView(generics.ListAPIView):
 
     def get_queryset(self):
         profile = self.request.user.profile
+        queryset = AppointmentSerializer.setup_eager_loading(Appointment.objects.all())
         if profile.role == 'PATIENT':
-            return Appointment.objects.filter(patient=profile).order_by('-booked_at')
+            return queryset.filter(patient=profile).order_by('-booked_at')
         if profile.role == 'DOCTOR':
             # Doctor sees appointments assigned to them
-            return Appointment.objects.filter(doctor=profile).order_by('-booked_at')
+            return queryset.filter(doctor=profile).order_by('-booked_at')
         # staff/admin/lab/nurse see all for now
-        return Appointment.objects.all().order_by('-booked_at')
+        return queryset.order_by('-booked_at')
 
 class AppointmentDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -73,16 +79,17 @@ class AssignmentViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         profile = self.request.user.profile
+        queryset = Assignment.objects.select_related('staff__user', 'assigned_by__user')
         if profile.role == 'ADMIN':
-            return Assignment.objects.all()
+            return queryset
         elif profile.role == 'DOCTOR':
-            return Assignment.objects.filter(
+            return queryset.filter(
                 appointment__doctor=profile
             )
         elif profile.role == 'NURSE':
-            return Assignment.objects.filter(staff=profile, role='NURSE')
+            return queryset.filter(staff=profile, role='NURSE')
         elif profile.role == 'LAB':
-            return Assignment.objects.filter(staff=profile, role='LAB')
+            return queryset.filter(staff=profile, role='LAB')
         return Assignment.objects.none()
 
 class AppointmentAssignmentsView(generics.ListAPIView):
@@ -91,7 +98,7 @@ class AppointmentAssignmentsView(generics.ListAPIView):
     
     def get_queryset(self):
         appointment_id = self.kwargs['appointment_id']
-        return Assignment.objects.filter(appointment_id=appointment_id)
+        return Assignment.objects.filter(appointment_id=appointment_id).select_related('staff__user', 'assigned_by__user')
 
 class AvailableStaffView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -194,7 +201,7 @@ class AssignStaffView(APIView):
 class AppointmentDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AppointmentDetailSerializer
-    queryset = Appointment.objects.all()
+    queryset = AppointmentDetailSerializer.setup_eager_loading(Appointment.objects.all())
 
 # Add PatientListView
 class PatientListView(generics.ListAPIView):
@@ -208,7 +215,7 @@ class PatientListView(generics.ListAPIView):
         return Profile.objects.filter(
             id__in=patient_ids,
             role='PATIENT'
-        ).order_by('-user__date_joined')
+        ).select_related('user').order_by('-user__date_joined')
 # --------------- TestRequest (doctor -> lab) ---------------
 
 class TestRequestCreateView(generics.CreateAPIView):
@@ -268,11 +275,12 @@ class VitalRequestListView(generics.ListAPIView):
 
     def get_queryset(self):
         profile = self.request.user.profile
+        queryset = VitalRequest.objects.select_related('requested_by__user')
         if profile.role == 'NURSE':
-            return VitalRequest.objects.filter(models.Q(assigned_to=profile) | models.Q(status='PENDING')).order_by('-created_at')
+            return queryset.filter(models.Q(assigned_to=profile) | models.Q(status='PENDING')).order_by('-created_at')
         if profile.role == 'DOCTOR':
-            return VitalRequest.objects.filter(requested_by=profile).order_by('-created_at')
-        return VitalRequest.objects.all().order_by('-created_at')
+            return queryset.filter(requested_by=profile).order_by('-created_at')
+        return queryset.order_by('-created_at')
 
 
 # --------------- Nurse fills Vitals ---------------
@@ -339,7 +347,7 @@ class StaffListView(generics.ListAPIView):
         # Return all staff members (doctors, nurses, lab scientists)
         return Profile.objects.filter(
             Q(role='DOCTOR') | Q(role='NURSE') | Q(role='LAB')
-        ).filter(user__is_active=True)
+        ).filter(user__is_active=True).select_related('user')
     
 # In hospital/views.py - Update AvailableStaffView
 class AvailableStaffView(generics.ListAPIView):
@@ -359,24 +367,73 @@ class AvailableStaffView(generics.ListAPIView):
             return Profile.objects.filter(
                 role=role.upper(),
                 user__is_active=True
-            )
+            ).select_related('user')
         
         # If no role specified, return all staff (DOCTOR, NURSE, LAB)
         return Profile.objects.filter(
             role__in=['DOCTOR', 'NURSE', 'LAB'],
             user__is_active=True
-        )
+        ).select_related('user')
 
 # ---------------- Enhanced Blog Views with TOC ---------------- #
-class BlogPostListCreateView(generics.ListCreateAPIView):
-    serializer_class = BlogPostListSerializer
+class BlogCardListMixin:
+    """
+    Blog lists answered with BlogPostCardSerializer: ?include= picks the
+    optional fields, and only the columns they need are loaded.
+    """
+
+    def get_includes(self):
+        return BlogPostCardSerializer.parse_include(self.request.query_params.get('include'))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include'] = self.get_includes()
+        return context
+
+    def card_queryset(self, queryset):
+        return BlogPostCardSerializer.setup_projection(queryset, self.get_includes())
+
+
+class CachedBlogResponseMixin:
+    """
+    Anonymous GETs served from the versioned response cache
+    (hospital/blog_cache.py), with ETag/304; everything else as usual.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not blog_cache.cacheable(request):
+            response = super().dispatch(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                blog_cache.patch_headers(response)
+            return response
+
+        key = blog_cache.response_key(request.resolver_match.url_name, request, kwargs)
+        entry, version = blog_cache.lookup(key)
+        if entry is not None:
+            return blog_cache.respond(request, entry, 'hits')
+
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        entry = blog_cache.store(key, version, response)
+        if entry is None:
+            return blog_cache.patch_headers(response)
+        return blog_cache.respond(request, entry, 'misses')
+
+
+class BlogPostListCreateView(CachedBlogResponseMixin, BlogCardListMixin, generics.ListCreateAPIView):
+    serializer_class = BlogPostCardSerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated and hasattr(user, "profile") and user.profile.role == "ADMIN":
-            return BlogPost.objects.all()
-        return BlogPost.objects.filter(published=True)
+            queryset = BlogPost.objects.all()
+        else:
+            queryset = BlogPost.objects.filter(published=True)
+        if self.request.method == "GET":
+            queryset = self.card_queryset(queryset)
+        return queryset
 
     def get_permissions(self):
         if self.request.method == "POST":
@@ -388,7 +445,7 @@ class BlogPostListCreateView(generics.ListCreateAPIView):
     def get_serializer_class(self):
         if self.request.method == "POST":
             return BlogPostCreateSerializer
-        return BlogPostListSerializer
+        return BlogPostCardSerializer
 
     def perform_create(self, serializer):
         if self.request.user.profile.role != "ADMIN":
@@ -396,12 +453,12 @@ class BlogPostListCreateView(generics.ListCreateAPIView):
         serializer.save(author=self.request.user.profile)
 
 
-class BlogPostDetailView(generics.RetrieveUpdateDestroyAPIView):
+class BlogPostDetailView(CachedBlogResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     - Anyone can view a blog post
     - Only admins can update or delete
     """
-    queryset = BlogPost.objects.all()
+    queryset = BlogPost.objects.select_related('author')
     lookup_field = 'slug'
     parser_classes = [MultiPartParser, FormParser, JSONParser]  # Add support for FormData
 
@@ -417,6 +474,13 @@ class BlogPostDetailView(generics.RetrieveUpdateDestroyAPIView):
             return BlogPostCreateSerializer
         return BlogPostSerializer
 
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        # Cache hits and revalidations are reads too; counting is in memory (hospital/blog_views.py)
+        if request.method == 'GET' and response.status_code in (200, 304):
+            blog_views.record(kwargs['slug'])
+        return response
+
     def perform_update(self, serializer):
         profile = self.request.user.profile
         if profile.role != 'ADMIN':
@@ -450,23 +514,39 @@ class BlogPostDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
 
 
-class BlogPostSearchView(generics.ListAPIView):
+class BlogPostSearchView(BlogCardListMixin, generics.ListAPIView):
     """
-    Public search for blog posts
+    Public full-text search for blog posts (hospital/search.py)
+
+    ?q= matches title, description and content, best match first, each
+    post with its `rank` and a highlighted `snippet`; ?limit= caps the
+    results (default 20, max 100). Without q, every published post,
+    newest first. Posts are cards, with ?include= as on the blog list.
     """
-    serializer_class = BlogPostListSerializer
+    serializer_class = BlogPostCardSerializer
     permission_classes = [permissions.AllowAny]
 
     def get_queryset(self):
-        queryset = BlogPost.objects.filter(published=True)
-        search_query = self.request.query_params.get('q', None)
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(content__icontains=search_query)
-            )
-        return queryset.order_by('-created_at')
+        return self.card_queryset(BlogPost.objects.filter(published=True).order_by('-created_at'))
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except (TypeError, ValueError):
+            limit = 20
+
+        hits = search.search_posts(query, limit=limit)
+        posts = self.card_queryset(BlogPost.objects.all()).in_bulk([hit.post_id for hit in hits])
+        hits = [hit for hit in hits if hit.post_id in posts]
+        data = self.get_serializer([posts[hit.post_id] for hit in hits], many=True).data
+        for item, hit in zip(data, hits):
+            item['rank'] = hit.rank
+            item['snippet'] = hit.snippet
+        return Response(data)
 
 
 class AdminBlogPostListView(generics.ListAPIView):
@@ -480,66 +560,91 @@ class AdminBlogPostListView(generics.ListAPIView):
     def get_queryset(self):
         return BlogPost.objects.all().order_by('-created_at')
 
-# In hospital/views.py - Add debugging to BlogPostLatestView and Make sure we include unpublished posts for admins
-class BlogPostLatestView(generics.ListAPIView):
-    serializer_class = BlogPostSerializer
+class BlogPostLatestView(CachedBlogResponseMixin, APIView):
+    """
+    Newest posts for the homepage, from the precomputed feed in
+    hospital/blog_feed.py (no queries); admins also see drafts.
+    ?limit= defaults to 6 and is capped at BLOG_LATEST_FEED_SIZE.
+    """
     permission_classes = [permissions.AllowAny]
-    
-    def get_queryset(self):
-        limit = self.request.query_params.get('limit', 6)
+
+    def get(self, request):
         try:
-            limit = int(limit)
+            limit = int(request.query_params.get('limit', 6))
         except (TypeError, ValueError):
             limit = 6
-        
-        user = self.request.user
-        
-        # For authenticated admin users, show all posts
-        if user.is_authenticated and hasattr(user, "profile") and user.profile.role == "ADMIN":
-            queryset = BlogPost.objects.all()
-        else:
-            # For public users, only show published posts
-            queryset = BlogPost.objects.filter(published=True)
-        
-        # Order by date
-        if queryset.filter(published_date__isnull=False).exists():
-            queryset = queryset.order_by('-published_date')
-        else:
-            queryset = queryset.order_by('-created_at')
-            
-        return queryset[:limit]
-class BlogPostByAuthorView(generics.ListAPIView):
+
+        user = request.user
+        is_admin = user.is_authenticated and hasattr(user, "profile") and user.profile.role == "ADMIN"
+        body = blog_feed.latest('admin' if is_admin else 'public', limit)
+        return HttpResponse(body, content_type='application/json')
+
+
+class BlogPostMostReadView(APIView):
+    """
+    Published posts ranked by views over the last ?days= (default 7, at
+    most 90), from the daily view counters; ?limit= defaults to 10, at
+    most 50. Counters are written in batches, so the list is cached for
+    one flush interval.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        days = self.bounded(request.query_params.get('days'), 7, 90)
+        limit = self.bounded(request.query_params.get('limit'), 10, 50)
+        # The blog version drops posts unpublished or edited since
+        key = f"blog:most-read:{blog_cache.current_version()}:{days}:{limit}"
+        data = cache.get(key)
+        if data is None:
+            posts = BlogPostMostReadSerializer.setup_projection(blog_views.most_read(days))[:limit]
+            data = BlogPostMostReadSerializer(posts, many=True, context={'request': request}).data
+            cache.set(key, data, getattr(settings, 'BLOG_VIEW_FLUSH_INTERVAL', 30))
+        return Response(data)
+
+    @staticmethod
+    def bounded(value, default, maximum):
+        try:
+            return min(max(int(value), 1), maximum)
+        except (TypeError, ValueError):
+            return default
+
+
+class BlogSyndicationView(APIView):
+    """
+    sitemap.xml and the RSS/Atom feeds of published posts, streamed and
+    cached by hospital/blog_syndication.py. No authentication: the
+    documents are the same for everyone.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    kind = None
+
+    def get(self, request):
+        return blog_syndication.respond(request, self.kind)
+
+
+class BlogPostByAuthorView(CachedBlogResponseMixin, BlogCardListMixin, generics.ListAPIView):
     """
     Get blog posts by specific author
     """
-    serializer_class = BlogPostListSerializer
+    serializer_class = BlogPostCardSerializer
     permission_classes = [permissions.AllowAny]
     
     def get_queryset(self):
         author_id = self.kwargs['author_id']
-        return BlogPost.objects.filter(
+        return self.card_queryset(BlogPost.objects.filter(
             author_id=author_id, 
             published=True
-        ).order_by('-published_date', '-created_at')
+        ).order_by('-published_date', '-created_at'))
 
 
 class BlogStatsView(APIView):
     """
-    Get blog statistics (admin only)
+    Get blog statistics (admin only): totals, TOC usage, posts per author and per month
     """
     permission_classes = [permissions.IsAuthenticated, IsRole]
     allowed_roles = ['ADMIN']
     
     def get(self, request):
-        total_posts = BlogPost.objects.count()
-        published_posts = BlogPost.objects.filter(published=True).count()
-        draft_posts = total_posts - published_posts
-        posts_with_toc = BlogPost.objects.filter(enable_toc=True).count()
-        
-        return Response({
-            'total_posts': total_posts,
-            'published_posts': published_posts,
-            'draft_posts': draft_posts,
-            'posts_with_toc': posts_with_toc,
-            'toc_usage_rate': (posts_with_toc / total_posts * 100) if total_posts > 0 else 0
-        })
\ No newline at end of file
+        # Running counters kept on BlogPost save/delete (hospital/blog_stats.py)
+        return Response(blog_stats.stats())
\ No newline at end of file
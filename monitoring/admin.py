@@ -0,0 +1,63 @@
+from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import RequestProfile, SlowQuery
+from .profiling import FILE_TYPES, summary
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'duration_ms', 'route', 'method', 'database', 'short_sql')
+    list_filter = ('route', 'database', 'created_at')
+    search_fields = ('sql', 'view', 'path', 'sql_hash')
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+
+    @admin.display(description='SQL')
+    def short_sql(self, obj):
+        return obj.sql[:120]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'mode', 'method', 'route', 'status_code', 'duration_ms', 'username', 'download_link')
+    list_filter = ('mode', 'route', 'created_at')
+    search_fields = ('path', 'route', 'username')
+    exclude = ('data',)
+    readonly_fields = [field.name for field in RequestProfile._meta.fields if field.name != 'data'] + [
+        'download_link', 'top',
+    ]
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='monitoring_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        extension, content_type = FILE_TYPES[profile.mode]
+        response = HttpResponse(bytes(profile.data), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{profile.route or "request"}-{profile.pk}.{extension}"'
+        return response
+
+    @admin.display(description='File')
+    def download_link(self, obj):
+        extension, _ = FILE_TYPES[obj.mode]
+        url = reverse('admin:monitoring_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">.{}</a>', url, extension)
+
+    @admin.display(description='Top of profile')
+    def top(self, obj):
+        return format_html('<pre>{}</pre>', summary(obj.mode, bytes(obj.data)))
+
+    def has_add_permission(self, request):
+        return False
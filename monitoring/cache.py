@@ -0,0 +1,34 @@
+# monitoring/cache.py
+"""Cache backends that report gets/hits to the active RequestMetrics."""
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from .instrumentation import record_cache_gets
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    def get(self, key, default=None, version=None):
+        started = time.perf_counter()
+        value = super().get(key, _MISSING, version=version)
+        hit = value is not _MISSING
+        record_cache_gets(1, int(hit), time.perf_counter() - started)
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        started = time.perf_counter()
+        values = super().get_many(keys, version=version)
+        record_cache_gets(len(keys), len(values), time.perf_counter() - started)
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    pass
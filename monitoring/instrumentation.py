@@ -0,0 +1,146 @@
+# monitoring/instrumentation.py
+"""
+Per-request counters for DB, cache and storage work.
+
+RequestInstrumentationMiddleware activates a RequestMetrics for sampled
+requests; the DB execute wrapper, the instrumented cache backends
+(monitoring/cache.py) and the storage mixin (monitoring/storage.py) add
+to whichever one is active in the current context. With nothing active
+the hooks cost a single ContextVar lookup.
+"""
+import os
+import sys
+import time
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = (
+        'started', 'queries', 'db_time', 'cache_gets', 'cache_hits', 'cache_time',
+        'storage_calls', 'storage_time', 'slow_queries', 'peak_alloc',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_gets = 0
+        self.cache_hits = 0
+        self.cache_time = 0.0
+        self.storage_calls = 0
+        self.storage_time = 0.0
+        self.slow_queries = []
+        self.peak_alloc = None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        values = {
+            'duration_ms': round(self.elapsed * 1000, 2),
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'cache_gets': self.cache_gets,
+            'cache_hits': self.cache_hits,
+            'cache_ms': round(self.cache_time * 1000, 2),
+            'storage_calls': self.storage_calls,
+            'storage_ms': round(self.storage_time * 1000, 2),
+        }
+        if self.peak_alloc is not None:
+            values['peak_alloc_kb'] = round(self.peak_alloc / 1024, 1)
+        return values
+
+    def server_timing(self):
+        """Server-Timing header value (durations in ms)"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'cache;dur={self.cache_time * 1000:.1f};desc="{self.cache_hits}/{self.cache_gets} hits"',
+            f'storage;dur={self.storage_time * 1000:.1f};desc="{self.storage_calls} calls"',
+            *([f'mem;desc="{self.peak_alloc / 1024:.0f} KiB peak"'] if self.peak_alloc is not None else []),
+            f'total;dur={self.elapsed * 1000:.1f}',
+        ])
+
+
+def current_metrics():
+    return _current.get()
+
+
+def activate(metrics):
+    """Make `metrics` the collector for this context; returns a token for deactivate()"""
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record_cache_gets(gets, hits, duration):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_gets += gets
+        metrics.cache_hits += hits
+        metrics.cache_time += duration
+
+
+def record_storage_call(duration):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.storage_calls += 1
+        metrics.storage_time += duration
+
+
+_SKIPPED_PATH_PARTS = (os.sep + 'site-packages' + os.sep, os.path.dirname(__file__) + os.sep)
+
+
+def app_frames(root, limit=5):
+    """Innermost `limit` stack frames from project code under `root`, as 'file:line in func'"""
+    root = str(root) + os.sep
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < limit:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and not any(part in filename for part in _SKIPPED_PATH_PARTS):
+            frames.append(f"{filename[len(root):]}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return frames
+
+
+class QueryCounter:
+    """
+    connection.execute_wrapper() hook that times every query.
+
+    With a `slow_threshold` (seconds), queries at or above it are kept on
+    metrics.slow_queries (up to `max_slow` per request) together with the
+    project stack frames (files under `root`) that issued them.
+    """
+
+    def __init__(self, metrics, slow_threshold=None, max_slow=10, root=''):
+        self.metrics = metrics
+        self.slow_threshold = slow_threshold
+        self.max_slow = max_slow
+        self.root = root
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.metrics.queries += 1
+            self.metrics.db_time += duration
+            if (
+                self.slow_threshold is not None
+                and duration >= self.slow_threshold
+                and len(self.metrics.slow_queries) < self.max_slow
+            ):
+                self.metrics.slow_queries.append({
+                    'sql': sql,
+                    'params': params,
+                    'many': many,
+                    'alias': context['connection'].alias,
+                    'duration': duration,
+                    'frames': app_frames(self.root),
+                })
@@ -0,0 +1,19 @@
+# monitoring/management/commands/prune_slow_queries.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitoring.slow_queries import prune
+
+
+class Command(BaseCommand):
+    help = 'Delete slow-query captures older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SLOW_QUERY_RETENTION_DAYS,
+            help='Keep this many days of captures (default: SLOW_QUERY_RETENTION_DAYS)'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} slow queries older than {options['days']} days"))
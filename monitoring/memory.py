@@ -0,0 +1,171 @@
+# monitoring/memory.py
+"""
+Per-request peak allocation and tracemalloc snapshots for a running worker.
+
+Peak tracking (REQUEST_MEMORY_SAMPLE_RATE) measures how much a request
+allocated at its high-water mark above what was live when it started,
+via tracemalloc's peak counter. Tracing is switched on for just that
+request and off again afterwards, so untracked requests run without the
+tracemalloc hook. If tracing is already on (a snapshot session below, or
+PYTHONTRACEMALLOC) it is left running and only the peak is reset. The
+measurement is process-wide, which is exact under Gunicorn's sync workers
+(one request per process); if another request is already being tracked
+in this process, the new one is skipped rather than mixed in.
+
+Snapshots are taken and diffed by the ADMIN endpoints in
+monitoring/views.py. They live in the memory of the worker that took
+them, so every response carries the worker's pid; a diff has to reach
+the same worker as the snapshots it compares.
+"""
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from itertools import count
+
+from django.utils import timezone
+
+MAX_SNAPSHOTS = 5
+GROUP_BY = ('lineno', 'filename', 'traceback')
+
+_track_lock = threading.Lock()
+_snapshots = OrderedDict()
+_snapshot_ids = count(1)
+_snapshots_lock = threading.Lock()
+
+# Started with PYTHONTRACEMALLOC / -X tracemalloc: never switched off here
+_external_tracing = tracemalloc.is_tracing()
+
+# The tracer's own allocations and import machinery are noise in every diff
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def _keep_tracing():
+    return _external_tracing or bool(_snapshots)
+
+
+def max_rss():
+    """Peak resident set size of this process in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class PeakTracker:
+    """Peak bytes allocated while one request is served; use begin() then end()"""
+
+    def __init__(self):
+        self.baseline = 0
+        self.rss_before = 0
+
+    def begin(self):
+        """False if another request in this process is already being tracked"""
+        if not _track_lock.acquire(blocking=False):
+            return False
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        self.rss_before = max_rss()
+        return True
+
+    def end(self):
+        """(peak bytes above the starting point, growth of the process's max RSS in bytes)"""
+        try:
+            peak = tracemalloc.get_traced_memory()[1]
+            if not _keep_tracing():
+                tracemalloc.stop()
+        finally:
+            _track_lock.release()
+        return max(peak - self.baseline, 0), max_rss() - self.rss_before
+
+
+def status():
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        'tracing': tracemalloc.is_tracing(),
+        'traceback_limit': tracemalloc.get_traceback_limit(),
+        'traced_current_bytes': current,
+        'traced_peak_bytes': peak,
+        'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+        'max_rss_bytes': max_rss(),
+        'snapshots': [
+            {'id': snapshot_id, 'taken_at': taken_at.isoformat()}
+            for snapshot_id, (taken_at, _) in _snapshots.items()
+        ],
+    }
+
+
+def _format_stat(stat, key_type):
+    frames = stat.traceback.format(limit=1 if key_type != 'traceback' else None)
+    entry = {
+        'where': frames[0].strip() if key_type != 'traceback' else [line.strip() for line in frames],
+        'size_bytes': stat.size,
+        'count': stat.count,
+    }
+    if hasattr(stat, 'size_diff'):
+        entry['size_diff_bytes'] = stat.size_diff
+        entry['count_diff'] = stat.count_diff
+    return entry
+
+
+def take_snapshot(frames=1, group_by='lineno', limit=25):
+    """
+    Snapshot what is allocated now, starting tracing first if needed
+    (allocations made before tracing started are invisible to it).
+    Keeps the last MAX_SNAPSHOTS per worker.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    with _snapshots_lock:
+        snapshot_id = next(_snapshot_ids)
+        _snapshots[snapshot_id] = (timezone.now(), snapshot)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    stats = snapshot.statistics(group_by)
+    return {
+        'id': snapshot_id,
+        'pid': os.getpid(),
+        'total_bytes': sum(stat.size for stat in stats),
+        'top': [_format_stat(stat, group_by) for stat in stats[:limit]],
+    }
+
+
+def get_snapshot(snapshot_id):
+    with _snapshots_lock:
+        entry = _snapshots.get(snapshot_id)
+    return entry[1] if entry else None
+
+
+def diff(old_id, new_id, group_by='lineno', limit=25):
+    """Largest allocation changes between two snapshots of this worker, or None if either is unknown"""
+    old, new = get_snapshot(old_id), get_snapshot(new_id)
+    if old is None or new is None:
+        return None
+    stats = new.compare_to(old, group_by)
+    return {
+        'pid': os.getpid(),
+        'from': old_id,
+        'to': new_id,
+        'size_diff_bytes': sum(stat.size_diff for stat in stats),
+        'top': [_format_stat(stat, group_by) for stat in stats[:limit]],
+    }
+
+
+def stop():
+    """Stop tracing and drop this worker's snapshots"""
+    with _snapshots_lock:
+        _snapshots.clear()
+    # A tracked request in flight stops it itself when it ends
+    if not _external_tracing and not _track_lock.locked():
+        tracemalloc.stop()
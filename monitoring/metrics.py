@@ -0,0 +1,96 @@
+# monitoring/metrics.py
+"""
+Prometheus metrics for the app, exposed at /metrics (monitoring/views.py).
+
+Under Gunicorn every worker is a separate process, so prometheus_client
+runs in multiprocess mode: each worker writes its samples to mmap'ed files
+in PROMETHEUS_MULTIPROC_DIR (prepared by gunicorn.conf.py) and a scrape
+merges the files of all workers, live and dead. Without that variable
+(runserver, shell, tests) the ordinary in-process registry is used.
+"""
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+ALLOC_BUCKETS = tuple(2 ** power * 1024 for power in range(4, 20, 2))  # 16 KiB .. 128 MiB
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name',
+    ['route', 'method'], buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'http_requests', 'Requests by URL name and status code',
+    ['route', 'method', 'status'],
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being handled',
+    multiprocess_mode='livesum',
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'ORM queries per request by URL name',
+    ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_PEAK_ALLOC = Histogram(
+    'http_request_peak_alloc_bytes', 'Peak Python allocation of memory-tracked requests by URL name',
+    ['route'], buckets=ALLOC_BUCKETS,
+)
+CACHE_GETS = Counter('cache_gets', 'Cache keys looked up during requests')
+CACHE_HITS = Counter('cache_hits', 'Cache keys found during requests')
+AUTH_EVENTS = Counter('auth_logins', 'Password login attempts by outcome', ['outcome'])
+USER_PAYLOAD_CACHE = Counter(
+    'user_payload_cache_lookups', 'Login/dashboard payload cache lookups (users/cache.py) by outcome',
+    ['outcome'],
+)
+
+
+class OutboxDepthCollector:
+    """Email outbox depth, read from the DB at scrape time so it is never stale"""
+
+    def collect(self):
+        from users.outbox import pending_count
+
+        gauge = GaugeMetricFamily('email_outbox_pending', 'Emails queued or being sent')
+        gauge.add_metric([], pending_count())
+        yield gauge
+
+
+def is_multiprocess():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def observe_request(route, method, status, metrics):
+    """Record a finished request from its RequestMetrics"""
+    REQUEST_LATENCY.labels(route, method).observe(metrics.elapsed)
+    REQUESTS.labels(route, method, str(status)).inc()
+    REQUEST_QUERIES.labels(route).observe(metrics.queries)
+    if metrics.peak_alloc is not None:
+        REQUEST_PEAK_ALLOC.labels(route).observe(metrics.peak_alloc)
+    if metrics.cache_gets:
+        CACHE_GETS.inc(metrics.cache_gets)
+        CACHE_HITS.inc(metrics.cache_hits)
+
+
+def record_login(user):
+    """Count a password login by what authenticate() returned (the JWT views never call login())"""
+    AUTH_EVENTS.labels('success' if user is not None else 'failure').inc()
+
+
+def render_latest():
+    """(body, content_type) for a scrape, aggregated across worker processes"""
+    if is_multiprocess():
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        output = generate_latest(registry)
+    else:
+        output = generate_latest(REGISTRY)
+
+    outbox = CollectorRegistry()
+    outbox.register(OutboxDepthCollector())
+    return output + generate_latest(outbox), CONTENT_TYPE_LATEST
@@ -0,0 +1,107 @@
+# monitoring/middleware.py
+import json
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics as prometheus
+from . import slow_queries
+from .memory import PeakTracker
+from .instrumentation import QueryCounter, RequestMetrics, activate, deactivate
+
+logger = logging.getLogger('monitoring.requests')
+memory_logger = logging.getLogger('monitoring.memory')
+
+
+def route_name(request):
+    """URL name of the matched route ('appointment-list', 'blog-detail', ...)"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.view_name or match.route or 'unnamed'
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Count ORM queries, DB time, cache gets/hits and storage calls per request.
+
+    With PROMETHEUS_METRICS_ENABLED every request feeds the Prometheus
+    histograms; a sample of them (REQUEST_METRICS_SAMPLE_RATE) is also
+    reported as a Server-Timing header plus one JSON log line, another
+    sample (SLOW_QUERY_SAMPLE_RATE) has its slow queries captured, and a
+    third (REQUEST_MEMORY_SAMPLE_RATE) has its peak allocation measured
+    (monitoring/memory.py).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0.0)
+        self.prometheus_enabled = getattr(settings, 'PROMETHEUS_METRICS_ENABLED', False)
+        self.slow_sample_rate = getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 0.0)
+        self.slow_threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+        self.max_slow = getattr(settings, 'SLOW_QUERY_MAX_PER_REQUEST', 10)
+        self.memory_sample_rate = getattr(settings, 'REQUEST_MEMORY_SAMPLE_RATE', 0.0)
+
+    def __call__(self, request):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        capture_slow = self.slow_sample_rate > 0 and random.random() < self.slow_sample_rate
+        track_memory = self.memory_sample_rate > 0 and random.random() < self.memory_sample_rate
+        if not (sampled or capture_slow or track_memory or self.prometheus_enabled):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        if self.prometheus_enabled:
+            prometheus.IN_FLIGHT.inc()
+        tracker = PeakTracker() if track_memory else None
+        if tracker is not None and not tracker.begin():
+            tracker = None
+        try:
+            with ExitStack() as stack:
+                counter = QueryCounter(
+                    metrics,
+                    slow_threshold=self.slow_threshold if capture_slow else None,
+                    max_slow=self.max_slow,
+                    root=settings.BASE_DIR,
+                )
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = self.get_response(request)
+        finally:
+            if tracker is not None:
+                metrics.peak_alloc, rss_growth = tracker.end()
+            deactivate(token)
+            if self.prometheus_enabled:
+                prometheus.IN_FLIGHT.dec()
+
+        route = route_name(request)
+        if self.prometheus_enabled:
+            prometheus.observe_request(route, request.method, response.status_code, metrics)
+        if metrics.slow_queries:
+            slow_queries.record(request, route, metrics.slow_queries)
+        if tracker is not None:
+            memory_logger.info(json.dumps({
+                'event': 'request_memory',
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'peak_alloc_kb': round(metrics.peak_alloc / 1024, 1),
+                'max_rss_growth_kb': round(rss_growth / 1024, 1),
+            }))
+        if not sampled:
+            return response
+
+        response['Server-Timing'] = metrics.server_timing()
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }))
+        return response
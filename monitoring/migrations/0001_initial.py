@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('duration_ms', models.FloatField()),
+                ('database', models.CharField(default='default', max_length=50)),
+                ('sql', models.TextField()),
+                ('sql_hash', models.CharField(db_index=True, max_length=40)),
+                ('params', models.TextField(blank=True)),
+                ('route', models.CharField(blank=True, max_length=150)),
+                ('view', models.CharField(blank=True, max_length=255)),
+                ('method', models.CharField(blank=True, max_length=10)),
+                ('path', models.CharField(blank=True, max_length=500)),
+                ('stack', models.TextField(blank=True)),
+                ('explain', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# monitoring/models.py
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """A query that took at least SLOW_QUERY_THRESHOLD_MS, with its plan (monitoring/slow_queries.py)"""
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    duration_ms = models.FloatField()
+    database = models.CharField(max_length=50, default='default')
+    sql = models.TextField()
+    sql_hash = models.CharField(max_length=40, db_index=True)
+    params = models.TextField(blank=True)
+    route = models.CharField(max_length=150, blank=True)
+    view = models.CharField(max_length=255, blank=True)
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    stack = models.TextField(blank=True)
+    explain = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'slow queries'
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f}ms {self.route or self.path}: {self.sql[:80]}"
+
+
+class RequestProfile(models.Model):
+    """A profile of one request taken on an ADMIN's demand (monitoring/profiling.py)"""
+    MODE_CHOICES = [
+        ('cprofile', 'cProfile (pstats)'),
+        ('sample', 'Sampling (collapsed stacks)'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    route = models.CharField(max_length=150, blank=True)
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    username = models.CharField(max_length=150, blank=True)
+    data = models.BinaryField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.mode} {self.method} {self.route or self.path} ({self.duration_ms:.0f}ms)"
@@ -0,0 +1,217 @@
+# monitoring/profiling.py
+"""
+On-demand profiling of a single request, for ADMIN users.
+
+A request asks to be profiled with an `X-Profile` header or a `_profile`
+query parameter, set to `cprofile` (deterministic, every call) or `sample`
+(stack sampling every REQUEST_PROFILING_SAMPLE_INTERVAL_MS, lower
+overhead on hot code). The flag is honoured only when the caller passes
+IsRole with allowed_roles = ['ADMIN'], authenticated by JWT like the API
+itself (or by the admin session); otherwise it is ignored and the request
+is served as usual.
+
+`X-Profile-Output` / `_profile_output` picks what happens to the result:
+`download` (default) replaces the response with the profile file, `store`
+keeps the normal response and saves the file as a RequestProfile row,
+browsable and downloadable under admin > Monitoring > Request profiles.
+cProfile output is a marshalled pstats file (`pstats.Stats(path)`,
+snakeviz); sampling output is collapsed stacks, one `frame;frame;... count`
+line per distinct stack, ready for flamegraph.pl or speedscope.
+
+Requests without the flag only pay for the header/query lookup.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from hospital.permissions import IsRole
+from users.authentication import ProfileJWTAuthentication
+
+from .middleware import route_name
+from .models import RequestProfile
+
+logger = logging.getLogger('monitoring.profiling')
+
+MODES = ('cprofile', 'sample')
+OUTPUTS = ('download', 'store')
+
+FILE_TYPES = {
+    'cprofile': ('pstats', 'application/octet-stream'),
+    'sample': ('collapsed', 'text/plain; charset=utf-8'),
+}
+
+
+class _ProfilingGate:
+    """Stands in for a view so IsRole can check the caller"""
+    allowed_roles = ['ADMIN']
+
+
+def requested_mode(request):
+    """'cprofile', 'sample' or None"""
+    mode = request.META.get('HTTP_X_PROFILE') or request.GET.get('_profile')
+    if not mode:
+        return None
+    mode = mode.strip().lower()
+    return mode if mode in MODES else None
+
+
+def requested_output(request):
+    output = (request.META.get('HTTP_X_PROFILE_OUTPUT') or request.GET.get('_profile_output') or 'download')
+    output = output.strip().lower()
+    return output if output in OUTPUTS else 'download'
+
+
+def profiling_user(request):
+    """The user allowed to profile this request, or None"""
+    try:
+        authenticated = ProfileJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        authenticated = None
+    user = authenticated[0] if authenticated else getattr(request, 'user', None)
+    if IsRole().has_permission(SimpleNamespace(user=user), _ProfilingGate()):
+        return user
+    return None
+
+
+class StackSampler:
+    """
+    Sample one thread's Python stack from a background thread.
+
+    Frames are recorded from `root` (the frame that started the sampler)
+    inwards, so the server's own frames above the middleware are left out.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+
+    def start(self, root):
+        self.thread_id = threading.get_ident()
+        self.root = root
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common()).encode()
+
+
+def run_cprofile(get_response, request):
+    profiler = cProfile.Profile()
+    response = profiler.runcall(get_response, request)
+    profiler.create_stats()
+    return response, marshal.dumps(profiler.stats)
+
+
+def run_sampler(get_response, request):
+    interval = getattr(settings, 'REQUEST_PROFILING_SAMPLE_INTERVAL_MS', 1) / 1000
+    sampler = StackSampler(interval)
+    sampler.start(sys._getframe())
+    try:
+        response = get_response(request)
+    finally:
+        sampler.stop()
+    return response, sampler.collapsed()
+
+
+RUNNERS = {
+    'cprofile': run_cprofile,
+    'sample': run_sampler,
+}
+
+
+class _RawStats:
+    """Profiler-like wrapper so pstats.Stats loads marshalled stats without a file"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def summary(mode, data, limit=40):
+    """Human-readable top of a profile: pstats by cumulative time, or the heaviest stacks"""
+    if mode == 'cprofile':
+        stream = io.StringIO()
+        stats = pstats.Stats(_RawStats(marshal.loads(data)), stream=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+    lines = data.decode().splitlines()
+    return '\n'.join(lines[:limit])
+
+
+class RequestProfilingMiddleware:
+    """Profile requests flagged by an ADMIN (see module docstring); a no-op for everything else"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_PROFILING_ENABLED', True)
+
+    def __call__(self, request):
+        mode = requested_mode(request) if self.enabled else None
+        if mode is None:
+            return self.get_response(request)
+
+        user = profiling_user(request)
+        if user is None:
+            logger.warning(f"Ignoring {mode} profiling flag from a non-admin on {request.method} {request.path}")
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        response, data = RUNNERS[mode](self.get_response, request)
+        duration_ms = (time.perf_counter() - started) * 1000
+        route = route_name(request)
+        logger.info(
+            f"Profiled {request.method} {request.path} ({route}) with {mode} for {user.username}: "
+            f"{duration_ms:.1f}ms, {len(data)} bytes"
+        )
+
+        extension, content_type = FILE_TYPES[mode]
+        if requested_output(request) == 'store':
+            profile = RequestProfile.objects.create(
+                mode=mode,
+                route=route,
+                method=request.method,
+                path=request.get_full_path()[:500],
+                status_code=response.status_code,
+                duration_ms=duration_ms,
+                username=user.username,
+                data=data,
+            )
+            response['X-Profile-Id'] = str(profile.pk)
+            return response
+
+        response.close()
+        download = HttpResponse(data, content_type=content_type)
+        download['Content-Disposition'] = f'attachment; filename="{route}-{int(time.time())}.{extension}"'
+        download['X-Profile-Status'] = str(response.status_code)
+        download['X-Profile-Duration-Ms'] = f"{duration_ms:.1f}"
+        return download
@@ -0,0 +1,125 @@
+# monitoring/slow_queries.py
+"""
+Persist slow queries captured by QueryCounter (monitoring/instrumentation.py).
+
+The middleware hands over a request's captures once the response is
+built, i.e. after its execute wrappers are gone, so the EXPLAIN and INSERT
+issued here are never timed or captured themselves. EXPLAIN is only run
+for SELECTs, without ANALYZE, so it never re-executes the query. Rows are
+also logged as JSON to `monitoring.slow_queries`. The table rotates on
+its own: roughly one store in PRUNE_EVERY also drops rows older than
+SLOW_QUERY_RETENTION_DAYS (prune_slow_queries does the same on demand).
+
+Query parameters carry patient data and password hashes, so only their
+shapes are kept by default - `[str(12), int, None]` - in the table and
+the log alike. SLOW_QUERY_STORE_PARAMS=True keeps the raw values, for a
+debugging session on data that may be seen.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import SlowQuery
+
+logger = logging.getLogger('monitoring.slow_queries')
+
+PRUNE_EVERY = 100
+
+_SELECT_RE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+def explain(alias, sql, params):
+    """Query plan text from SQLite (EXPLAIN QUERY PLAN) or Postgres (EXPLAIN), '' if not applicable"""
+    if not _SELECT_RE.match(sql):
+        return ''
+    connection = connections[alias]
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}", params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return ''
+    func = getattr(match.func, 'view_class', match.func)
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def _shape(value):
+    if value is None:
+        return 'None'
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return f"{type(value).__name__}({len(value)})"
+    if isinstance(value, (list, tuple)):
+        return f"[{', '.join(_shape(item) for item in value)}]"
+    if isinstance(value, dict):
+        return f"{{{', '.join(f'{key}: {_shape(item)}' for key, item in value.items())}}}"
+    return type(value).__name__
+
+
+def describe_params(params):
+    """What is stored and logged for a query's parameters: their shapes, or the values when opted in"""
+    if getattr(settings, 'SLOW_QUERY_STORE_PARAMS', False):
+        return repr(params)[:2000]
+    return _shape(params)[:2000]
+
+
+def record(request, route, captures):
+    """Log and store the slow queries captured while serving `request`"""
+    rows = []
+    for capture in captures:
+        sql = capture['sql']
+        many = capture['many']
+        params = capture['params']
+        plan = '' if many or not getattr(settings, 'SLOW_QUERY_EXPLAIN', True) else explain(capture['alias'], sql, params)
+        row = SlowQuery(
+            duration_ms=round(capture['duration'] * 1000, 2),
+            database=capture['alias'],
+            sql=sql,
+            sql_hash=hashlib.sha1(sql.encode()).hexdigest(),
+            params=describe_params(params),
+            route=route,
+            view=_view_name(request),
+            method=request.method,
+            path=request.path[:500],
+            stack='\n'.join(capture['frames']),
+            explain=plan,
+        )
+        rows.append(row)
+        logger.warning(json.dumps({
+            'event': 'slow_query',
+            'duration_ms': row.duration_ms,
+            'route': route,
+            'view': row.view,
+            'sql': sql,
+            'params': row.params,
+            'stack': capture['frames'],
+            'explain': plan,
+        }))
+
+    if getattr(settings, 'SLOW_QUERY_STORE', True):
+        try:
+            SlowQuery.objects.bulk_create(rows)
+            if random.random() < 1 / PRUNE_EVERY:
+                prune(settings.SLOW_QUERY_RETENTION_DAYS)
+        except Exception as e:
+            logger.error(f"Could not store slow queries: {e}")
+
+
+def prune(days):
+    """Delete captures older than `days`; returns the number removed"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = SlowQuery.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,12 @@
+# monitoring/urls.py
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    # tracemalloc snapshots of the worker serving the request (monitoring/memory.py)
+    path('memory/', views.MemoryStatusView.as_view(), name='memory-status'),
+    path('memory/snapshots/', views.MemorySnapshotView.as_view(), name='memory-snapshot'),
+    path('memory/snapshots/<int:old_id>/diff/<int:new_id>/', views.MemorySnapshotDiffView.as_view(),
+         name='memory-snapshot-diff'),
+]
@@ -0,0 +1,95 @@
+# monitoring/views.py
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from hospital.permissions import IsRole
+
+from . import memory
+from .metrics import render_latest
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus text exposition, behind a bearer token (METRICS_AUTH_TOKEN).
+    Without a token it is only served with DEBUG on: every scrape also
+    counts the email outbox.
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if not token and not settings.DEBUG:
+        return HttpResponse('Metrics need METRICS_AUTH_TOKEN', status=403, content_type='text/plain')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    body, content_type = render_latest()
+    return HttpResponse(body, content_type=content_type)
+
+
+class MemoryStatusView(APIView):
+    """tracemalloc state of the worker that serves the request (admin only); DELETE stops tracing"""
+    permission_classes = [permissions.IsAuthenticated, IsRole]
+    allowed_roles = ['ADMIN']
+
+    def get(self, request):
+        return Response(memory.status())
+
+    def delete(self, request):
+        memory.stop()
+        return Response(memory.status())
+
+
+class MemorySnapshotView(APIView):
+    """
+    Take a tracemalloc snapshot in this worker (admin only).
+
+    Body (all optional): frames (traceback depth, only honoured when this
+    call starts tracing), group_by ('lineno', 'filename' or 'traceback'),
+    limit (how many top entries to return).
+    """
+    permission_classes = [permissions.IsAuthenticated, IsRole]
+    allowed_roles = ['ADMIN']
+
+    def post(self, request):
+        try:
+            frames = max(1, min(int(request.data.get('frames', 1)), 50))
+            limit = max(1, min(int(request.data.get('limit', 25)), 200))
+        except (TypeError, ValueError):
+            return Response({'error': 'frames and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        group_by = request.data.get('group_by', 'lineno')
+        if group_by not in memory.GROUP_BY:
+            return Response({'error': f"group_by must be one of {', '.join(memory.GROUP_BY)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(memory.take_snapshot(frames=frames, group_by=group_by, limit=limit),
+                        status=status.HTTP_201_CREATED)
+
+
+class MemorySnapshotDiffView(APIView):
+    """What grew between two snapshots of this worker (admin only); ?group_by=&limit="""
+    permission_classes = [permissions.IsAuthenticated, IsRole]
+    allowed_roles = ['ADMIN']
+
+    def get(self, request, old_id, new_id):
+        group_by = request.query_params.get('group_by', 'lineno')
+        if group_by not in memory.GROUP_BY:
+            return Response({'error': f"group_by must be one of {', '.join(memory.GROUP_BY)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 25)), 200))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        result = memory.diff(old_id, new_id, group_by=group_by, limit=limit)
+        if result is None:
+            return Response({
+                'detail': f"Snapshots {old_id} and {new_id} are not both held by worker {os.getpid()}",
+                'worker': memory.status(),
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(result)
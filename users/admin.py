@@ -1,5 +1,13 @@
 from django.contrib import admin
-from . models import Profile
+from . models import Profile, EmailOutbox
 # Register your models here.
 
-admin.site.register(Profile)
\ No newline at end of file
+admin.site.register(Profile)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
@@ -0,0 +1,58 @@
+# users/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Upper
+
+UserModel = get_user_model()
+
+
+class EmailOrUsernameModelBackend(ModelBackend):
+    """
+    Authenticate with a username OR an email address (case-insensitive).
+
+    The user is resolved in a single query that can use the unique username
+    index and the UPPER(email) index from users/migrations/0003, and the
+    password hasher runs exactly once per attempt - including when no user
+    matches, so failed logins cost the same as successful ones.
+
+    A failed password login raises PermissionDenied, which stops
+    authenticate() there: ModelBackend is still listed after this backend
+    for existing sessions, and would otherwise look the user up and hash
+    the password a second time.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.get_user_by_identifier(username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            UserModel().set_password(password)
+            raise PermissionDenied
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        raise PermissionDenied
+
+    def get_user_by_identifier(self, identifier):
+        """Return the user whose username or email matches, preferring the username"""
+        return (
+            UserModel._default_manager
+            .alias(email_upper=Upper('email'))
+            .filter(Q(username=identifier) | Q(email_upper=identifier.upper()))
+            .annotate(
+                username_match=Case(
+                    When(username=identifier, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by('username_match', 'pk')
+            .first()
+        )
@@ -0,0 +1,130 @@
+# users/cache.py
+"""
+Read-through cache for the per-user payloads served by login and dashboard.
+
+Keys carry the payload schema (PAYLOAD_VERSION, bumped when the shape
+changes) and a per-user version stamp. User/Profile post_save and
+post_delete (users/signals.py) bump the stamp after commit, never views.
+Bumping instead of deleting keeps a read-through that started before the
+change from writing its stale payload back where the next read finds it:
+it writes under the old stamp, which nothing reads any more, and the
+entry expires with CACHE_TIMEOUT. Payloads include the role, so the
+stamps must live in a cache every worker shares: settings refuses to
+start several workers on per-process LocMem.
+
+Profile picture URLs are cached as storage URLs and made absolute per
+request, so a cached entry is valid whatever host it is served under.
+Lookups are counted in the user_payload_cache_lookups metric.
+"""
+import time
+
+from django.core.cache import cache
+
+from monitoring.metrics import USER_PAYLOAD_CACHE
+
+from .models import Profile
+
+PAYLOAD_VERSION = 1
+CACHE_TIMEOUT = 60 * 15
+
+
+def version_key(user_id):
+    return f"user_{user_id}_version"
+
+
+def _new_stamp():
+    # Milliseconds, so a stamp lost with the cache restarts above every one handed out before
+    return int(time.time() * 1000)
+
+
+def current_version(user_id):
+    version = cache.get(version_key(user_id))
+    if version is None:
+        cache.add(version_key(user_id), _new_stamp(), None)
+        version = cache.get(version_key(user_id))
+    return version
+
+
+def bump_version(user_id):
+    """Make every cached payload of the user stale"""
+    try:
+        return cache.incr(version_key(user_id))
+    except ValueError:
+        stamp = _new_stamp()
+        cache.set(version_key(user_id), stamp, None)
+        return stamp
+
+
+def basic_key(user_id, version):
+    return f"user_{user_id}_basic:v{PAYLOAD_VERSION}:{version}"
+
+
+def dashboard_key(user_id, version):
+    return f"user_dashboard_{user_id}:v{PAYLOAD_VERSION}:{version}"
+
+
+def _read_through(key, build):
+    payload = cache.get(key)
+    if payload is not None:
+        USER_PAYLOAD_CACHE.labels('hit').inc()
+        return payload
+    USER_PAYLOAD_CACHE.labels('miss').inc()
+    payload = build()
+    if payload is not None:
+        cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+def _user_payload(user, profile):
+    if profile is None:
+        profile_data = {
+            'role': 'PATIENT',
+            'fullname': user.get_full_name() or user.username,
+            'profile_pix': None,
+            'phone': None,
+            'gender': None,
+        }
+    else:
+        profile_data = {
+            'role': profile.role,
+            'fullname': profile.fullname,
+            'profile_pix': profile.profile_pix.url if profile.profile_pix else None,
+            'phone': profile.phone,
+            'gender': profile.gender,
+        }
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'profile': profile_data,
+    }
+
+
+def _load_profile(user):
+    return Profile.objects.filter(user=user).first()
+
+
+def _with_absolute_pix(payload, request):
+    profile = dict(payload['profile'])
+    if profile.get('profile_pix') and request is not None:
+        profile['profile_pix'] = request.build_absolute_uri(profile['profile_pix'])
+    return {**payload, 'profile': profile}
+
+
+def get_basic_user(user, request=None):
+    """{'id', 'username', 'email', 'profile'} for login responses"""
+    payload = _read_through(basic_key(user.id, current_version(user.id)), lambda: _user_payload(user, _load_profile(user)))
+    return _with_absolute_pix(payload, request)
+
+
+def get_dashboard(user, request=None):
+    """Dashboard payload, or None when the user has no profile"""
+    def build():
+        profile = _load_profile(user)
+        return _user_payload(user, profile) if profile is not None else None
+
+    payload = _read_through(dashboard_key(user.id, current_version(user.id)), build)
+    if payload is None:
+        return None
+    return {'user': _with_absolute_pix(payload, request)}
+
@@ -0,0 +1,149 @@
+# users/fake_google.py
+"""
+A local stand-in for Google's token, userinfo and JWKS endpoints.
+
+It signs real RS256 ID tokens with a throwaway key, so the whole code ->
+token -> offline verification path runs without network access:
+
+    server = FakeGoogleServer(client_id='test-client').start()
+    server.add_user('some-code', email='ada@example.com', name='Ada Lovelace')
+    with override_settings(**server.settings_overrides()):
+        ...  # POST google_auth_code='some-code' to the login endpoint
+    server.stop()
+
+`python manage.py run_fake_google` runs it standalone for local frontends.
+"""
+import json
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+TOKEN_PATH = '/token'
+USERINFO_PATH = '/oauth2/v3/userinfo'
+JWKS_PATH = '/oauth2/v3/certs'
+ISSUER = 'https://accounts.google.com'
+
+
+class FakeGoogleServer:
+    def __init__(self, client_id, host='127.0.0.1', port=0, jwks_max_age=300):
+        self.client_id = client_id
+        self.jwks_max_age = jwks_max_age
+        self.kid = secrets.token_hex(8)
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.users_by_code = {}
+        self.users_by_access_token = {}
+        self.requests = []  # (method, path) log, handy for asserting call counts
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def settings_overrides(self):
+        """Settings that point users/google.py at this server"""
+        return {
+            'GOOGLE_TOKEN_URL': self.base_url + TOKEN_PATH,
+            'GOOGLE_USERINFO_URL': self.base_url + USERINFO_PATH,
+            'GOOGLE_JWKS_URL': self.base_url + JWKS_PATH,
+            'SOCIAL_AUTH_GOOGLE_OAUTH2_KEY': self.client_id,
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def add_user(self, code, email, name='', given_name='', family_name='', email_verified=True):
+        """Register the Google account an authorization code will log in as"""
+        self.users_by_code[code] = {
+            'sub': secrets.token_hex(10),
+            'email': email,
+            'email_verified': email_verified,
+            'name': name,
+            'given_name': given_name,
+            'family_name': family_name,
+        }
+
+    def rotate_key(self):
+        """Sign with a new key under a new kid, the way Google rotates its keys"""
+        self.kid = secrets.token_hex(8)
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def issue_id_token(self, lifetime=3600, **claims):
+        now = int(time.time())
+        payload = {'iss': ISSUER, 'aud': self.client_id, 'iat': now, 'exp': now + lifetime}
+        payload.update(claims)
+        return jwt.encode(payload, self.private_key, algorithm='RS256', headers={'kid': self.kid})
+
+    def jwks(self):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({'kid': self.kid, 'alg': 'RS256', 'use': 'sig'})
+        return {'keys': [jwk]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, data, headers=None):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urllib.parse.urlparse(self.path).path
+                server.requests.append(('GET', path))
+                if path == JWKS_PATH:
+                    self._send_json(200, server.jwks(), {'Cache-Control': f'public, max-age={server.jwks_max_age}'})
+                elif path == USERINFO_PATH:
+                    token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+                    user = server.users_by_access_token.get(token)
+                    if user is None:
+                        self._send_json(401, {'error': 'invalid_token'})
+                    else:
+                        self._send_json(200, user)
+                else:
+                    self._send_json(404, {'error': 'not_found'})
+
+            def do_POST(self):
+                path = urllib.parse.urlparse(self.path).path
+                server.requests.append(('POST', path))
+                if path != TOKEN_PATH:
+                    self._send_json(404, {'error': 'not_found'})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                form = urllib.parse.parse_qs(self.rfile.read(length).decode())
+                code = form.get('code', [''])[0]
+                user = server.users_by_code.get(code)
+                if user is None or form.get('client_id', [''])[0] != server.client_id:
+                    self._send_json(400, {'error': 'invalid_grant'})
+                    return
+                access_token = secrets.token_urlsafe(24)
+                server.users_by_access_token[access_token] = user
+                self._send_json(200, {
+                    'access_token': access_token,
+                    'id_token': server.issue_id_token(**user),
+                    'expires_in': 3599,
+                    'token_type': 'Bearer',
+                    'scope': 'openid email profile',
+                })
+
+        return Handler
@@ -0,0 +1,197 @@
+# users/google.py
+"""
+Google OAuth helpers for the direct (non social-auth) login views.
+
+- One pooled requests.Session with timeouts for every outbound call.
+- ID tokens are verified locally against Google's JWKS, which is cached in
+  process (and in the Django cache, so workers share one fetch) until its
+  Cache-Control max-age runs out. That replaces the userinfo round trip.
+"""
+import logging
+import re
+import threading
+import time
+
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Never refetch the JWKS for an unknown kid more often than this
+JWKS_MIN_REFRESH_SECONDS = 60
+# Clock skew tolerated on exp/iat
+ID_TOKEN_LEEWAY_SECONDS = 30
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class GoogleTokenError(Exception):
+    """Raised when a Google ID token cannot be verified"""
+
+
+def get_session():
+    """Process-wide pooled session; idempotent GETs are retried on connection errors"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                retry = Retry(total=2, backoff_factor=0.2, allowed_methods=['GET'], status_forcelist=[502, 503, 504])
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _timeout():
+    return (settings.GOOGLE_HTTP_CONNECT_TIMEOUT, settings.GOOGLE_HTTP_READ_TIMEOUT)
+
+
+def exchange_code(code, redirect_uri):
+    """Exchange an authorization code for Google's token response (raises requests.RequestException)"""
+    response = get_session().post(
+        settings.GOOGLE_TOKEN_URL,
+        data={
+            'code': code,
+            'client_id': settings.SOCIAL_AUTH_GOOGLE_OAUTH2_KEY,
+            'client_secret': settings.SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET,
+            'redirect_uri': redirect_uri,
+            'grant_type': 'authorization_code',
+        },
+        timeout=_timeout(),
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_userinfo(access_token):
+    """Userinfo round trip - only for clients that can send nothing but an access token"""
+    response = get_session().get(
+        settings.GOOGLE_USERINFO_URL,
+        headers={'Authorization': f'Bearer {access_token}'},
+        timeout=_timeout(),
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+class JWKSCache:
+    """Signing keys for one JWKS URL, refreshed when expired or when an unknown kid shows up"""
+
+    def __init__(self, url):
+        self.url = url
+        self.keys = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+
+    def get_key(self, kid):
+        now = time.time()
+        expired = now >= self.expires_at
+        unknown = kid not in self.keys and now - self.fetched_at >= JWKS_MIN_REFRESH_SECONDS
+        if expired or unknown:
+            with self.lock:
+                # Another thread may have refreshed while we waited for the lock
+                if self.fetched_at <= now:
+                    # An unknown kid means Google rotated keys: skip the shared cache
+                    self.refresh(force=unknown and not expired)
+        key = self.keys.get(kid)
+        if key is None:
+            raise GoogleTokenError(f"Unknown signing key id: {kid}")
+        return key
+
+    def refresh(self, force=False):
+        cache_key = f"google_jwks:{self.url}"
+        cached = None if force else cache.get(cache_key)
+        if cached is None:
+            response = get_session().get(self.url, timeout=_timeout())
+            response.raise_for_status()
+            max_age = _max_age(response.headers.get('Cache-Control', ''))
+            ttl = max_age if max_age is not None else settings.GOOGLE_JWKS_CACHE_SECONDS
+            cached = {'jwks': response.json(), 'expires_at': time.time() + ttl}
+            cache.set(cache_key, cached, ttl)
+            logger.info(f"Fetched Google JWKS ({len(cached['jwks'].get('keys', []))} keys, ttl {ttl}s)")
+
+        self.keys = {
+            key_data['kid']: jwt.PyJWK(key_data).key
+            for key_data in cached['jwks'].get('keys', [])
+            if key_data.get('kid')
+        }
+        self.expires_at = cached['expires_at']
+        self.fetched_at = time.time()
+
+
+def _max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control)
+    return int(match.group(1)) if match else None
+
+
+_jwks_caches = {}
+_jwks_caches_lock = threading.Lock()
+
+
+def get_jwks_cache():
+    url = settings.GOOGLE_JWKS_URL
+    with _jwks_caches_lock:
+        if url not in _jwks_caches:
+            _jwks_caches[url] = JWKSCache(url)
+        return _jwks_caches[url]
+
+
+def verify_id_token(id_token):
+    """
+    Verify a Google ID token offline and return its claims.
+
+    Checks signature (RS256, key from the cached JWKS), audience (our
+    client id), issuer, expiry and that the email is verified.
+    """
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except jwt.PyJWTError as e:
+        raise GoogleTokenError(f"Malformed ID token: {e}")
+
+    try:
+        key = get_jwks_cache().get_key(header.get('kid'))
+    except requests.RequestException as e:
+        raise GoogleTokenError(f"Could not fetch Google signing keys: {e}")
+
+    try:
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=['RS256'],
+            audience=settings.SOCIAL_AUTH_GOOGLE_OAUTH2_KEY,
+            leeway=ID_TOKEN_LEEWAY_SECONDS,
+            options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']},
+        )
+    except jwt.PyJWTError as e:
+        raise GoogleTokenError(f"Invalid ID token: {e}")
+
+    if claims.get('iss') not in settings.GOOGLE_ID_TOKEN_ISSUERS:
+        raise GoogleTokenError(f"Unexpected ID token issuer: {claims.get('iss')}")
+    if not claims.get('email') or claims.get('email_verified') in (False, 'false'):
+        raise GoogleTokenError("ID token has no verified email")
+    return claims
+
+
+def user_info_from_token_response(token_json):
+    """
+    Google user info for a token-endpoint response: verified locally from
+    the id_token, falling back to userinfo only if no id_token was issued.
+    """
+    id_token = token_json.get('id_token')
+    if id_token:
+        return verify_id_token(id_token)
+
+    access_token = token_json.get('access_token')
+    if not access_token:
+        raise GoogleTokenError("Google returned neither an ID token nor an access token")
+    logger.warning("Google token response had no id_token; falling back to userinfo")
+    return fetch_userinfo(access_token)
+
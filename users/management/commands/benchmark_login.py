@@ -0,0 +1,100 @@
+# users/management/commands/benchmark_login.py
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.benchmarking import benchmark_database, summarize
+from users.models import Profile
+
+PASSWORD = 'Bench-Password-123'
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput (username, email, failed) on a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Users to seed')
+        parser.add_argument('--iterations', type=int, default=50, help='Logins per scenario')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.seed_users(options['users'])
+            results = self.run_scenarios(options['users'], options['iterations'])
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22} {result['logins_per_sec']:>8.1f} logins/s  "
+                f"p50 {result['p50_ms']:.1f}ms  p95 {result['p95_ms']:.1f}ms  "
+                f"{result['queries_per_login']:.1f} queries  "
+                f"{result['hashes_per_login']:.1f} hashes"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def seed_users(self, count):
+        # One hash for everyone - seeding should not dominate the run
+        password_hash = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(username=f'bench_user_{i}', email=f'Bench.User.{i}@example.com', password=password_hash)
+            for i in range(count)
+        )
+        Profile.objects.bulk_create(
+            Profile(user=user, fullname=user.username)
+            for user in User.objects.filter(username__startswith='bench_user_')
+        )
+
+    def run_scenarios(self, user_count, iterations):
+        scenarios = {
+            'endpoint_username': lambda i: {'username': f'bench_user_{i}', 'password': PASSWORD},
+            'endpoint_email': lambda i: {'username': f'bench.user.{i}@EXAMPLE.com', 'password': PASSWORD},
+            'endpoint_bad_password': lambda i: {'username': f'bench_user_{i}', 'password': 'wrong'},
+            'endpoint_unknown_user': lambda i: {'username': f'nobody_{i}@example.com', 'password': 'wrong'},
+        }
+        url = reverse('login')
+        client = Client()
+        results = {}
+
+        for name, make_payload in scenarios.items():
+            results[name] = self.measure(
+                iterations,
+                lambda i: client.post(url, make_payload(i % user_count), content_type='application/json', secure=True),
+            )
+
+        results['authenticate_email'] = self.measure(
+            iterations,
+            lambda i: authenticate(None, username=f'BENCH.USER.{i % user_count}@example.com', password=PASSWORD),
+        )
+        return results
+
+    def measure(self, iterations, call):
+        timings = []
+        hasher_encode = PBKDF2PasswordHasher.encode
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=hasher_encode) as encode:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for i in range(iterations):
+                    t0 = time.perf_counter()
+                    call(i)
+                    timings.append((time.perf_counter() - t0) * 1000)
+                elapsed = time.perf_counter() - started
+
+        result = summarize(timings)
+        result.update({
+            'logins_per_sec': round(iterations / elapsed, 2) if elapsed else 0.0,
+            'queries_per_login': round(len(queries) / iterations, 2),
+            'hashes_per_login': round(encode.call_count / iterations, 2),
+        })
+        return result
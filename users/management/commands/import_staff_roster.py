@@ -0,0 +1,40 @@
+# users/management/commands/import_staff_roster.py
+from django.core.management.base import BaseCommand, CommandError
+
+from users.provisioning import provision_staff, read_roster_csv
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-create staff accounts from a roster CSV with columns '
+        'username,email,password,fullname,role[,phone,gender]'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='Path to the roster CSV')
+        parser.add_argument('--workers', type=int, default=None, help='Hashing processes (default: all cores)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per INSERT')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, create nothing')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['roster'], newline='', encoding='utf-8-sig') as fh:
+                rows = read_roster_csv(fh)
+        except OSError as e:
+            raise CommandError(f"Cannot read roster: {e}")
+
+        result = provision_staff(
+            rows,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        for error in result['errors']:
+            # +1 for the header line, so numbers match the file
+            self.stderr.write(f"line {error['row'] + 1} ({error['username']}): {error['errors']}")
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result['created'])} of {len(rows)} staff accounts, {len(result['errors'])} rejected"
+        ))
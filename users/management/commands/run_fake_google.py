@@ -0,0 +1,40 @@
+# users/management/commands/run_fake_google.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.fake_google import FakeGoogleServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake of Google token/userinfo/JWKS endpoints for offline OAuth testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--client-id', default='fake-google-client')
+        parser.add_argument(
+            '--user', action='append', default=[], metavar='CODE:EMAIL[:NAME]',
+            help='Authorization code to accept and the account it logs in as (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        server = FakeGoogleServer(client_id=options['client_id'], port=options['port'])
+        users = options['user'] or ['test-code:test.user@example.com:Test User']
+        for spec in users:
+            code, email, name = (spec.split(':', 2) + [''])[:3]
+            given_name, _, family_name = name.partition(' ')
+            server.add_user(code, email, name=name, given_name=given_name, family_name=family_name)
+
+        server.start()
+        self.stdout.write(self.style.SUCCESS(f"Fake Google listening on {server.base_url}"))
+        self.stdout.write("Point the backend at it with:")
+        for name, value in server.settings_overrides().items():
+            self.stdout.write(f"  {name}={value}")
+        for code in server.users_by_code:
+            self.stdout.write(f"  accepted code: {code}")
+
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
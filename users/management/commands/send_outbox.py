@@ -0,0 +1,65 @@
+# users/management/commands/send_outbox.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from users.outbox import DEFAULT_MAX_ATTEMPTS, claim_batch, deliver_batch
+
+# Backends that "deliver" without sending anything; deliver_batch would mark
+# the rows sent and the mail would be lost
+NON_DELIVERING_BACKENDS = (
+    'django.core.mail.backends.console.EmailBackend',
+    'django.core.mail.backends.locmem.EmailBackend',
+    'django.core.mail.backends.dummy.EmailBackend',
+)
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails from the outbox, one SMTP connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages per SMTP connection')
+        parser.add_argument('--workers', type=int, default=2, help='Batches delivered concurrently')
+        parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of draining once')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        if settings.EMAIL_BACKEND in NON_DELIVERING_BACKENDS and not settings.DEBUG:
+            raise CommandError(
+                f"EMAIL_BACKEND is {settings.EMAIL_BACKEND}: queued mail would be marked sent "
+                f"without being delivered. Set EMAIL_BACKEND and the SMTP settings."
+            )
+        workers = max(1, options['workers'])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                futures = [pool.submit(self.run_worker, options) for _ in range(workers)]
+                sent = failed = 0
+                for future in futures:
+                    worker_sent, worker_failed = future.result()
+                    sent += worker_sent
+                    failed += worker_failed
+
+                if sent or failed:
+                    self.stdout.write(f"Outbox: {sent} sent, {failed} failed")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+    def run_worker(self, options):
+        """Drain batches until nothing is due; each thread uses its own DB connection"""
+        sent = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                batch = claim_batch(options['batch_size'], max_attempts=options['max_attempts'])
+                if not batch:
+                    return sent, failed
+                batch_sent, batch_failed = deliver_batch(batch, max_attempts=options['max_attempts'])
+                sent += batch_sent
+                failed += batch_failed
+        finally:
+            connection.close()
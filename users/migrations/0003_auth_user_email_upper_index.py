@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index auth_user on UPPER(email) so EmailOrUsernameModelBackend can
+    resolve case-insensitive email logins without a table scan.
+    auth.User is not ours to add Meta.indexes to, hence the raw SQL.
+    """
+
+    dependencies = [
+        ('users', '0002_profile_role_alter_profile_gender_and_more'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS users_auth_user_email_upper_idx ON auth_user (UPPER(email));',
+            reverse_sql='DROP INDEX IF EXISTS users_auth_user_email_upper_idx;',
+        ),
+    ]
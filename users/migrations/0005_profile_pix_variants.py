@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='profile_pix_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
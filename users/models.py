@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -17,20 +18,51 @@ GENDER_CHOICES = (
     ('O', 'Other'),
 )
 
+OUTBOX_STATUS = (
+    ('PENDING', 'Pending'),
+    ('SENDING', 'Sending'),
+    ('SENT', 'Sent'),
+    ('FAILED', 'Failed'),
+)
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     fullname = models.CharField(max_length=255)
     phone = models.CharField(max_length=50, blank=True, null=True)
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES, blank=True, null=True)
     profile_pix = models.ImageField(upload_to='profile', blank=True, null=True)
+    # Square thumbnails of profile_pix (hospital/images.py)
+    profile_pix_variants = models.JSONField(default=dict, blank=True, editable=False)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='PATIENT')
 
     def __str__(self):
         return f"{self.fullname} ({self.role})"
 
 
+class EmailOutbox(models.Model):
+    """Outgoing mail, written in the sender's transaction and delivered by `manage.py send_outbox`."""
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=OUTBOX_STATUS, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest retry time for PENDING rows, lease expiry for SENDING rows
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
     if created:
         # If you want an empty profile created automatically when a User is created:
         Profile.objects.create(user=instance, fullname=instance.get_full_name() or instance.username)
@@ -0,0 +1,137 @@
+# users/outbox.py
+"""
+Delivery side of the email outbox (rows are queued with users.utils.queue_mail).
+
+Workers claim a batch by leasing it (status SENDING, next_attempt_at =
+lease expiry), send the whole batch over ONE SMTP connection, then mark
+rows SENT or reschedule them with exponential backoff. A worker that dies
+mid-batch simply lets its lease run out and the rows become claimable again.
+
+Claiming counts the attempt, so a message that keeps killing its worker
+still runs out of attempts. Each message's lease is renewed just before it
+is sent, and only if the row still carries the lease this worker took: a
+batch that outlasts the leases of its later rows (slow SMTP, a large
+--batch-size) skips whatever another worker has re-claimed meanwhile
+instead of sending it twice.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Per message: renewed before each send, so it only has to cover one
+LEASE_SECONDS = 300
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 6 * 3600
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before retry number `attempts` (30s, 60s, 120s, ... capped at 6h)"""
+    return min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+
+
+def claim_batch(batch_size, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Lease up to `batch_size` due messages; concurrent workers never get the same row"""
+    now = timezone.now()
+    with transaction.atomic():
+        # SKIP LOCKED on Postgres; SQLite serializes writers and ignores it
+        due = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='PENDING') | Q(status='SENDING'), next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', 'attempts')[:batch_size]
+        )
+        # Only an expired lease gets here with no attempts left: its worker died sending it
+        exhausted = [message_id for message_id, attempts in due if attempts >= max_attempts]
+        ids = [message_id for message_id, attempts in due if attempts < max_attempts]
+        if exhausted:
+            EmailOutbox.objects.filter(id__in=exhausted).update(
+                status='FAILED', last_error='Delivery did not finish (worker lost) on the last attempt'
+            )
+            logger.error(f"Giving up on emails {exhausted}: their last delivery attempt never finished")
+        if not ids:
+            return []
+        EmailOutbox.objects.filter(id__in=ids).update(
+            status='SENDING', attempts=F('attempts') + 1, next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by('id'))
+
+
+def renew_lease(message):
+    """Extend the lease on a claimed message; False if this worker no longer holds it"""
+    lease = timezone.now() + timedelta(seconds=LEASE_SECONDS)
+    renewed = EmailOutbox.objects.filter(
+        id=message.id, status='SENDING', next_attempt_at=message.next_attempt_at,
+    ).update(next_attempt_at=lease)
+    if renewed:
+        message.next_attempt_at = lease
+    return bool(renewed)
+
+
+def _reschedule(message, error, max_attempts):
+    # claim_batch already counted this attempt
+    message.last_error = str(error)[:2000]
+    if message.attempts >= max_attempts:
+        message.status = 'FAILED'
+        logger.error(f"Giving up on email {message.id} to {message.to_email}: {error}")
+    else:
+        message.status = 'PENDING'
+        message.next_attempt_at = timezone.now() + timedelta(seconds=backoff_delay(message.attempts))
+        logger.warning(f"Email {message.id} to {message.to_email} failed (attempt {message.attempts}): {error}")
+    message.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def deliver_batch(messages, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Send claimed messages over a single SMTP connection. Returns (sent, failed) counts."""
+    if not messages:
+        return 0, 0
+
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or settings.EMAIL_HOST_USER
+    connection = get_connection(fail_silently=False, timeout=settings.EMAIL_TIMEOUT)
+    try:
+        connection.open()
+    except Exception as e:
+        for message in messages:
+            _reschedule(message, f"connection failed: {e}", max_attempts)
+        return 0, len(messages)
+
+    sent_ids = []
+    failed = 0
+    try:
+        for message in messages:
+            if not renew_lease(message):
+                logger.warning(f"Lease on email {message.id} expired and was re-claimed; leaving it to that worker")
+                continue
+            try:
+                EmailMessage(
+                    message.subject, message.body, from_email, [message.to_email], connection=connection
+                ).send()
+                sent_ids.append(message.id)
+            except Exception as e:
+                failed += 1
+                _reschedule(message, e, max_attempts)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    if sent_ids:
+        EmailOutbox.objects.filter(id__in=sent_ids).update(
+            status='SENT', sent_at=timezone.now(), last_error=''
+        )
+    return len(sent_ids), failed
+
+
+def pending_count():
+    """Outbox depth: messages not yet sent or given up on"""
+    return EmailOutbox.objects.filter(status__in=['PENDING', 'SENDING']).count()
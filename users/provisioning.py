@@ -0,0 +1,147 @@
+# users/provisioning.py
+"""
+Bulk staff provisioning for onboarding a facility.
+
+Rows are validated up front, uniqueness is checked with one query per
+column instead of two exists() per user, PBKDF2 hashing is spread across a
+process pool, and User/Profile rows are written with bulk_create - which
+also means the per-row post_save signals never fire. None of their
+receivers has anything to do for brand-new staff: the Profile is written
+here, nothing is cached for a user id that didn't exist (users/cache.py),
+a new admin has no blog posts whose responses could be stale, and a
+roster carries no profile pictures to make variants of.
+
+The pool's workers are spawned, never forked: a fork copies the parent's
+locks mid-use from whatever threads it runs (image variants, view count
+flushes, DB connections) and can deadlock. Spawning pays a Django
+start-up per worker, so it is for `manage.py import_staff_roster`; the
+admin endpoint takes at most STAFF_IMPORT_MAX_ROWS rows and hashes them
+in the request's own process.
+"""
+import csv
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.functions import Upper
+
+from .models import Profile
+from .serializers import StaffRosterRowSerializer
+
+logger = logging.getLogger(__name__)
+
+# Below this many passwords the pool start-up costs more than it saves
+MIN_ROWS_FOR_POOL = 8
+
+
+def read_roster_csv(fileobj):
+    """Parse a roster CSV (header row required) into a list of dicts"""
+    content = fileobj.read()
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(content))
+    return [
+        {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        for row in reader
+    ]
+
+
+def _init_worker():
+    # Spawned workers start from a fresh interpreter
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash raw passwords, in parallel across `workers` processes (default: all cores)"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < MIN_ROWS_FOR_POOL:
+        return [make_password(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=_init_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def provision_staff(rows, workers=None, batch_size=500, dry_run=False):
+    """
+    Create staff users and profiles from roster rows.
+
+    Returns {'created': [usernames], 'errors': [{'row', 'username', 'errors'}]}
+    where 'row' is the 1-based position in `rows`. Invalid rows are
+    reported and skipped; valid rows are created in one transaction.
+    """
+    errors = []
+    valid = []
+
+    for index, row in enumerate(rows, start=1):
+        serializer = StaffRosterRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'row': index, 'username': row.get('username'), 'errors': serializer.errors})
+
+    # Set-based uniqueness: one query per column, plus duplicates inside the roster
+    usernames = [data['username'] for _, data in valid]
+    emails = [data['email'].upper() for _, data in valid]
+    taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    taken_emails = set(
+        User.objects.annotate(email_upper=Upper('email'))
+        .filter(email_upper__in=emails)
+        .values_list('email_upper', flat=True)
+    )
+
+    accepted = []
+    for index, data in valid:
+        row_errors = {}
+        if data['username'] in taken_usernames:
+            row_errors['username'] = ['Username already taken.']
+        if data['email'].upper() in taken_emails:
+            row_errors['email'] = ['Email already registered.']
+        if row_errors:
+            errors.append({'row': index, 'username': data['username'], 'errors': row_errors})
+            continue
+        taken_usernames.add(data['username'])
+        taken_emails.add(data['email'].upper())
+        accepted.append(data)
+
+    errors.sort(key=lambda error: error['row'])
+    if dry_run or not accepted:
+        return {'created': [data['username'] for data in accepted], 'errors': errors}
+
+    hashes = hash_passwords([data['password'] for data in accepted], workers=workers)
+
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [
+                User(username=data['username'], email=data['email'], password=password_hash)
+                for data, password_hash in zip(accepted, hashes)
+            ],
+            batch_size=batch_size,
+        )
+        # Not every backend returns primary keys from bulk_create; look them up
+        user_ids = dict(
+            User.objects.filter(username__in=[data['username'] for data in accepted])
+            .values_list('username', 'id')
+        )
+        Profile.objects.bulk_create(
+            [
+                Profile(
+                    user_id=user_ids[data['username']],
+                    fullname=data['fullname'],
+                    role=data['role'],
+                    phone=data.get('phone') or None,
+                    gender=data.get('gender') or None,
+                )
+                for data in accepted
+            ],
+            batch_size=batch_size,
+        )
+
+    logger.info(f"Provisioned {len(accepted)} staff accounts ({len(errors)} rows rejected)")
+    return {'created': [data['username'] for data in accepted], 'errors': errors}
@@ -3,7 +3,7 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Profile, GENDER_CHOICES, ROLE_CHOICES
 from django.contrib.auth.password_validation import validate_password
-from .utils import SendMail
+from .utils import queue_welcome_mail
 import logging
 
 logger = logging.getLogger(__name__)
@@ -95,31 +95,35 @@ class RegistrationSerializer(serializers.Serializer):
             profile.profile_pix = profile_pix
         profile.save()
 
-        # Send welcome email (non-blocking)
-        try:
-            # Use threading or celery for async email in production
-            # For now, we'll run it in a way that won't block
-            import threading
-            def send_email_async():
-                try:
-                    from .utils import SendMail
-                    SendMail(email)
-                except Exception:
-                    pass  # Silently fail in async thread
-            
-            email_thread = threading.Thread(target=send_email_async)
-            email_thread.daemon = True
-            email_thread.start()
-            
-            logger.info(f"User {username} registered, email sent async")
-            
-        except Exception as e:
-            logger.warning(f"Failed to schedule email for {email}: {str(e)}")
-            # Don't fail registration because of email
+        # Welcome email goes through the outbox: one INSERT in this
+        # transaction, delivered by `manage.py send_outbox`
+        queue_welcome_mail(email)
+        logger.info(f"User {username} registered, welcome email queued")
 
         return profile
 
 
+# Roster rows for bulk staff provisioning (see users/provisioning.py).
+# Uniqueness is checked set-based by the importer, not per row here.
+STAFF_ROLE_CHOICES = [(value, label) for value, label in ROLE_CHOICES if value != 'PATIENT']
+
+class StaffRosterRowSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField()
+    password = serializers.CharField(write_only=True)
+    fullname = serializers.CharField(max_length=255)
+    role = serializers.ChoiceField(choices=STAFF_ROLE_CHOICES)
+    phone = serializers.CharField(required=False, allow_blank=True, max_length=50)
+    gender = serializers.ChoiceField(choices=GENDER_CHOICES, required=False, allow_blank=True)
+
+    def validate(self, data):
+        validate_password(
+            data['password'],
+            user=User(username=data['username'], email=data['email'], first_name=data['fullname'])
+        )
+        return data
+
+
 class UpdateProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', required=False)
     email = serializers.EmailField(source='user.email', required=False)
@@ -1,8 +1,10 @@
 # users/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import Profile
+from . import cache as user_cache
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -10,5 +12,27 @@ def create_user_profile(sender, instance, created, **kwargs):
         Profile.objects.get_or_create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login; re-saving the profile then would just
+    # invalidate the cached payloads for nothing
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    instance.profile.save()
+
+# ---- Payload cache invalidation (see users/cache.py) ----
+
+def _invalidate_after_commit(user_id):
+    transaction.on_commit(lambda: user_cache.bump_version(user_id))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_payload_cache(sender, instance, update_fields=None, **kwargs):
+    # last_login is written on every login and is not part of the payload
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    _invalidate_after_commit(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_payload_cache(sender, instance, **kwargs):
+    _invalidate_after_commit(instance.user_id)
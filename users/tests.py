@@ -1,3 +1,496 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate, get_user, get_user_model
+from django.contrib.auth.hashers import check_password, get_hasher
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import CommandError, call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.db import IntegrityError, connection
+from django.http import HttpRequest
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.query_budgets import QueryBudgetTestMixin
+from hospital.seeding import BENCH_PASSWORD, HospitalGenerator
+from monitoring import slow_queries
+from monitoring.metrics import AUTH_EVENTS
+from monitoring.models import SlowQuery
+
+from . import cache as user_cache
+from . import google, outbox, provisioning, utils
+from .authentication import ProfileJWTAuthentication
+from .fake_google import FakeGoogleServer
+from .models import EmailOutbox, Profile
+
+
+class UsersQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Account endpoints stay within their budget in api/query_budgets.py as the user table grows"""
+
+    def setUp(self):
+        cache.clear()
+        self.generator = HospitalGenerator(staff=4, patients=3, blog_posts=0, prefix='budget', collect=True)
+        self.generator.run()
+        self.user = self.generator.staff_by_role['NURSE'][0].user
+        self.registrations = 0
+
+    def post(self, route, payload, token=None):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}') if token else Client()
+        return lambda: client.post(reverse(route), json.dumps(payload), content_type='application/json', secure=True)
+
+    def measure_all(self):
+        cache.clear()  # dashboard budget is for a cold cache
+        refresh = RefreshToken.for_user(self.user)
+        access = str(refresh.access_token)
+        authed = Client(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.registrations += 1
+        number = self.registrations
+        scenarios = [
+            ('login', 'POST', self.post('login', {'username': self.user.username, 'password': BENCH_PASSWORD})),
+            ('register', 'POST', self.post('register', {
+                'username': f'budget_new_{number}', 'email': f'budget_new_{number}@example.com',
+                'fullname': 'Budget New', 'password1': BENCH_PASSWORD, 'password2': BENCH_PASSWORD,
+            })),
+            ('dashboard', 'GET', lambda: authed.get(reverse('dashboard'), secure=True)),
+            ('update-profile', 'GET', lambda: authed.get(reverse('update-profile'), secure=True)),
+            ('update-profile', 'PUT', lambda: authed.put(
+                reverse('update-profile'), json.dumps({'phone': f'0800000{number}'}),
+                content_type='application/json', secure=True,
+            )),
+            ('token_verify', 'POST', self.post('token_verify', {'token': access})),
+            ('token_refresh', 'POST', self.post('token_refresh', {'refresh': str(RefreshToken.for_user(self.user))})),
+            ('logout', 'POST', self.post('logout', {'refresh': str(refresh)}, token=access)),
+        ]
+        return {(route, method): self.count_queries(send) for route, method, send in scenarios}
+
+    def test_endpoints_within_budget_at_two_sizes(self):
+        small = self.measure_all()
+        self.generator.add_staff(20)
+        self.generator.add_patients(30)
+        large = self.measure_all()
+        for (route, method), count in small.items():
+            with self.subTest(route=route, method=method):
+                self.assertQueryBudget(route, method, count, large[(route, method)])
+
+
+class EmailOrUsernameBackendTests(TestCase):
+    """users/backends.py: one lookup by username or email, one hasher call either way"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user('alice', 'Alice@Example.com', 'alice-pass-123')
+        # Another account's email equal to alice's username
+        self.other = User.objects.create_user('other', 'alice', 'other-pass-123')
+
+    def test_login_by_username(self):
+        self.assertEqual(authenticate(username='alice', password='alice-pass-123'), self.alice)
+
+    def test_login_by_email_ignores_case(self):
+        self.assertEqual(authenticate(username='alice@example.COM', password='alice-pass-123'), self.alice)
+
+    def test_username_wins_over_another_accounts_email(self):
+        self.assertEqual(authenticate(username='alice', password='alice-pass-123'), self.alice)
+        self.assertIsNone(authenticate(username='alice', password='other-pass-123'))
+
+    def test_wrong_password(self):
+        self.assertIsNone(authenticate(username='alice', password='wrong'))
+
+    def hasher_calls(self, username):
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'encode', autospec=True, side_effect=hasher.encode) as encode:
+            self.assertIsNone(authenticate(username=username, password='whatever'))
+        return encode.call_count
+
+    def test_unknown_user_still_runs_the_hasher_once(self):
+        # The same work as a known user with a wrong password
+        self.assertEqual(self.hasher_calls('nobody'), 1)
+        self.assertEqual(self.hasher_calls('alice'), 1)
+
+    def test_sessions_from_the_default_backend_still_load(self):
+        # Admin sessions created before the custom backend store ModelBackend's path
+        self.client.force_login(self.alice, backend='django.contrib.auth.backends.ModelBackend')
+        request = HttpRequest()
+        request.session = self.client.session
+        self.assertEqual(get_user(request), self.alice)
+
+
+class ProfileJWTAuthenticationTests(TestCase):
+    """users/authentication.py: the token's user comes back with its profile in one query"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('carol', 'carol@example.com', 'carol-pass-123')
+        self.request = HttpRequest()
+        self.request.META['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+
+    def authenticate(self):
+        return ProfileJWTAuthentication().authenticate(self.request)
+
+    def test_profile_is_loaded_with_the_user(self):
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+            self.assertEqual(user.profile.pk, self.user.profile.pk)
+
+    def test_inactive_users_are_refused(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class StaffProvisioningTests(TestCase):
+    """users/provisioning.py: bulk staff creation without the per-row signals"""
+
+    def row(self, name, **overrides):
+        return {
+            'username': name, 'email': f'{name}@example.com', 'password': 'roster-pass-123',
+            'fullname': name.title(), 'role': 'NURSE', **overrides,
+        }
+
+    def test_creates_users_and_profiles_and_rejects_conflicts(self):
+        get_user_model().objects.create_user('taken', 'Taken@Example.com', 'x')
+        rows = [
+            self.row('nurse_one'),
+            self.row('doctor_one', role='DOCTOR', phone='0800'),
+            self.row('nurse_one'),                              # duplicate inside the roster
+            self.row('fresh', email='TAKEN@example.com'),       # email taken, other case
+            self.row('patient', role='PATIENT'),                # not a staff role
+        ]
+        result = provisioning.provision_staff(rows, workers=1)
+
+        self.assertEqual(result['created'], ['nurse_one', 'doctor_one'])
+        self.assertEqual([error['row'] for error in result['errors']], [3, 4, 5])
+        # bulk_create skipped post_save: exactly the profile written here, nothing auto-created
+        profiles = Profile.objects.filter(user__username__in=result['created'])
+        self.assertEqual(
+            sorted(profiles.values_list('user__username', 'role', 'fullname', 'phone')),
+            [('doctor_one', 'DOCTOR', 'Doctor_One', '0800'), ('nurse_one', 'NURSE', 'Nurse_One', None)],
+        )
+        self.assertIsNotNone(authenticate(username='nurse_one@EXAMPLE.com', password='roster-pass-123'))
+
+    def test_dry_run_creates_nothing(self):
+        result = provisioning.provision_staff([self.row('dry')], workers=1, dry_run=True)
+        self.assertEqual(result['created'], ['dry'])
+        self.assertFalse(get_user_model().objects.filter(username='dry').exists())
+
+    def test_pool_spawns_workers(self):
+        passwords = [f'pool-pass-{i}' for i in range(provisioning.MIN_ROWS_FOR_POOL)]
+        with mock.patch.object(provisioning, 'get_context', wraps=provisioning.get_context) as get_context:
+            hashes = provisioning.hash_passwords(passwords, workers=2)
+        get_context.assert_called_once_with('spawn')
+        self.assertTrue(all(check_password(password, hashed) for password, hashed in zip(passwords, hashes)))
+
+    def test_endpoint_caps_roster_size(self):
+        HospitalGenerator(staff=4, patients=0, blog_posts=0, prefix='roster').run()
+        admin = Profile.objects.filter(role='ADMIN').select_related('user').first()
+        token = RefreshToken.for_user(admin.user).access_token
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.settings(STAFF_IMPORT_MAX_ROWS=1):
+            response = client.post(
+                reverse('staff-import'), json.dumps({'rows': [self.row('a'), self.row('b')]}),
+                content_type='application/json', secure=True,
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('import_staff_roster', response.json()['detail'])
+
+
+class GoogleIdTokenTests(TestCase):
+    """users/google.py verifies ID tokens offline against the (fake) issuer's JWKS"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeGoogleServer(client_id='test-client').start()
+        cls.overrides = override_settings(**cls.server.settings_overrides())
+        cls.overrides.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.overrides.disable()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        google._jwks_caches.clear()
+        self.server.requests.clear()
+
+    def token(self, **claims):
+        claims = {'sub': '1234', 'email': 'ada@example.com', 'email_verified': True, **claims}
+        return self.server.issue_id_token(**claims)
+
+    def jwks_fetches(self):
+        return self.server.requests.count(('GET', '/oauth2/v3/certs'))
+
+    def test_valid_token(self):
+        claims = google.verify_id_token(self.token())
+        self.assertEqual(claims['email'], 'ada@example.com')
+        google.verify_id_token(self.token())
+        self.assertEqual(self.jwks_fetches(), 1)
+
+    def test_wrong_audience_or_issuer(self):
+        for claims in ({'aud': 'someone-else'}, {'iss': 'https://accounts.example.com'}):
+            with self.subTest(**claims), self.assertRaises(google.GoogleTokenError):
+                google.verify_id_token(self.token(**claims))
+
+    def test_expired_token(self):
+        expired = self.token(lifetime=-10 * google.ID_TOKEN_LEEWAY_SECONDS)
+        with self.assertRaisesMessage(google.GoogleTokenError, 'expired'):
+            google.verify_id_token(expired)
+
+    def test_unverified_email(self):
+        with self.assertRaisesMessage(google.GoogleTokenError, 'no verified email'):
+            google.verify_id_token(self.token(email_verified=False))
+
+    def test_unknown_kid_refreshes_the_jwks(self):
+        google.verify_id_token(self.token())
+        self.server.rotate_key()
+        with mock.patch.object(google, 'JWKS_MIN_REFRESH_SECONDS', 0):
+            claims = google.verify_id_token(self.token())
+        self.assertEqual(claims['sub'], '1234')
+        # The rotation bypassed the shared cache entry holding the old keys
+        self.assertEqual(self.jwks_fetches(), 2)
+
+    def test_unknown_kid_within_the_refresh_interval_is_rejected(self):
+        google.verify_id_token(self.token())
+        self.server.rotate_key()
+        with self.assertRaisesMessage(google.GoogleTokenError, 'Unknown signing key id'):
+            google.verify_id_token(self.token())
+        self.assertEqual(self.jwks_fetches(), 1)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(TestCase):
+    """users/outbox.py: leased batches, attempts counted at claim, backoff, giving up"""
+
+    def setUp(self):
+        self.messages = [
+            EmailOutbox.objects.create(to_email=f'to{i}@example.com', subject=f'Subject {i}', body='Body')
+            for i in range(3)
+        ]
+
+    def expire_leases(self):
+        EmailOutbox.objects.filter(status='SENDING').update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def test_claims_never_overlap_and_count_the_attempt(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = outbox.claim_batch(2)
+        if connection.features.has_select_for_update_skip_locked:
+            self.assertIn('SKIP LOCKED', queries[0]['sql'])
+        second = outbox.claim_batch(2)
+        self.assertEqual([m.id for m in first], [m.id for m in self.messages[:2]])
+        self.assertEqual([m.id for m in second], [self.messages[2].id])
+        self.assertEqual(outbox.claim_batch(2), [])
+        self.assertTrue(all(m.status == 'SENDING' and m.attempts == 1 for m in first + second))
+
+    def test_delivers_a_batch(self):
+        sent, failed = outbox.deliver_batch(outbox.claim_batch(10))
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(EmailOutbox.objects.filter(status='SENT').count(), 3)
+
+    def test_command_refuses_a_backend_that_does_not_send(self):
+        # Tests run on locmem with DEBUG off, like a worker missing EMAIL_BACKEND
+        with self.assertRaisesMessage(CommandError, 'without being delivered'):
+            call_command('send_outbox')
+        self.assertEqual(EmailOutbox.objects.filter(status='PENDING', attempts=0).count(), 3)
+
+    def test_failures_back_off_then_give_up(self):
+        self.assertEqual([outbox.backoff_delay(n) for n in (1, 2, 3)], [30, 60, 120])
+        self.assertEqual(outbox.backoff_delay(50), outbox.BACKOFF_MAX_SECONDS)
+        EmailOutbox.objects.exclude(pk=self.messages[0].pk).delete()
+        with mock.patch('users.outbox.EmailMessage.send', side_effect=OSError('smtp down')):
+            for attempt in (1, 2):
+                before = timezone.now()
+                self.assertEqual(outbox.deliver_batch(outbox.claim_batch(1, max_attempts=2), max_attempts=2), (0, 1))
+                message = EmailOutbox.objects.get(pk=self.messages[0].pk)
+                self.assertEqual(message.attempts, attempt)
+                if attempt == 1:
+                    self.assertEqual(message.status, 'PENDING')
+                    self.assertGreaterEqual(message.next_attempt_at, before + timedelta(seconds=30))
+                    EmailOutbox.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(message.status, 'FAILED')
+        self.assertIn('smtp down', message.last_error)
+
+    def test_crashed_worker_uses_up_attempts(self):
+        # Claimed twice by workers that died mid-send: never delivered, never retried forever
+        for _ in range(2):
+            self.assertEqual(len(outbox.claim_batch(10, max_attempts=2)), 3)
+            self.expire_leases()
+        self.assertEqual(outbox.claim_batch(10, max_attempts=2), [])
+        self.assertEqual(EmailOutbox.objects.filter(status='FAILED', attempts=2).count(), 3)
+
+    def test_expired_lease_taken_by_another_worker_is_not_sent_twice(self):
+        slow = outbox.claim_batch(10)
+        self.expire_leases()
+        fast = outbox.claim_batch(10)
+        self.assertEqual(outbox.deliver_batch(fast), (3, 0))
+        self.assertEqual(outbox.deliver_batch(slow), (0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class UserPayloadCacheTests(TestCase):
+    """users/cache.py: per-user version stamps keep stale payloads from being served"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('carol', 'carol@example.com', 'carol-pass-123')
+        Profile.objects.filter(user=self.user).update(fullname='Carol Old')
+
+    def fullname(self):
+        return user_cache.get_dashboard(self.user)['user']['profile']['fullname']
+
+    def test_profile_save_invalidates_after_commit(self):
+        self.assertEqual(self.fullname(), 'Carol Old')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.get(user=self.user)
+            profile.fullname = 'Carol New'
+            profile.save()
+        self.assertEqual(self.fullname(), 'Carol New')
+
+    def test_read_racing_an_update_cannot_write_back_a_stale_payload(self):
+        load_profile = user_cache._load_profile
+
+        def load_then_update(user):
+            stale = load_profile(user)
+            # The update commits (and bumps) while this read is still building its payload
+            Profile.objects.filter(user=user).update(fullname='Carol New')
+            user_cache.bump_version(user.id)
+            return stale
+
+        with mock.patch.object(user_cache, '_load_profile', side_effect=load_then_update):
+            self.assertEqual(self.fullname(), 'Carol Old')
+        self.assertEqual(self.fullname(), 'Carol New')
+
+    def test_role_change_reaches_other_processes(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        # Another worker: its own cache client on the same store, as with Redis in production
+        other_worker = FileBasedCache(location, {})
+        role = lambda: user_cache.get_basic_user(self.user)['profile']['role']  # noqa: E731
+        with override_settings(CACHES=shared):
+            with mock.patch.object(user_cache, 'cache', other_worker):
+                self.assertEqual(role(), 'PATIENT')
+            with self.captureOnCommitCallbacks(execute=True):
+                profile = Profile.objects.get(user=self.user)
+                profile.role = 'ADMIN'
+                profile.save()
+            with mock.patch.object(user_cache, 'cache', other_worker):
+                self.assertEqual(role(), 'ADMIN')
+
+
+class LoginMetricsTests(TestCase):
+    """Password logins are counted by outcome where authenticate() returns; /metrics needs a token"""
+
+    def setUp(self):
+        get_user_model().objects.create_user('dave', 'dave@example.com', 'dave-pass-123')
+
+    def count(self, outcome):
+        return AUTH_EVENTS.labels(outcome)._value.get()
+
+    def login(self, password):
+        return Client().post(
+            reverse('login'), json.dumps({'username': 'dave', 'password': password}),
+            content_type='application/json', secure=True,
+        )
+
+    def test_jwt_login_outcomes_are_counted_once(self):
+        before = {outcome: self.count(outcome) for outcome in ('success', 'failure')}
+        self.assertEqual(self.login('dave-pass-123').status_code, 200)
+        self.assertEqual(self.login('wrong').status_code, 400)
+        self.assertEqual(self.count('success') - before['success'], 1)
+        self.assertEqual(self.count('failure') - before['failure'], 1)
+
+    def test_metrics_need_a_token_unless_debug(self):
+        with self.settings(METRICS_AUTH_TOKEN='', DEBUG=False):
+            self.assertEqual(Client().get('/metrics', secure=True).status_code, 403)
+        with self.settings(METRICS_AUTH_TOKEN='scrape-secret', DEBUG=False):
+            self.assertEqual(Client().get('/metrics', secure=True).status_code, 401)
+            response = Client().get('/metrics', secure=True, HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'auth_logins', response.content)
+
+
+@override_settings(SLOW_QUERY_EXPLAIN=False, SLOW_QUERY_STORE=True)
+class SlowQueryParamsTests(TestCase):
+    """Slow-query captures keep the shapes of the parameters unless raw values are opted into"""
+
+    capture = {
+        'sql': 'SELECT 1 FROM users_user WHERE email = %s AND id = %s', 'many': False,
+        'params': ('dave@example.com', 7), 'alias': 'default', 'duration': 0.5, 'frames': [],
+    }
+
+    def record(self):
+        request = RequestFactory().post(reverse('login'))
+        request.resolver_match = resolve(reverse('login'))
+        with self.assertLogs('monitoring.slow_queries', 'WARNING') as logs:
+            slow_queries.record(request, 'login', [self.capture])
+        return SlowQuery.objects.get(), json.loads(logs.records[0].getMessage())
+
+    def test_parameters_are_redacted_by_default(self):
+        row, logged = self.record()
+        self.assertEqual(row.params, '[str(16), int]')
+        self.assertEqual(logged['params'], '[str(16), int]')
+        self.assertNotIn('dave@example.com', logged['params'])
+        self.assertEqual(row.view, 'users.views.UnifiedLoginView')
+
+    def test_raw_parameters_are_an_opt_in(self):
+        with self.settings(SLOW_QUERY_STORE_PARAMS=True):
+            row, _ = self.record()
+        self.assertEqual(row.params, "('dave@example.com', 7)")
+
+
+class UniqueUsernameTests(TestCase):
+    """Social signups get the base username or its lowest free "_<n>" (users/utils.py)"""
+
+    def take(self, *usernames):
+        get_user_model().objects.bulk_create([get_user_model()(username=username) for username in usernames])
+
+    def test_lowest_free_suffix_in_one_query(self):
+        self.take('john_smith', 'john_smith_1', 'john_smith_2', 'john_smith_4', 'john_smith_x', 'john_smith_2b')
+        with self.assertNumQueries(1):
+            self.assertEqual(utils.generate_unique_username('John Smith', 'john@example.com'), 'john_smith_3')
+        self.take(*[f'john_smith_{n}' for n in range(5, 60)])
+        with self.assertNumQueries(1):
+            self.assertEqual(utils.generate_unique_username('John Smith', 'john@example.com'), 'john_smith_3')
+
+    def test_longer_names_sharing_the_prefix_do_not_count(self):
+        self.take('john_smithers', 'john_smithers_1', 'john_smith5')
+        self.assertEqual(utils.generate_unique_username('John Smith', 'john@example.com'), 'john_smith')
+        self.take('john_smith')
+        self.assertEqual(utils.generate_unique_username('John Smith', 'john@example.com'), 'john_smith_1')
+        # No name: the email's local part
+        self.assertEqual(utils.generate_unique_username('', 'jsmith@example.com'), 'jsmith')
+
+    def test_a_name_claimed_concurrently_falls_through_to_the_next(self):
+        self.take('john_smith')
+        allocate = utils.generate_unique_username
+        claimed = []
+
+        def racing(name, email):
+            username = allocate(name, email)
+            if not claimed:
+                # Another signup inserts the same name between allocation and INSERT
+                claimed.append(username)
+                self.take(username)
+            return username
+
+        with mock.patch.object(utils, 'generate_unique_username', side_effect=racing):
+            user = utils.create_user_with_unique_username('John Smith', 'john@example.com')
+        self.assertEqual(claimed, ['john_smith_1'])
+        self.assertEqual(user.username, 'john_smith_2')
+        self.assertFalse(user.has_usable_password())
+
+    def test_gives_up_after_the_attempts(self):
+        with mock.patch.object(utils, 'generate_unique_username', return_value='taken'):
+            self.take('taken')
+            with self.assertRaises(IntegrityError):
+                utils.create_user_with_unique_username('Taken', 'taken@example.com', attempts=3)
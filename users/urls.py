@@ -17,6 +17,7 @@ urlpatterns = [
     path('logout/', views.LogoutView.as_view(), name='logout'),
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
     path('update-profile/', views.UpdateProfileView.as_view(), name='update-profile'),
+    path('staff/import/', views.StaffRosterImportView.as_view(), name='staff-import'),
     
     # Keep social auth URLs for compatibility
     path('', include('social_django.urls', namespace='social')),
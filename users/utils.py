@@ -1,29 +1,13 @@
 # users/utils.py - IMPROVED VERSION
-from django.core.mail import send_mail
-from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from .models import EmailOutbox
 import logging
-from socket import timeout as socket_timeout
-import smtplib
 
 logger = logging.getLogger(__name__)
 
-def SendMail(email, timeout=10):
-    """
-    Send welcome email with timeout protection
-    Returns: True if sent, False if failed, None if email is disabled
-    """
-    # Check if email backend is enabled
-    if settings.EMAIL_BACKEND == 'django.core.mail.backends.console.EmailBackend':
-        logger.info(f"Email console backend active - would send to {email}")
-        return True  # Return True to allow registration to proceed
-    
-    if not settings.EMAIL_HOST_USER or not settings.EMAIL_HOST_PASSWORD:
-        logger.warning("Email credentials not configured, skipping email")
-        return True  # Return True to not block registration
-    
-    try:
-        subject = "Welcome to Nile Healthcare"
-        message = '''Welcome to Nile Healthcare!
+WELCOME_SUBJECT = "Welcome to Nile Healthcare"
+WELCOME_MESSAGE = '''Welcome to Nile Healthcare!
 
 Thank you for registering with us. We're excited to have you on board.
 
@@ -31,23 +15,62 @@ Best regards,
 The Nile Healthcare Team
 '''
 
-        # Send with timeout protection
-        send_mail(
-            subject,
-            message,
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=False,
-        )
-        logger.info(f"Welcome email sent to {email}")
-        return True
-        
-    except (socket_timeout, smtplib.SMTPException) as e:
-        # Specific SMTP/timeout errors - don't crash registration
-        logger.warning(f"Email timeout/SMTP error for {email}: {str(e)}. Registration continues.")
-        return True  # Return True so registration doesn't fail
-        
-    except Exception as e:
-        # Any other error
-        logger.error(f"Failed to send email to {email}: {str(e)}")
-        return True  # Still return True - don't block registration over email
\ No newline at end of file
+def queue_mail(to_email, subject, body):
+    """
+    Add a message to the email outbox. Call this inside the transaction
+    that triggered the mail - the row commits (or rolls back) with it and
+    `manage.py send_outbox` delivers it later.
+    """
+    return EmailOutbox.objects.create(to_email=to_email, subject=subject, body=body)
+
+def queue_welcome_mail(email):
+    return queue_mail(email, WELCOME_SUBJECT, WELCOME_MESSAGE)
+
+# Leave room for a "_<n>" suffix inside User.username's 150 characters
+USERNAME_BASE_MAX_LENGTH = 140
+
+def generate_unique_username(name, email):
+    """
+    Pick the next free username for a social signup.
+
+    Uses the name ("John Smith" -> "john_smith") or the email local part as
+    the base, then fetches every existing "base%" username in ONE query and
+    returns the base itself or the lowest free "base_<n>" - so the cost no
+    longer grows with how popular the name is.
+    """
+    base_username = name.replace(' ', '_').lower() if name else email.split('@')[0]
+    base_username = base_username[:USERNAME_BASE_MAX_LENGTH]
+
+    taken = set(
+        User.objects.filter(username__startswith=base_username).values_list('username', flat=True)
+    )
+    if base_username not in taken:
+        return base_username
+
+    prefix = f"{base_username}_"
+    suffixes = {
+        int(username[len(prefix):])
+        for username in taken
+        if username.startswith(prefix) and username[len(prefix):].isdigit()
+    }
+    counter = 1
+    while counter in suffixes:
+        counter += 1
+    return f"{prefix}{counter}"
+
+def create_user_with_unique_username(name, email, attempts=5, **extra_fields):
+    """
+    Create a passwordless user under a freshly allocated username.
+
+    The unique constraint on username is what makes the claim atomic: if a
+    concurrent signup takes the same name first, the INSERT fails inside a
+    savepoint and we allocate again.
+    """
+    for attempt in range(attempts):
+        username = generate_unique_username(name, email)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(username=username, email=email, password=None, **extra_fields)
+        except IntegrityError:
+            logger.info(f"Username {username} claimed concurrently, retrying ({attempt + 1}/{attempts})")
+    raise IntegrityError(f"Could not allocate a unique username for {email}")
@@ -5,7 +5,6 @@ from rest_framework import status, permissions
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.db import transaction
 from django.conf import settings
 from decouple import config
@@ -23,6 +22,12 @@ from .serializers import (
     UpdateProfileSerializer
 )
 from .models import Profile
+from .provisioning import provision_staff, read_roster_csv
+from .utils import create_user_with_unique_username
+from . import google
+from . import cache as user_cache
+from hospital.permissions import IsRole
+from monitoring.metrics import record_login
 from social_django.models import UserSocialAuth  # Add this import
 
 logger = logging.getLogger(__name__)
@@ -53,16 +58,9 @@ class UnifiedLoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Try to authenticate with username first
-        user = authenticate(username=identifier, password=password)
-        
-        if user is None:
-            # Try with email
-            try:
-                user_obj = User.objects.get(email=identifier)
-                user = authenticate(username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                user = None
+        # EmailOrUsernameModelBackend resolves username OR email in one query
+        user = authenticate(request, username=identifier, password=password)
+        record_login(user)
         
         if user is None:
             return Response(
@@ -76,9 +74,8 @@ class UnifiedLoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Log the user in (for session-based auth if needed)
-        from django.contrib.auth import login as auth_login
-        user.backend = 'django.contrib.auth.backends.ModelBackend'
+        # Log the user in (for session-based auth if needed);
+        # authenticate() already set user.backend
         auth_login(request, user)
         
         # Generate JWT tokens
@@ -104,36 +101,19 @@ class UnifiedLoginView(APIView):
     def handle_google_login(self, request, auth_code):
         """Handle Google OAuth login with authorization code"""
         try:
-            # Exchange code for tokens
-            token_url = "https://oauth2.googleapis.com/token"
-            token_data = {
-                'code': auth_code,
-                'client_id': settings.SOCIAL_AUTH_GOOGLE_OAUTH2_KEY,
-                'client_secret': settings.SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET,
-                'redirect_uri': 'https://ettahospitalclone.vercel.app/auth/callback',  # Same as regular login
-                'grant_type': 'authorization_code',
-            }
+            # Exchange code for tokens (same redirect URI as regular login)
+            token_json = google.exchange_code(auth_code, 'https://ettahospitalclone.vercel.app/auth/callback')
             
-            token_response = requests.post(token_url, data=token_data)
-            token_response.raise_for_status()
-            token_json = token_response.json()
-            
-            access_token = token_json.get('access_token')
-            
-            if not access_token:
+            # Verify the ID token locally - no userinfo round trip
+            try:
+                google_user = google.user_info_from_token_response(token_json)
+            except google.GoogleTokenError as e:
+                logger.warning(f"Google ID token rejected: {str(e)}")
                 return Response(
-                    {'detail': 'Failed to get access token from Google'}, 
+                    {'detail': 'Failed to verify Google identity'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get user info from Google
-            userinfo_response = requests.get(
-                'https://www.googleapis.com/oauth2/v3/userinfo',
-                headers={'Authorization': f'Bearer {access_token}'}
-            )
-            userinfo_response.raise_for_status()
-            google_user = userinfo_response.json()
-            
             email = google_user.get('email')
             if not email:
                 return Response(
@@ -148,15 +128,12 @@ class UnifiedLoginView(APIView):
                 logger.info(f"Google login - Existing user: {email}")
             except User.DoesNotExist:
                 # Create new user
-                username = self.generate_username(google_user.get('name', ''), email)
-                user = User.objects.create_user(
-                    username=username,
-                    email=email,
-                    password=None  # No password for Google users
+                user = create_user_with_unique_username(
+                    google_user.get('name') or '',
+                    email,
+                    first_name=google_user.get('given_name') or '',
+                    last_name=google_user.get('family_name') or '',
                 )
-                user.first_name = google_user.get('given_name', '')
-                user.last_name = google_user.get('family_name', '')
-                user.save()
                 created = True
                 logger.info(f"Google login - New user created: {email}")
                 
@@ -166,8 +143,7 @@ class UnifiedLoginView(APIView):
                 profile.save()
             
             # Log the user in (for session-based auth if needed)
-            from django.contrib.auth import login as auth_login
-            user.backend = 'django.contrib.auth.backends.ModelBackend'
+            user.backend = 'users.backends.EmailOrUsernameModelBackend'
             auth_login(request, user)
             
             # Generate JWT tokens
@@ -205,42 +181,9 @@ class UnifiedLoginView(APIView):
             )
     
     def get_user_profile_data(self, user, request):
-        """Get profile data for any user"""
-        try:
-            profile = Profile.objects.select_related('user').get(user=user)
-            profile_serializer = ProfileSerializer(
-                profile, 
-                context={'request': request}
-            )
-            return {
-                'role': profile.role,
-                'fullname': profile.fullname,
-                'profile_pix': profile_serializer.data.get('profile_pix'),
-                'phone': profile.phone,
-                'gender': profile.gender,
-            }
-        except Profile.DoesNotExist:
-            logger.warning(f"Profile not found for user {user.id}")
-            return {
-                'role': 'PATIENT',
-                'fullname': user.get_full_name() or user.username,
-                'profile_pix': None,
-                'phone': None,
-                'gender': None,
-            }
+        """Get profile data for any user (read-through cached)"""
+        return user_cache.get_basic_user(user, request)['profile']
     
-    def generate_username(self, name, email):
-        """Generate unique username from name and email"""
-        base_username = name.replace(' ', '_').lower() if name else email.split('@')[0]
-        username = base_username
-        counter = 1
-        
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}_{counter}"
-            counter += 1
-        
-        return username
-
 class RegistrationView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -274,6 +217,45 @@ class RegistrationView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class StaffRosterImportView(APIView):
+    """Bulk-create staff accounts from a JSON list of rows or an uploaded CSV (admin only)"""
+    permission_classes = [permissions.IsAuthenticated, IsRole]
+    allowed_roles = ['ADMIN']
+
+    def post(self, request):
+        if 'file' in request.FILES:
+            rows = read_roster_csv(request.FILES['file'])
+        else:
+            rows = request.data.get('rows')
+        
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {'detail': 'Provide a non-empty "rows" list or a CSV "file"'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_rows = getattr(settings, 'STAFF_IMPORT_MAX_ROWS', 25)
+        if len(rows) > max_rows:
+            # Hashing is deliberately slow; big rosters belong in `manage.py import_staff_roster`
+            return Response(
+                {'detail': f'At most {max_rows} rows per request; import larger rosters with '
+                           f'"manage.py import_staff_roster"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        dry_run = str(request.query_params.get('dry_run', '')).lower() in ('1', 'true')
+        # In this process: no pool start-up, and no fork of a threaded web worker
+        result = provision_staff(rows, workers=1, dry_run=dry_run)
+        
+        response_data = {
+            'created': len(result['created']),
+            'usernames': result['created'],
+            'errors': result['errors'],
+            'dry_run': dry_run,
+        }
+        response_status = status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(response_data, status=response_status)
+
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -287,16 +269,9 @@ class LoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Try to authenticate with username first
-        user = authenticate(username=identifier, password=password)
-        
-        if user is None:
-            # Try with email
-            try:
-                user_obj = User.objects.get(email=identifier)
-                user = authenticate(username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                user = None
+        # EmailOrUsernameModelBackend resolves username OR email in one query
+        user = authenticate(request, username=identifier, password=password)
+        record_login(user)
         
         if user is None:
             return Response(
@@ -321,29 +296,7 @@ class LoginView(APIView):
             )
         
         # Get profile data
-        try:
-            profile = Profile.objects.select_related('user').get(user=user)
-            # Use ProfileSerializer with request context
-            profile_serializer = ProfileSerializer(
-                profile, 
-                context={'request': request}
-            )
-            profile_data = {
-                'role': profile.role,
-                'fullname': profile.fullname,
-                'profile_pix': profile_serializer.data.get('profile_pix'),
-                'phone': profile.phone,
-                'gender': profile.gender,
-            }
-        except Profile.DoesNotExist:
-            logger.warning(f"Profile not found for user {user.id}")
-            profile_data = {
-                'role': 'PATIENT',
-                'fullname': user.get_full_name() or user.username,
-                'profile_pix': None,
-                'phone': None,
-                'gender': None,
-            }
+        profile_data = user_cache.get_basic_user(user, request)['profile']
         
         response_data = {
             'access': str(refresh.access_token),
@@ -365,7 +318,6 @@ class LogoutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data.get("refresh")
-            user_id = request.user.id
             
             if refresh_token:
                 try:
@@ -374,10 +326,6 @@ class LogoutView(APIView):
                 except Exception as e:
                     logger.warning(f"Token blacklist failed: {str(e)}")
             
-            # Clear user cache on logout
-            cache.delete(f"user_{user_id}_basic")
-            cache.delete(f"user_dashboard_{user_id}")
-            
             return Response({'detail': 'Logged out successfully'}, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -391,36 +339,15 @@ class DashboardView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):        
-        try:
-            profile = Profile.objects.select_related('user').get(user=request.user)
-            serializer = ProfileSerializer(
-                profile, 
-                context={'request': request}
-            )
-            profile_data = {
-                'role': profile.role,
-                'fullname': profile.fullname,
-                'profile_pix': serializer.data.get('profile_pix'),
-                'phone': profile.phone,
-                'gender': profile.gender,
-            }
-            response_data = {
-                'user': {
-                    'id': request.user.id,
-                    'username': request.user.username,
-                    'email': request.user.email,
-                    'profile': profile_data
-                }
-            }
-                        
-            return Response(response_data)
-            
-        except Profile.DoesNotExist:
+        # Read-through cache, invalidated on User/Profile save (users/signals.py)
+        response_data = user_cache.get_dashboard(request.user, request)
+        if response_data is None:
             logger.error(f"Profile not found for user {request.user.id}")
             return Response(
                 {'detail': 'Profile not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(response_data)
 
 class UpdateProfileView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -436,12 +363,6 @@ class UpdateProfileView(APIView):
         
         if serializer.is_valid():
             serializer.save()
-            
-            # Clear cached data after profile update
-            user_id = request.user.id
-            cache.delete(f"user_{user_id}_basic")
-            cache.delete(f"user_dashboard_{user_id}")
-            
             return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -585,10 +506,11 @@ class SocialAuthLoginView(APIView):
         """Alternative social auth login that returns JWT directly (Google only)"""
         provider = request.data.get('provider')
         access_token = request.data.get('access_token')
+        id_token = request.data.get('id_token')
         
-        if not provider or not access_token:
+        if not provider or not (access_token or id_token):
             return Response(
-                {'error': 'Provider and access token required'}, 
+                {'error': 'Provider and access token or ID token required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -601,7 +523,7 @@ class SocialAuthLoginView(APIView):
         
         try:
             # Verify the Google token and get user data
-            user_data = self.verify_google_token(access_token)
+            user_data = self.verify_google_token(access_token, id_token)
             if not user_data:
                 return Response(
                     {'error': 'Invalid Google token'}, 
@@ -648,24 +570,24 @@ class SocialAuthLoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
-    def verify_google_token(self, access_token):
-        """Verify Google token with Google API"""
+    def verify_google_token(self, access_token, id_token=None):
+        """Verify an ID token offline, or fall back to the userinfo API for a bare access token"""
         try:
-            response = requests.get(
-                'https://www.googleapis.com/oauth2/v3/userinfo',
-                params={'access_token': access_token}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'email': data.get('email'),
-                    'name': data.get('name'),
-                    'first_name': data.get('given_name'),
-                    'last_name': data.get('family_name'),
-                    'picture': data.get('picture'),
-                }
-            return None
+            if id_token:
+                data = google.verify_id_token(id_token)
+            else:
+                data = google.fetch_userinfo(access_token)
+            return {
+                'email': data.get('email'),
+                'name': data.get('name'),
+                'first_name': data.get('given_name'),
+                'last_name': data.get('family_name'),
+                'picture': data.get('picture'),
+            }
             
+        except (google.GoogleTokenError, requests.RequestException) as e:
+            logger.warning(f"Google token rejected: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Google token verification error: {str(e)}")
             return None
@@ -682,15 +604,12 @@ class SocialAuthLoginView(APIView):
             created = False
         except User.DoesNotExist:
             # Create new user
-            username = self.generate_username(user_data.get('name', ''), email)
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=None  # No password for Google auth users
+            user = create_user_with_unique_username(
+                user_data.get('name') or '',
+                email,
+                first_name=user_data.get('first_name') or '',
+                last_name=user_data.get('last_name') or '',
             )
-            user.first_name = user_data.get('first_name', '')
-            user.last_name = user_data.get('last_name', '')
-            user.save()
             created = True
             
             # Create profile
@@ -700,18 +619,6 @@ class SocialAuthLoginView(APIView):
         
         return user, created
     
-    def generate_username(self, name, email):
-        """Generate unique username from name and email"""
-        base_username = name.replace(' ', '_').lower() if name else email.split('@')[0]
-        username = base_username
-        counter = 1
-        
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}_{counter}"
-            counter += 1
-        
-        return username
-
 class SocialAuthUrlsView(APIView):
     permission_classes = [permissions.AllowAny]
     
@@ -768,34 +675,15 @@ class GoogleOAuthCallbackView(APIView):
         
         try:
             # Exchange code for tokens
-            token_url = "https://oauth2.googleapis.com/token"
-            token_data = {
-                'code': code,
-                'client_id': settings.SOCIAL_AUTH_GOOGLE_OAUTH2_KEY,
-                'client_secret': settings.SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET,
-                'redirect_uri': 'https://dhospitalback.onrender.com/api/users/google-callback/',
-                'grant_type': 'authorization_code',
-            }
+            token_json = google.exchange_code(code, 'https://dhospitalback.onrender.com/api/users/google-callback/')
             
-            token_response = requests.post(token_url, data=token_data)
-            token_response.raise_for_status()
-            token_json = token_response.json()
-            
-            access_token = token_json.get('access_token')
-            id_token = token_json.get('id_token')
-            
-            if not access_token:
-                logger.error("No access token from Google")
+            # Verify the ID token locally - no userinfo round trip
+            try:
+                google_user = google.user_info_from_token_response(token_json)
+            except google.GoogleTokenError as e:
+                logger.error(f"Google ID token rejected: {str(e)}")
                 frontend_url = "https://ettahospitalclone.vercel.app"
-                return redirect(f"{frontend_url}/login?error=no_access_token")
-            
-            # Get user info from Google
-            userinfo_response = requests.get(
-                'https://www.googleapis.com/oauth2/v3/userinfo',
-                headers={'Authorization': f'Bearer {access_token}'}
-            )
-            userinfo_response.raise_for_status()
-            google_user = userinfo_response.json()
+                return redirect(f"{frontend_url}/login?error=invalid_id_token")
             
             email = google_user.get('email')
             if not email:
@@ -810,15 +698,12 @@ class GoogleOAuthCallbackView(APIView):
                 logger.info(f"Existing user found: {email}")
             except User.DoesNotExist:
                 # Create new user
-                username = self.generate_username(google_user.get('name', ''), email)
-                user = User.objects.create_user(
-                    username=username,
-                    email=email,
-                    password=None  # No password for Google users
+                user = create_user_with_unique_username(
+                    google_user.get('name') or '',
+                    email,
+                    first_name=google_user.get('given_name') or '',
+                    last_name=google_user.get('family_name') or '',
                 )
-                user.first_name = google_user.get('given_name', '')
-                user.last_name = google_user.get('family_name', '')
-                user.save()
                 created = True
                 logger.info(f"New user created: {email}")
                 
@@ -827,9 +712,8 @@ class GoogleOAuthCallbackView(APIView):
                 profile.fullname = google_user.get('name', f"{user.first_name} {user.last_name}".strip())
                 profile.save()
             
-            # Log the user in with the ModelBackend
-            from django.contrib.auth import login as auth_login
-            user.backend = 'django.contrib.auth.backends.ModelBackend'
+            # Log the user in with the local model backend
+            user.backend = 'users.backends.EmailOrUsernameModelBackend'
             auth_login(request, user)
             
             # Generate JWT tokens
@@ -879,16 +763,4 @@ class GoogleOAuthCallbackView(APIView):
             logger.error(f"Unexpected error in Google auth: {str(e)}")
             frontend_url = "https://ettahospitalclone.vercel.app"
             return redirect(f"{frontend_url}/login?error=auth_failed&message={urllib.parse.quote(str(e))}")
-    
-    def generate_username(self, name, email):
-        """Generate unique username from name and email"""
-        base_username = name.replace(' ', '_').lower() if name else email.split('@')[0]
-        username = base_username
-        counter = 1
         
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}_{counter}"
-            counter += 1
-        
-        return username
-    